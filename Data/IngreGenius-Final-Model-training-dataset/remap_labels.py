@@ -1,7 +1,12 @@
 # remap_labels.py
+import argparse
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import shutil
-import yaml  
+import yaml
 
 # --- CONFIGURATION ---
 
@@ -25,6 +30,10 @@ SOURCE_DATASETS = [
 
 REMAPPED_LABELS_DIR = Path("./Data/IngreGenius-Final-Model-training-dataset/master_labels")
 
+# Records which source files (size + mtime) and which class mapping produced each output,
+# so a rerun only rewrites what changed.
+MANIFEST_FILE = REMAPPED_LABELS_DIR / ".remap_manifest.json"
+
 # --- SCRIPT LOGIC ---
 
 def load_class_list_from_txt(file_path):
@@ -36,55 +45,159 @@ def load_class_list_from_yaml(yaml_path):
     """Loads the 'names' list from a YOLO data.yaml file."""
     with open(yaml_path, 'r') as f:
         data = yaml.safe_load(f)
-        return data.get('names', [])
+        names = data.get('names', [])
+        # YOLO configs may also list names as {index: name}.
+        if isinstance(names, dict):
+            names = [names[i] for i in sorted(names)]
+        return names
 
-if __name__ == "__main__":
-    if REMAPPED_LABELS_DIR.exists():
-        print(f"Clearing old remapped labels directory: {REMAPPED_LABELS_DIR}")
-        shutil.rmtree(REMAPPED_LABELS_DIR)
-    
+def build_class_mapping(original_classes, master_map):
+    """Returns a list mapping each original class index to its master index (or None if unmapped)."""
+    return [master_map.get(name.lower()) for name in original_classes]
+
+def mapping_hash(original_classes, master_classes):
+    """Fingerprint of a dataset's class mapping; changes whenever either class list changes."""
+    payload = json.dumps([original_classes, master_classes]).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def load_manifest():
+    if MANIFEST_FILE.exists():
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    return {"files": {}}
+
+def save_manifest(manifest):
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = MANIFEST_FILE.with_suffix(".tmp")
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_file, MANIFEST_FILE)
+
+def remap_file(task):
+    """
+    Remaps one label file. Runs in a worker process.
+
+    Returns the output key, a Counter of class names that are not in the master list, and
+    an error message if the file could not be parsed (in which case nothing is written).
+    """
+    source, destination, output_key, class_mapping, original_classes = task
+    unmapped = Counter()
+    new_label_lines = []
+
+    with open(source, 'r') as f:
+        for line_number, line in enumerate(f.read().splitlines(), start=1):
+            parts = line.split()
+            if not parts: continue
+
+            try:
+                old_class_index = int(parts[0])
+            except ValueError:
+                return output_key, unmapped, f"line {line_number}: {line.strip()!r} does not start with a class index"
+            new_class_index = class_mapping[old_class_index] if old_class_index < len(class_mapping) else None
+
+            if new_class_index is None:
+                name = original_classes[old_class_index].lower() if old_class_index < len(original_classes) else f"index {old_class_index}"
+                unmapped[name] += 1
+            else:
+                new_label_lines.append(f"{new_class_index} {' '.join(parts[1:])}")
+
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with open(destination, 'w') as f:
+        f.write("\n".join(new_label_lines))
+
+    return output_key, unmapped, None
+
+def remap_datasets(workers=None, force=False):
     master_classes = load_class_list_from_txt(MASTER_CLASSES_FILE)
     master_map = {name.lower(): i for i, name in enumerate(master_classes)}
     print(f"Loaded {len(master_classes)} master classes.")
 
+    # Even with force the old manifest is read: it lists the outputs of deleted sources.
+    manifest = load_manifest()
+    previous_files = manifest["files"]
+    current_files = {}
+    tasks = []
+    skipped_datasets = []
+
     for dataset in SOURCE_DATASETS:
         print(f"\nProcessing dataset: {dataset['name']}...")
-        
+
         original_yaml_path = dataset["yaml_path"]
         if not original_yaml_path.exists():
             print(f"  - ERROR: YAML file not found at {original_yaml_path}. Skipping.")
+            skipped_datasets.append(dataset['name'])
             continue
-            
+
         original_classes = load_class_list_from_yaml(original_yaml_path)
+        class_mapping = build_class_mapping(original_classes, master_map)
+        dataset_mapping_hash = mapping_hash(original_classes, master_classes)
         dataset_root = original_yaml_path.parent
 
         label_files = list(dataset_root.rglob("labels/**/*.txt"))
-        print(f"Found {len(label_files)} label files to remap.")
+        changed = 0
 
         for label_file in label_files:
-            new_label_lines = []
-            with open(label_file, 'r') as f:
-                for line in f.readlines():
-                    parts = line.strip().split()
-                    if not parts: continue
-                    
-                    old_class_index = int(parts[0])
-                    original_class_name = original_classes[old_class_index].lower()
-                    
-                    if original_class_name in master_map:
-                        new_class_index = master_map[original_class_name]
-                        new_line = f"{new_class_index} {' '.join(parts[1:])}"
-                        new_label_lines.append(new_line)
-                    else:
-                        print(f"  - WARNING: Class '{original_class_name}' not in master list. Skipping.")
-
             relative_path = label_file.relative_to(dataset_root)
             new_label_path = REMAPPED_LABELS_DIR / dataset['name'] / relative_path
-            new_label_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(new_label_path, 'w') as f:
-                f.write("\n".join(new_label_lines))
+            output_key = str(Path(dataset['name']) / relative_path)
+
+            stat = label_file.stat()
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "mapping": dataset_mapping_hash}
+            current_files[output_key] = entry
+
+            if not force and previous_files.get(output_key) == entry and new_label_path.exists():
+                continue
+            changed += 1
+            tasks.append((str(label_file), str(new_label_path), output_key, class_mapping, original_classes))
+
+        print(f"Found {len(label_files)} label files, {changed} new or changed.")
+
+    # Keep the outputs of datasets that could not be read this time.
+    for output_key, entry in previous_files.items():
+        if Path(output_key).parts[0] in skipped_datasets:
+            current_files[output_key] = entry
+
+    # Outputs whose source file disappeared.
+    removed = [key for key in previous_files if key not in current_files]
+    for output_key in removed:
+        (REMAPPED_LABELS_DIR / output_key).unlink(missing_ok=True)
+
+    unmapped_totals = Counter()
+    failed = {}
+    if tasks:
+        print(f"\nRemapping {len(tasks)} label files with {workers or os.cpu_count()} worker processes...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for output_key, unmapped, error in executor.map(remap_file, tasks, chunksize=64):
+                unmapped_totals.update(unmapped)
+                if error:
+                    failed[output_key] = error
+
+    # A broken source leaves no output and no manifest entry, so the next run tries it again.
+    for output_key in failed:
+        del current_files[output_key]
+        (REMAPPED_LABELS_DIR / output_key).unlink(missing_ok=True)
+
+    manifest["files"] = current_files
+    save_manifest(manifest)
+
+    for name, count in sorted(unmapped_totals.items(), key=lambda item: -item[1]):
+        print(f"  - WARNING: Class '{name}' not in master list. Skipped {count} boxes.")
+    for output_key, error in sorted(failed.items()):
+        print(f"  - ERROR: Could not parse {output_key} ({error}). Skipped the file.")
 
     print("\n Label remapping complete!")
+    rewritten = len(tasks) - len(failed)
+    print(f"Rewrote {rewritten} files, kept {len(current_files) - rewritten} unchanged, removed {len(removed)}, "
+          f"failed {len(failed)}.")
     print(f"All new label files are saved in '{REMAPPED_LABELS_DIR}'.")
-    print("\nYour next step is to update your training script to use your 'master_data.yaml' file.")
\ No newline at end of file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remap the class ids of every source dataset to the master class list.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--force", action="store_true", help="Rewrite every file, even unchanged ones.")
+    args = parser.parse_args()
+
+    remap_datasets(args.workers, args.force)
+
+    print("\nYour next step is to update your training script to use your 'master_data.yaml' file.")
@@ -1,22 +1,78 @@
 import streamlit as st
-from pathlib import Path
 import time
 import base64
+import hashlib
+import os
+from src.ingregenius import tracing
 from src.ingregenius.ingredients import INGREDIENT_DATABASE
-from src.ingregenius.food_detector import get_ingredients_from_image
-from src.ingregenius.recipe_generator import generate_two_recipes
+from src.ingregenius.inference_client import INFERENCE_SERVICE_URL, get_inference_client
+from src.ingregenius import startup
 
+if INFERENCE_SERVICE_URL:
+    # Client mode: the model and the LLM calls live in inference_service, this process only renders.
+    # The service decodes uploads itself, so they are passed on as raw bytes.
+    decode_upload = bytes
 
-# --- Function to Set Background and Theme ---
-def set_background_and_theme(image_file):
+    def detect_image(image, image_bytes):
+        return get_inference_client().detect_image(image_bytes)
+
+    def stream_two_recipes(meal_type, ingredients):
+        # The deadline is kept here, so the local template recipes also stand in for a slow service.
+        return startup.get_recipe_generator().stream_two_recipes_with_deadline(
+            meal_type, ingredients, stream_fn=get_inference_client().stream_recipes)
+else:
+    # The detector and the recipe generator take seconds to import. They are loaded on a
+    # background thread started from the first pages (see preload_models), not here,
+    # so a fresh worker draws the welcome page right away.
+    def decode_upload(image_bytes):
+        return startup.get_food_detector().load_image(image_bytes)
+
+    def detect_image(image, image_bytes):
+        detector = startup.get_food_detector()
+        # Pool workers decode on their own, and the upload is far smaller to send them than its pixels.
+        return detector.detect_image(image_bytes if detector.DETECTOR_POOL_WORKERS > 0 else image)
+
+    def stream_two_recipes(meal_type, ingredients):
+        # With RECIPE_DEADLINE set, local template recipes stand in when the LLM is slow.
+        return startup.get_recipe_generator().stream_two_recipes_with_deadline(meal_type, ingredients)
+
+
+def preload_models():
+    """Starts importing the detector and loading the model while the user picks a meal."""
+    if not INFERENCE_SERVICE_URL:
+        startup.start_preload()
+
+
+# --- Staged Pipeline State ---
+# Streamlit reruns this whole script on every interaction. Each expensive stage keeps its
+# last output in the session together with the inputs it was computed from, and is only
+# computed again when those inputs change.
+def get_stage(name, inputs, report=True):
     """
-    Sets a background image, adds an overlay, and injects custom CSS for a full dark theme.
+    Returns the stored output of a stage if it was computed from the same inputs, else None.
+
+    Each reuse is counted in the app.stage_reused metric (per stage) unless report is False.
     """
-    try:
-        with open(image_file, "rb") as f:
-            encoded_string = base64.b64encode(f.read()).decode()
-        st.markdown(
-            f"""
+    stored = st.session_state.setdefault("stages", {}).get(name)
+    if stored is None or stored[0] != inputs:
+        return None
+    if report:
+        tracing.count("app.stage_reused", stage=name)
+    return stored[1]
+
+
+def set_stage(name, inputs, output):
+    """Stores the output of a stage under the inputs it was computed from and returns it."""
+    st.session_state.setdefault("stages", {})[name] = (inputs, output)
+    return output
+
+
+# --- Function to Set Background and Theme ---
+def build_theme_css(image_file):
+    """Reads the background image and returns the CSS of the dark theme with the image embedded."""
+    with open(image_file, "rb") as f:
+        encoded_string = base64.b64encode(f.read()).decode()
+    return f"""
             <style>
             .stApp {{
                 background-image: linear-gradient(rgba(0,0,0,0.7), rgba(0,0,0,0.7)), url("data:image/jpeg;base64,{encoded_string}");
@@ -70,9 +126,17 @@ def set_background_and_theme(image_file):
                 background-color: rgba(38, 39, 48, 0.95);
             }}
             </style>
-            """,
-            unsafe_allow_html=True
-        )
+            """
+
+
+def set_background_and_theme(image_file):
+    """
+    Sets a background image, adds an overlay, and injects custom CSS for a full dark theme.
+    """
+    try:
+        inputs = (image_file, os.stat(image_file).st_mtime_ns)
+        css = get_stage("theme_css", inputs, report=False) or set_stage("theme_css", inputs, build_theme_css(image_file))
+        st.markdown(css, unsafe_allow_html=True)
     except FileNotFoundError:
         st.error(f"Background image not found at path: {image_file}")
 
@@ -90,6 +154,10 @@ def initialize_session_state():
         st.session_state.detected_ingredients = []
     if "final_ingredients" not in st.session_state:
         st.session_state.final_ingredients = []
+    if "ingredient_counts" not in st.session_state:
+        st.session_state.ingredient_counts = {}
+    if "uncertain_ingredients" not in st.session_state:
+        st.session_state.uncertain_ingredients = []
 
 
 def navigate_to(page_name):
@@ -98,6 +166,7 @@ def navigate_to(page_name):
 
 
 def welcome_page():
+    preload_models()
     st.title("Welcome to IngreGenius! ?")
     st.markdown("### Your AI-powered culinary compass.")
     st.write("Never wonder what to cook again. Just show me your ingredients, and I'll do the rest.")
@@ -105,6 +174,7 @@ def welcome_page():
 
 
 def meal_selection_page():
+    preload_models()
     st.title("What type of meal are you planning?")
     meal_type = st.radio(
         "Select one:",
@@ -126,21 +196,27 @@ def upload_page():
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
     
     if uploaded_file is not None:
-        temp_dir = Path("temp_uploads")
-        temp_dir.mkdir(exist_ok=True)
-        image_path = temp_dir / uploaded_file.name
-        
-        with open(image_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        with tracing.span("upload.read"):
+            image_bytes = uploaded_file.getvalue()
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+
+        # Reruns with the same file still in the uploader skip decoding and detection.
+        detections = get_stage("detection", image_hash)
+        if detections is None:
+            # Decode the upload once in memory; the preview and the detector share the pixels.
+            image = decode_upload(image_bytes)
+                
+            st.image(image, caption="Image you uploaded.", use_container_width=True)
             
-        st.image(str(image_path), caption="Image you uploaded.", use_container_width=True)
-        
-        with st.spinner("Analyzing your ingredients... This might take a moment."):
-            detected_items = get_ingredients_from_image(str(image_path))
-            st.session_state.detected_ingredients = detected_items
-        
-        st.success("Analysis complete!")
-        time.sleep(1)
+            with st.spinner("Analyzing your ingredients... This might take a moment."):
+                detections = set_stage("detection", image_hash, detect_image(image, image_bytes))
+            
+            st.success("Analysis complete!")
+            time.sleep(1)
+
+        st.session_state.detected_ingredients = detections.ingredients
+        st.session_state.ingredient_counts = detections.counts
+        st.session_state.uncertain_ingredients = detections.low_confidence
         navigate_to("confirmation")
         st.rerun()
 
@@ -153,9 +229,16 @@ def confirmation_page():
         st.session_state.detected_ingredients = []
     else:
         st.markdown("#### I found the following items:")
-        tags = " ".join([f"`{item}`" for item in st.session_state.detected_ingredients])
+        counts = st.session_state.ingredient_counts
+        tags = " ".join([f"`{item} x{counts[item]}`" if counts.get(item, 1) > 1 else f"`{item}`"
+                         for item in st.session_state.detected_ingredients])
         st.markdown(tags)
 
+    if st.session_state.uncertain_ingredients:
+        st.markdown("#### I'm not sure about these:")
+        st.markdown(" ".join([f"`{item}?`" for item in st.session_state.uncertain_ingredients]))
+        st.caption("Choose \"Add or remove ingredients\" to keep the ones you have.")
+
     st.markdown("---")
     
     col1, col2 = st.columns(2)
@@ -177,10 +260,10 @@ def add_ingredients_page():
     
     current_ingredients = set(st.session_state.detected_ingredients)
     
-    if st.session_state.detected_ingredients:
+    if st.session_state.detected_ingredients or st.session_state.uncertain_ingredients:
         items_to_keep = st.multiselect(
-            "Detected Items (unselect to remove):",
-            options=st.session_state.detected_ingredients,
+            "Detected Items (unselect to remove, select the ones I wasn't sure about):",
+            options=st.session_state.detected_ingredients + st.session_state.uncertain_ingredients,
             default=st.session_state.detected_ingredients
         )
         current_ingredients = set(items_to_keep)
@@ -210,6 +293,34 @@ def add_ingredients_page():
         st.rerun()
 
 
+@st.fragment(run_every=2)
+def late_recipes_status():
+    """
+    Checks every two seconds, without blocking the page, whether the chef's recipes arrived after the quick ones.
+
+    Once they arrive or the wait is over, the recipes shown become the stage output and the
+    page reruns without this fragment, which stops the polling.
+    """
+    pending = st.session_state.get("pending_recipes")
+    if pending is None:
+        return
+    stream = pending["stream"]
+    late = stream.late_recipes(timeout=0)
+    if late is not None:
+        set_stage("recipes", pending["inputs"], dict(zip(("healthy", "tasty"), late)))
+        del st.session_state["pending_recipes"]
+        st.session_state.late_recipes_result = "arrived"
+        st.rerun()
+    elif stream.finished or time.monotonic() - pending["since"] > startup.get_recipe_generator().RECIPE_LATE_WAIT:
+        set_stage("recipes", pending["inputs"], pending["recipes"])
+        del st.session_state["pending_recipes"]
+        st.session_state.late_recipes_result = "missed"
+        st.rerun()
+    else:
+        st.info("The chef is taking a while, so here are quick recipes from your pantry. "
+                "They will be replaced here when the chef's recipes arrive.")
+
+
 def recipe_page():
     st.title("Here are your custom recipes! ??")
     
@@ -220,21 +331,64 @@ def recipe_page():
             st.rerun()
         return
 
-    with st.spinner("Your personal chef (the AI) is thinking..."):
-        healthy_recipe, tasty_recipe = generate_two_recipes(
-            st.session_state.meal_type,
-            st.session_state.final_ingredients
-        )
-    
-    st.balloons()
-    
     tab1, tab2 = st.tabs(["  Healthy Dish  ", "  Tasty Dish  "])
     
     with tab1:
-        st.markdown(healthy_recipe)
+        healthy_placeholder = st.empty()
         
     with tab2:
-        st.markdown(tasty_recipe)
+        tasty_placeholder = st.empty()
+    
+    placeholders = {"healthy": healthy_placeholder, "tasty": tasty_placeholder}
+    recipe_inputs = (st.session_state.meal_type, tuple(sorted(st.session_state.final_ingredients)))
+
+    # Any rerun of this page (a widget, the Start Over button) shows the recipes it already has.
+    recipes = get_stage("recipes", recipe_inputs)
+    pending = st.session_state.get("pending_recipes")
+    if pending is not None and pending["inputs"] != recipe_inputs:
+        pending = None
+    if recipes is not None:
+        for section, text in recipes.items():
+            placeholders[section].markdown(text)
+        late_result = st.session_state.pop("late_recipes_result", None)
+        if late_result == "arrived":
+            st.success("The chef's recipes have arrived!")
+        elif late_result == "missed":
+            st.warning("The chef's recipes didn't arrive in time. Enjoy the quick recipes!")
+    elif pending is not None:
+        for section, text in pending["recipes"].items():
+            placeholders[section].markdown(text)
+    else:
+        healthy_placeholder.markdown("_Your personal chef (the AI) is thinking..._")
+        tasty_placeholder.markdown("_The tasty dish comes right after the healthy one..._")
+
+        # Fill both tabs in as the recipe text streams in.
+        recipes = {"healthy": "", "tasty": ""}
+        pieces = stream_two_recipes(
+            st.session_state.meal_type,
+            st.session_state.final_ingredients
+        )
+        for section, text in pieces:
+            if text is None:
+                # The connection dropped and this recipe starts over; only the new text is kept.
+                recipes[section] = ""
+                placeholders[section].markdown("_The connection dropped, starting this recipe again..._")
+                continue
+            recipes[section] += text
+            placeholders[section].markdown(recipes[section])
+
+        if getattr(pieces, "source", None) == "fallback":
+            # The quick recipes are not stored as the stage output; late_recipes_status
+            # swaps the chef's recipes in if they arrive, while the page stays usable.
+            pending = {"inputs": recipe_inputs, "recipes": recipes, "stream": pieces, "since": time.monotonic()}
+            st.session_state.pending_recipes = pending
+        else:
+            set_stage("recipes", recipe_inputs, recipes)
+    
+        st.balloons()
+
+    if pending is not None:
+        late_recipes_status()
         
     if st.button("Start Over"):
         for key in st.session_state.keys():
@@ -246,15 +400,17 @@ initialize_session_state()
 
 page_to_show = st.session_state.get("page", "welcome")
 
-if page_to_show == "welcome":
-    welcome_page()
-elif page_to_show == "meal_selection":
-    meal_selection_page()
-elif page_to_show == "upload":
-    upload_page()
-elif page_to_show == "confirmation":
-    confirmation_page()
-elif page_to_show == "add_ingredients":
-    add_ingredients_page()
-elif page_to_show == "recipe":
-    recipe_page()
\ No newline at end of file
+# One span per script run, so slow pages show up next to the stages they contain.
+with tracing.span("page", page=page_to_show):
+    if page_to_show == "welcome":
+        welcome_page()
+    elif page_to_show == "meal_selection":
+        meal_selection_page()
+    elif page_to_show == "upload":
+        upload_page()
+    elif page_to_show == "confirmation":
+        confirmation_page()
+    elif page_to_show == "add_ingredients":
+        add_ingredients_page()
+    elif page_to_show == "recipe":
+        recipe_page()
\ No newline at end of file
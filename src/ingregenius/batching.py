@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent single-item requests into batches for one batched call.
+
+    A background thread waits for the first request, then keeps collecting until
+    either max_batch_size requests are queued or max_wait_ms has passed. The whole
+    batch is handed to batch_fn, and every caller gets back its own result (or the
+    exception raised by batch_fn).
+    """
+
+    def __init__(self, batch_fn: Callable[[list], list], max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches_run = 0
+        self.items_run = 0
+        self._queue: Queue = Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """Queues one item and returns a Future for its result."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Queues one item and blocks until its result is ready."""
+        return self.submit(item).result()
+
+    def close(self):
+        """Stops the background thread after the queued requests are served."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+            except Empty:
+                break
+            if entry is None:
+                # Put the sentinel back so the loop exits after this batch.
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            # Skip requests whose caller already gave up.
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.items_run += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+def measure_throughput(fn: Callable, items: list, concurrency: int, requests: int) -> dict:
+    """
+    Calls fn from `concurrency` threads until `requests` calls have completed.
+
+    Args:
+        fn (Callable): The single-item function to measure.
+        items (list): Inputs, reused round-robin.
+        concurrency (int): Number of simultaneous callers.
+        requests (int): Total number of calls.
+
+    Returns:
+        dict: Elapsed seconds, requests per second, and mean and p95 latency in milliseconds.
+    """
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+    latencies = []
+
+    def caller():
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            fn(items[i % len(items)])
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=caller) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": elapsed,
+        "images_per_second": requests / elapsed,
+        "mean_latency_ms": 1000 * sum(latencies) / len(latencies),
+        "p95_latency_ms": 1000 * sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+# --- This block measures detector throughput at 1/4/16 concurrent callers ---
+if __name__ == '__main__':
+    from functools import partial
+    from pathlib import Path
+    from . import food_detector
+
+    image_dir = Path(__file__).resolve().parent.parent.parent / 'Images_for_testing'
+    images = [str(p) for p in sorted(image_dir.glob("*.jpg"))]
+    food_detector.get_model()
+
+    for concurrency in (1, 4, 16):
+        for label, fn in (("unbatched", food_detector.get_ingredients_from_image_unbatched),
+                          ("micro-batched", partial(food_detector.get_ingredients_from_image, use_cache=False, coalesce=False))):
+            stats = measure_throughput(fn, images, concurrency, requests=4 * len(images) * concurrency)
+            print(f"{label:>14} | {concurrency:>2} callers | {stats['images_per_second']:6.2f} img/s | "
+                  f"mean latency {stats['mean_latency_ms']:7.1f} ms")
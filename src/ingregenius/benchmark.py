@@ -0,0 +1,356 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from . import food_detector
+from .batching import measure_throughput
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+TEST_IMAGES_DIR = PROJECT_ROOT / 'Images_for_testing'
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+STAGES = ("decode", "preprocess", "inference", "postprocess", "total")
+RECIPE_BENCH_MEAL = "Dinner"
+RECIPE_BENCH_INGREDIENTS = ["Chicken Breast", "Tomato", "Onion", "Cheese", "Spinach"]
+
+# Metrics compared by --compare, and whether a higher value is better.
+HIGHER_IS_BETTER = ("images_per_second", "classes_per_image", "recall_gain")
+
+# Runs in a fresh interpreter so the import of ultralytics/torch is part of the cold start.
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from ultralytics import YOLO
+imported = time.perf_counter()
+model = YOLO(sys.argv[1], task="detect")
+loaded = time.perf_counter()
+model.predict(source=sys.argv[2], imgsz=int(sys.argv[3]), device=sys.argv[4] or None, verbose=False)
+done = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "model_load_s": loaded - imported, "first_inference_s": done - loaded}))
+"""
+
+
+def find_images(folders: list[Path]) -> list[Path]:
+    """Returns every image below the given folders, sorted by path."""
+    images = []
+    for folder in folders:
+        images.extend(sorted(p for p in Path(folder).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES))
+    return images
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Summarizes latency samples (in milliseconds) as mean, p50, p95 and p99."""
+    values = np.asarray(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def measure_cold_start(weights: Path, image: Path) -> dict:
+    """Measures import, model load and first inference time in a fresh Python process."""
+    output = subprocess.run(
+        [sys.executable, "-c", _COLD_START_SCRIPT, str(weights), str(image),
+         str(food_detector.MODEL_IMGSZ), food_detector.DETECTOR_DEVICE or ""],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_latency(images: list[Path], rounds: int) -> dict:
+    """
+    Runs every image `rounds` times, one at a time, and breaks each run down by stage.
+
+    Decode is timed here; preprocess, inference and postprocess come from ultralytics'
+    result.speed. Total is the wall time of the whole call.
+    """
+    loaded = food_detector.get_model()
+    samples = {stage: [] for stage in STAGES}
+
+    for _ in range(rounds):
+        for path in images:
+            start = time.perf_counter()
+            image = food_detector._to_model_input(path)
+            decoded = time.perf_counter()
+            result = loaded.predict(image, imgsz=food_detector.MODEL_IMGSZ)[0]
+            done = time.perf_counter()
+
+            samples["decode"].append(1000 * (decoded - start))
+            for stage in ("preprocess", "inference", "postprocess"):
+                samples[stage].append(result.speed[stage])
+            samples["total"].append(1000 * (done - start))
+
+    return {stage: percentiles(values) for stage, values in samples.items()}
+
+
+def measure_batch_sizes(images: list[Path], batch_sizes: list[int], rounds: int) -> dict:
+    """Measures images per second when the detector is handed batches of each size."""
+    loaded = food_detector.get_model()
+    report = {}
+    for batch_size in batch_sizes:
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            food_detector._detect_batch(batch, loaded)
+        elapsed = time.perf_counter() - start
+        report[str(batch_size)] = {"images_per_second": batch_size * rounds / elapsed,
+                                   "ms_per_batch": 1000 * elapsed / rounds}
+    return report
+
+
+def measure_concurrency(images: list[Path], levels: list[int], requests_per_caller: int) -> dict:
+    """Measures images per second and mean latency with several simultaneous callers."""
+    detect = partial(food_detector.get_ingredients_from_image, use_cache=False, coalesce=False)
+    report = {}
+    for concurrency in levels:
+        stats = measure_throughput(detect, images, concurrency, requests=requests_per_caller * concurrency)
+        report[str(concurrency)] = {"images_per_second": stats["images_per_second"],
+                                    "mean_latency_ms": stats["mean_latency_ms"]}
+    return report
+
+
+def measure_tiling(images: list[Path], rounds: int) -> dict:
+    """
+    Compares the plain detector with tiled high-resolution inference on the same photos.
+
+    Without labels, the recall gain is estimated as the ingredients the tiled mode finds
+    that the plain pass misses, relative to what the plain pass finds.
+    """
+    loaded = food_detector.get_model()
+    samples = {"plain": [], "tiled": []}
+    found = {"plain": [], "tiled": []}
+    tiles_run, tiles_total, gained = [], [], 0
+
+    for round_index in range(rounds):
+        for path in images:
+            start = time.perf_counter()
+            plain = food_detector._names_from_result(
+                food_detector._predict([food_detector.load_image(path, food_detector.MODEL_IMGSZ)], loaded)[0])
+            samples["plain"].append(1000 * (time.perf_counter() - start))
+
+            start = time.perf_counter()
+            tiled = food_detector.detect_tiled(path, loaded)
+            samples["tiled"].append(1000 * (time.perf_counter() - start))
+
+            if round_index == 0:
+                found["plain"].append(len(plain))
+                found["tiled"].append(len(tiled.ingredients))
+                gained += len(set(tiled.ingredients) - set(plain))
+                tiles_run.append(tiled.tiles_run)
+                tiles_total.append(tiled.tiles_total)
+
+    plain_found = sum(found["plain"])
+    return {
+        "plain_ms": percentiles(samples["plain"]),
+        "tiled_ms": percentiles(samples["tiled"]),
+        "plain_classes_per_image": plain_found / len(images),
+        "tiled_classes_per_image": sum(found["tiled"]) / len(images),
+        "recall_gain": gained / plain_found if plain_found else float(gained),
+        "tiles_run": float(np.mean(tiles_run)),
+        "tiles_total": float(np.mean(tiles_total)),
+    }
+
+
+def measure_recipe_modes(requests: int, latency_ms: float = 800, tokens_per_second: float = 40) -> dict:
+    """
+    Compares single-call and fan-out recipe generation against the local stand-in LLM.
+
+    The recipe cache and request coalescing are bypassed, so every request reaches the
+    stand-in. Latency is measured to the first piece of each recipe and to the end of
+    both; token counts come from the usage the stand-in reports.
+    """
+    from . import llm_client, recipe_generator
+    from .llm_stub_server import StubSettings, start_stub_server
+
+    settings = StubSettings(latency_ms=latency_ms, jitter_ms=0, tokens_per_second=tokens_per_second)
+    server, base_url = start_stub_server(settings=settings)
+    previous_client = llm_client._client
+    llm_client._client = llm_client.LLMClient(base_url=base_url, api_key="stub")
+    report = {}
+    try:
+        for mode, stream_fn in (("single", recipe_generator._stream_from_llm),
+                                ("fanout", recipe_generator._stream_fanout)):
+            with settings.lock:
+                settings.requests = settings.prompt_tokens = settings.completion_tokens = 0
+            samples = {"healthy_first": [], "tasty_first": [], "total": []}
+            for _ in range(requests):
+                start = time.perf_counter()
+                first = {}
+                for section, _text in stream_fn(RECIPE_BENCH_MEAL, RECIPE_BENCH_INGREDIENTS, None):
+                    first.setdefault(section, 1000 * (time.perf_counter() - start))
+                samples["total"].append(1000 * (time.perf_counter() - start))
+                samples["healthy_first"].append(first.get("healthy", samples["total"][-1]))
+                samples["tasty_first"].append(first.get("tasty", samples["total"][-1]))
+            report[mode] = {
+                **{f"{name}_ms": percentiles(values) for name, values in samples.items()},
+                "llm_calls_per_request": settings.requests / requests,
+                "prompt_tokens_per_request": settings.prompt_tokens / requests,
+                "completion_tokens_per_request": settings.completion_tokens / requests,
+            }
+    finally:
+        llm_client._client = previous_client
+        server.shutdown()
+    return report
+
+
+def print_recipe_modes(report: dict):
+    print(f"{'mode':>8} | {'healthy first':>13} | {'tasty first':>11} | {'both done':>9} | {'calls':>5} | "
+          f"{'prompt tok':>10} | {'compl. tok':>10}  (p50 ms, per request)")
+    for mode, stats in report.items():
+        print(f"{mode:>8} | {stats['healthy_first_ms']['p50']:13.0f} | {stats['tasty_first_ms']['p50']:11.0f} | "
+              f"{stats['total_ms']['p50']:9.0f} | {stats['llm_calls_per_request']:5.1f} | "
+              f"{stats['prompt_tokens_per_request']:10.0f} | {stats['completion_tokens_per_request']:10.0f}")
+
+
+def run_benchmark(images: list[Path], rounds: int = 3, concurrency: list[int] = (1, 4, 16),
+                  batch_sizes: list[int] = (1, 4, 8), cold_start: bool = True, tiling: bool = True) -> dict:
+    """Runs every measurement and returns the results as a JSON-serializable dict."""
+    weights = food_detector.get_model().weights_path
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "weights": str(weights),
+            "engine": food_detector.DETECTOR_ENGINE,
+            "int8": food_detector.DETECTOR_INT8,
+            "device": food_detector.DETECTOR_DEVICE or "auto",
+            "imgsz": food_detector.MODEL_IMGSZ,
+            "images": len(images),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+    if cold_start:
+        report["cold_start"] = measure_cold_start(weights, images[0])
+    report["latency_ms"] = measure_latency(images, rounds)
+    report["batch"] = measure_batch_sizes(images, list(batch_sizes), rounds)
+    report["concurrency"] = measure_concurrency(images, list(concurrency), rounds)
+    if tiling:
+        report["tiling"] = measure_tiling(images, rounds)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def _flatten(report: dict, prefix: str = "") -> dict:
+    """Flattens nested metrics into {"latency_ms.total.p95": value} form."""
+    flat = {}
+    for key, value in report.items():
+        if key == "meta":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[dict]:
+    """
+    Lists every metric that got worse than the baseline by more than threshold.
+
+    Args:
+        baseline (dict): A report written by an earlier run.
+        current (dict): The report of this run.
+        threshold (float): Allowed relative slowdown, e.g. 0.1 for 10%.
+
+    Returns:
+        list[dict]: One entry per regression with the metric name, both values and the change.
+    """
+    old, new = _flatten(baseline), _flatten(current)
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] <= 0:
+            continue
+        change = (new[name] - old[name]) / old[name]
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        if worse > threshold:
+            regressions.append({"metric": name, "baseline": old[name], "current": new[name], "change": change})
+    return regressions
+
+
+def print_report(report: dict):
+    meta = report["meta"]
+    print(f"Engine {meta['engine']}{' INT8' if meta['int8'] else ''} on {meta['device']}, "
+          f"{meta['images']} images, imgsz {meta['imgsz']}")
+    if "cold_start" in report:
+        cold = report["cold_start"]
+        print(f"Cold start: import {cold['import_s']:.2f}s, load {cold['model_load_s']:.2f}s, "
+              f"first inference {cold['first_inference_s']:.2f}s")
+    print(f"{'stage':>12} | {'mean':>8} | {'p50':>8} | {'p95':>8} | {'p99':>8}  (ms)")
+    for stage, stats in report["latency_ms"].items():
+        print(f"{stage:>12} | {stats['mean']:8.1f} | {stats['p50']:8.1f} | {stats['p95']:8.1f} | {stats['p99']:8.1f}")
+    for batch_size, stats in report["batch"].items():
+        print(f"batch {batch_size:>3}: {stats['images_per_second']:7.2f} img/s")
+    for concurrency, stats in report["concurrency"].items():
+        print(f"{concurrency:>3} callers: {stats['images_per_second']:7.2f} img/s, "
+              f"mean latency {stats['mean_latency_ms']:.1f} ms")
+    if "tiling" in report:
+        tiling = report["tiling"]
+        print(f"Tiled: p50 {tiling['tiled_ms']['p50']:.1f} ms vs {tiling['plain_ms']['p50']:.1f} ms plain, "
+              f"{tiling['tiles_run']:.1f} of {tiling['tiles_total']:.1f} tiles run, "
+              f"{tiling['tiled_classes_per_image']:.2f} vs {tiling['plain_classes_per_image']:.2f} ingredients "
+              f"per image ({tiling['recall_gain']:+.0%} found)")
+    print(f"Peak RSS: {report['peak_rss_mb']:.0f} MiB")
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the ingredient detector.")
+    parser.add_argument("--images", type=Path, nargs="+", default=[TEST_IMAGES_DIR], help="Image folders to run over.")
+    parser.add_argument("--rounds", type=int, default=3, help="How often each measurement repeats the images.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--no-cold-start", action="store_true", help="Skip the fresh-process cold start measurement.")
+    parser.add_argument("--no-tiling", action="store_true", help="Skip the tiled vs plain comparison.")
+    parser.add_argument("--recipes", action="store_true",
+                        help="Instead of the detector, compare the single-call and fan-out recipe modes "
+                             "against the local stand-in LLM.")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Stand-in delay before the first token.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=40, help="Stand-in generation speed.")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", type=Path, help="A previous JSON result to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown for --compare.")
+    args = parser.parse_args()
+
+    if args.recipes:
+        report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "llm_latency_ms": args.llm_latency_ms,
+                           "llm_tokens_per_second": args.llm_tokens_per_second},
+                  "recipe_modes": measure_recipe_modes(args.rounds, args.llm_latency_ms, args.llm_tokens_per_second)}
+        print_recipe_modes(report["recipe_modes"])
+    else:
+        images = find_images(args.images)
+        if not images:
+            sys.exit(f"Error: No images found in {', '.join(map(str, args.images))}.")
+
+        report = run_benchmark(images, args.rounds, args.concurrency, args.batch_sizes, not args.no_cold_start,
+                               not args.no_tiling)
+        print_report(report)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} ({r['change']:+.1%})")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} compared to {args.compare}.")
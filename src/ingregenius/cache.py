@@ -0,0 +1,178 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# Returned by get() on a miss, so that cached None/empty values still count as hits.
+MISSING = object()
+
+
+class CacheStats:
+    """Hit, miss and eviction counters shared by the cache tiers."""
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded in-memory cache that evicts the least recently used entry.
+
+    With ttl_seconds set, entries older than that are treated as missing and dropped.
+    """
+
+    def __init__(self, max_entries: int, stats: CacheStats | None = None, ttl_seconds: float | None = None):
+        self.max_entries = max_entries
+        self.stats = stats or CacheStats()
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, created = entry
+            if self.ttl_seconds is not None and time.time() - created > self.ttl_seconds:
+                del self._entries[key]
+                self.stats.expirations += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, created: float | None = None):
+        with self._lock:
+            self._entries[key] = (value, time.time() if created is None else created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache:
+    """A persistent key/value store in a single SQLite file. Values must be JSON-serializable."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def get(self, key, max_age: float | None = None):
+        """Returns the value, or MISSING if the key is absent or older than max_age seconds."""
+        value, _ = self.get_with_time(key, max_age)
+        return value
+
+    def get_with_time(self, key, max_age: float | None = None) -> tuple:
+        """Returns (value, creation time), or (MISSING, None). An entry older than max_age is deleted."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and max_age is not None and time.time() - row[1] > max_age:
+                with self._conn:
+                    self._conn.execute("DELETE FROM cache WHERE key = ? AND created = ?", (key, row[1]))
+                row = None
+        if row is None:
+            return MISSING, None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+    def keys(self, max_age: float | None = None) -> list[str]:
+        """Returns every stored key, optionally only those younger than max_age seconds."""
+        oldest = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM cache WHERE created >= ?", (oldest,))]
+
+    def delete_expired(self, max_age: float) -> int:
+        """Deletes entries older than max_age seconds and returns how many were removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+    def prune_except_prefix(self, prefix: str) -> int:
+        """Deletes every entry whose key does not start with prefix and returns how many were removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM cache WHERE substr(key, 1, ?) != ?", (len(prefix), prefix))
+        return cursor.rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+
+class TieredCache:
+    """
+    An LRU memory tier in front of an optional on-disk tier.
+
+    Lookups try memory first, then disk; disk hits are promoted into memory.
+    Writes go to both tiers. ttl_seconds applies to both tiers.
+    """
+
+    def __init__(self, max_entries: int, disk_path: str | Path | None = None, ttl_seconds: float | None = None):
+        self.stats = CacheStats()
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_entries, self.stats, ttl_seconds)
+        self.disk = DiskCache(disk_path) if disk_path else None
+        if self.disk is not None and ttl_seconds is not None:
+            self.disk.delete_expired(ttl_seconds)
+
+    def get(self, key, count: bool = True):
+        """Returns the value or MISSING. count=False leaves the hit and miss counters untouched."""
+        value = self.memory.get(key)
+        if value is MISSING and self.disk is not None:
+            value, created = self.disk.get_with_time(key, self.ttl_seconds)
+            if value is not MISSING:
+                self.stats.disk_hits += 1
+                # Keep the original creation time so the TTL is not extended by the promotion.
+                self.memory.put(key, value, created)
+        if count:
+            if value is MISSING:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
@@ -0,0 +1,111 @@
+import numpy as np
+
+# The detector's result type. It only needs NumPy, so the inference client and the app
+# can use it without importing ultralytics.
+
+
+class Detections:
+    """
+    The boxes found in one image, as parallel arrays (one entry per box).
+
+    Every box at or above the detector's confidence floor is kept. Boxes that also
+    reach the threshold of their class are confirmed; an ingredient with only
+    unconfirmed boxes is reported as low-confidence instead of being dropped.
+
+    Attributes:
+        class_ids (np.ndarray): int16 class id of each box.
+        confidences (np.ndarray): float32 confidence of each box.
+        boxes (np.ndarray): float32 Nx4 xyxy boxes in pixels of the analyzed image.
+        confirmed (np.ndarray): Whether each box reached its class threshold.
+        names (dict[int, str]): Class name of every class id present.
+        counts (dict[str, int]): Confirmed boxes per ingredient, most confident first.
+        max_conf (dict[str, float]): Highest box confidence per ingredient, confirmed or not.
+    """
+
+    __slots__ = ("class_ids", "confidences", "boxes", "confirmed", "names", "counts", "max_conf")
+
+    def __init__(self, class_ids: np.ndarray, confidences: np.ndarray, boxes: np.ndarray,
+                 confirmed: np.ndarray, names: dict[int, str]):
+        self.class_ids = class_ids
+        self.confidences = confidences
+        self.boxes = boxes
+        self.confirmed = confirmed
+        self.names = names
+
+        unique_ids, inverse = np.unique(class_ids, return_inverse=True)
+        counts = np.bincount(inverse, weights=confirmed, minlength=len(unique_ids)).astype(np.int64)
+        best = np.zeros(len(unique_ids), dtype=np.float32)
+        np.maximum.at(best, inverse, confidences)
+        order = np.argsort(-best, kind="stable")
+        self.counts = {names[int(unique_ids[i])]: int(counts[i]) for i in order if counts[i]}
+        self.max_conf = {names[int(unique_ids[i])]: float(best[i]) for i in order}
+
+    @classmethod
+    def from_arrays(cls, boxes: np.ndarray, confidences: np.ndarray, class_ids: np.ndarray,
+                    names: dict[int, str], thresholds: np.ndarray | None = None, min_conf: float = 0.0,
+                    top_k: int = 0) -> "Detections":
+        """
+        Filters raw model output without a Python loop over the boxes.
+
+        Args:
+            boxes (np.ndarray): Nx4 xyxy boxes.
+            confidences (np.ndarray): N confidences.
+            class_ids (np.ndarray): N class ids.
+            names (dict[int, str]): The model's class names.
+            thresholds (np.ndarray | None): Confirmation threshold indexed by class id;
+                None confirms every box.
+            min_conf (float): Boxes below this are dropped.
+            top_k (int): Keep only the most confident top_k boxes; 0 keeps all.
+
+        Returns:
+            Detections: The kept boxes, most confident first.
+        """
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+        confidences = np.asarray(confidences, dtype=np.float32)
+        order = np.argsort(-confidences, kind="stable")
+        order = order[confidences[order] >= min_conf]
+        if top_k > 0:
+            order = order[:top_k]
+
+        class_ids, confidences = class_ids[order], confidences[order]
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)[order]
+        confirmed = np.ones(len(order), dtype=bool) if thresholds is None else confidences >= thresholds[class_ids]
+        present = {int(i): names[int(i)] for i in np.unique(class_ids)}
+        return cls(class_ids.astype(np.int16), confidences, boxes, confirmed, present)
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(np.empty(0, np.int16), np.empty(0, np.float32), np.empty((0, 4), np.float32),
+                   np.empty(0, bool), {})
+
+    def __len__(self) -> int:
+        return len(self.class_ids)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(counts={self.counts}, low_confidence={self.low_confidence})"
+
+    @property
+    def ingredients(self) -> list[str]:
+        """The unique confirmed ingredient names, most confident first."""
+        return list(self.counts)
+
+    @property
+    def low_confidence(self) -> list[str]:
+        """Ingredients seen only below their class threshold, most confident first."""
+        return [name for name in self.max_conf if name not in self.counts]
+
+    def as_dict(self) -> dict:
+        """A JSON-serializable form, for the detection cache and the inference service."""
+        return {
+            "class_ids": self.class_ids.tolist(),
+            "confidences": self.confidences.tolist(),
+            "boxes": self.boxes.tolist(),
+            "confirmed": self.confirmed.tolist(),
+            "names": {str(i): name for i, name in self.names.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Detections":
+        return cls(np.asarray(data["class_ids"], dtype=np.int16), np.asarray(data["confidences"], dtype=np.float32),
+                   np.asarray(data["boxes"], dtype=np.float32).reshape(-1, 4), np.asarray(data["confirmed"], dtype=bool),
+                   {int(i): name for i, name in data["names"].items()})
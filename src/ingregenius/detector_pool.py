@@ -0,0 +1,235 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from .batching import measure_throughput
+
+# A pool of detector processes, each with its own model replica, its own torch thread
+# count and (on Linux) its own set of CPU cores. One model in one process leaves most
+# cores of a 16- or 32-core node idle, while several sessions sharing it with torch's
+# default threading oversubscribe the cores; pinned replicas avoid both.
+#
+# This module must not import food_detector at the top: the workers set their thread
+# limits before torch is loaded, and the parent process does not need a model at all.
+
+# --- Configuration ---
+load_dotenv()
+
+# Worker processes; 0 keeps detection in the calling process.
+DETECTOR_POOL_WORKERS = int(os.getenv("DETECTOR_POOL_WORKERS", "0"))
+# torch intra-op threads per worker; 0 splits the cores evenly between the workers.
+DETECTOR_POOL_THREADS = int(os.getenv("DETECTOR_POOL_THREADS", "0"))
+# Pin each worker to its own cores (Linux only).
+DETECTOR_POOL_PIN = os.getenv("DETECTOR_POOL_PIN", "1") == "1"
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+TEST_IMAGES_DIR = PROJECT_ROOT / 'Images_for_testing'
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def _available_cores() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Set in every worker by _init_worker; see DetectorPool._warmup.
+_warmup_barrier = None
+
+
+def _init_worker(counter, barrier, threads: int, pin: bool, cores: list[int], weights_path: str | None = None):
+    """Runs once in every worker: claims an index, pins the cores, limits threads, loads the model."""
+    global _warmup_barrier
+
+    _warmup_barrier = barrier
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    if pin and hasattr(os, "sched_setaffinity"):
+        own = [cores[(index * threads + i) % len(cores)] for i in range(threads)]
+        os.sched_setaffinity(0, own)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    if weights_path:
+        # Read by food_detector on import, so every later call in this worker uses these weights.
+        os.environ["DETECTOR_WEIGHTS"] = weights_path
+
+    import torch
+    torch.set_num_threads(threads)
+    # Requests arrive one at a time per worker; a single inter-op thread is enough.
+    torch.set_num_interop_threads(1)
+
+    from . import food_detector
+    food_detector.get_model()
+
+
+def _wait_for_all_workers(timeout: float):
+    # A worker only takes tasks once _init_worker, and so the model load, has finished.
+    _warmup_barrier.wait(timeout)
+
+
+def _detect_in_worker(image):
+    from . import food_detector
+    return food_detector.detect_image_unbatched(image)
+
+
+class DetectorPool:
+    """
+    Spreads detections over `workers` processes holding one model replica each.
+
+    Requests go through a shared queue, so each one is picked up by the next idle
+    worker. Results are not cached here; food_detector caches them in the parent.
+    """
+
+    def __init__(self, workers: int, threads: int = 0, pin: bool = DETECTOR_POOL_PIN):
+        self._cores = _available_cores()
+        self.workers = workers
+        self.threads = threads or max(1, len(self._cores) // workers)
+        self.pin = pin
+        # Spawned, not forked: a forked child would inherit the parent's torch thread pools.
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self, weights_path: Path | None = None) -> ProcessPoolExecutor:
+        counter = self._context.Value("i", 0)
+        barrier = self._context.Barrier(self.workers)
+        return ProcessPoolExecutor(self.workers, mp_context=self._context, initializer=_init_worker,
+                                   initargs=(counter, barrier, self.threads, self.pin, self._cores,
+                                             str(weights_path) if weights_path else None))
+
+    def _warmup(self, executor: ProcessPoolExecutor, timeout: float = 600):
+        """
+        Returns once every worker of the executor has loaded its model.
+
+        Each of the `workers` tasks blocks at a barrier until all of them are running, so
+        no worker can take two of them and every worker must have finished its initializer.
+        A worker that fails to start breaks the barrier after timeout seconds.
+        """
+        list(executor.map(_wait_for_all_workers, [timeout] * self.workers))
+
+    def warmup(self):
+        """Waits until every worker has loaded its model."""
+        self._warmup(self._executor)
+
+    def recycle(self, weights_path: Path):
+        """
+        Replaces every worker with a new one serving weights_path.
+
+        The new workers have all loaded the weights before they take over; requests
+        already sent to the old workers finish there. If the new workers fail to
+        start, the old ones keep serving and the error is raised.
+        """
+        executor = self._start(weights_path)
+        try:
+            self._warmup(executor)
+        except Exception:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        with self._lock:
+            old, self._executor = self._executor, executor
+        threading.Thread(target=old.shutdown, name="detector-pool-retire", daemon=True).start()
+
+    def detect(self, image):
+        """Runs one detection on the next free worker and returns its Detections. Encoded bytes are cheaper to send than arrays."""
+        with self._lock:
+            future = self._executor.submit(_detect_in_worker, image)
+        return future.result()
+
+    def detect_all(self, images: list) -> list:
+        """Runs several detections at once, spread over the workers, and returns their Detections in order."""
+        with self._lock:
+            futures = [self._executor.submit(_detect_in_worker, image) for image in images]
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self._lock:
+            self._executor.shutdown(wait=True)
+
+
+_pool: DetectorPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_detector_pool() -> DetectorPool:
+    """Returns the process-wide pool of DETECTOR_POOL_WORKERS workers, starting it on first use."""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DetectorPool(DETECTOR_POOL_WORKERS, DETECTOR_POOL_THREADS)
+    return _pool
+
+
+def tune(images: list[bytes], worker_counts: list[int], thread_counts: list[int],
+         target_p95_ms: float, requests: int) -> list[dict]:
+    """
+    Measures every workers x threads setting that fits on the available cores.
+
+    Each setting is driven by twice as many concurrent callers as it has workers, so
+    every replica stays busy while requests queue up the way they do under load.
+
+    Returns:
+        list[dict]: One row per setting with throughput and latency, fastest first.
+    """
+    cores = len(_available_cores())
+    rows = []
+    for workers in worker_counts:
+        for threads in thread_counts:
+            if workers * threads > cores:
+                continue
+            pool = DetectorPool(workers, threads)
+            try:
+                pool.warmup()
+                stats = measure_throughput(pool.detect, images, concurrency=2 * workers, requests=requests)
+            finally:
+                pool.close()
+            row = {"workers": workers, "threads": threads, "images_per_second": stats["images_per_second"],
+                   "mean_latency_ms": stats["mean_latency_ms"], "p95_latency_ms": stats["p95_latency_ms"],
+                   "meets_target": stats["p95_latency_ms"] <= target_p95_ms}
+            print(f"{workers:>3} workers x {threads:>2} threads: {row['images_per_second']:7.2f} img/s, "
+                  f"p95 {row['p95_latency_ms']:7.1f} ms{'' if row['meets_target'] else '  (misses target)'}")
+            rows.append(row)
+    return sorted(rows, key=lambda row: -row["images_per_second"])
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find the detector pool size with the best throughput at a p95 target.")
+    parser.add_argument("--images", type=Path, default=TEST_IMAGES_DIR, help="Folder of benchmark images.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--target-p95-ms", type=float, default=500)
+    parser.add_argument("--requests", type=int, default=64, help="Detections per setting.")
+    parser.add_argument("--output", type=Path, help="Write all measured settings to this JSON file.")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in args.images.rglob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    if not paths:
+        sys.exit(f"Error: No images found in {args.images}.")
+    images = [p.read_bytes() for p in paths]
+
+    print(f"Tuning on {len(_available_cores())} cores with {len(images)} images, target p95 {args.target_p95_ms:.0f} ms")
+    start = time.perf_counter()
+    rows = tune(images, args.workers, args.threads, args.target_p95_ms, args.requests)
+    print(f"Measured {len(rows)} settings in {time.perf_counter() - start:.0f}s.")
+
+    if args.output:
+        args.output.write_text(json.dumps(rows, indent=2))
+
+    best = next((row for row in rows if row["meets_target"]), None)
+    if best is None:
+        print("No setting met the p95 target; lower the load or raise --target-p95-ms.")
+    else:
+        print(f"\nBest: DETECTOR_POOL_WORKERS=\"{best['workers']}\" DETECTOR_POOL_THREADS=\"{best['threads']}\" "
+              f"({best['images_per_second']:.2f} img/s, p95 {best['p95_latency_ms']:.0f} ms)")
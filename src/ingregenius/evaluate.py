@@ -0,0 +1,442 @@
+import argparse
+import functools
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from . import food_detector
+from .benchmark import percentiles
+from .detections import Detections
+from .export_model import MASTER_DATA_YAML, calibration_images
+from .label_store import MASTER_LABELS_DIR, parse_label_file
+
+# Scores the detector against labeled validation images, for every combination of engine,
+# input size, batch size, NMS IoU and confidence threshold, and times each one, so the
+# production settings can be picked from one table:
+#
+#   python -m src.ingregenius.evaluate --engines torch onnx-int8 --imgsz 480 640 --conf 0.25 0.4
+#
+# The images come from a master_data.yaml-style config and their labels from master_labels,
+# which holds the source datasets' labels remapped to the master class ids.
+
+# COCO's IoU thresholds for mAP50-95; the first one is mAP50.
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# Recall levels at which precision is sampled for AP (COCO's 101-point interpolation).
+RECALL_POINTS = np.linspace(0, 1, 101)
+
+
+def parse_engine(name: str) -> tuple[str, bool]:
+    """Splits an engine name such as 'onnx-int8' into the engine and whether it is quantized."""
+    engine, _, variant = name.partition("-")
+    if engine not in food_detector.ENGINES or variant not in ("", "int8"):
+        raise ValueError(f"Unknown engine '{name}'. Use one of {', '.join(food_detector.ENGINES)}, "
+                         "optionally with an '-int8' suffix.")
+    return engine, variant == "int8"
+
+
+def weights_for(engine: str, int8: bool, weights: Path | None = None) -> Path:
+    """
+    Returns the weights to evaluate for an engine.
+
+    Without explicit PyTorch weights this is what the app would load: the active
+    weights (DETECTOR_WEIGHTS) for the configured engine, and the exports next to them,
+    or next to best.pt if they are an export themselves, for the other engines.
+    """
+    if weights is None:
+        active = food_detector.active_weights_path()
+        if (engine, int8) == (food_detector.DETECTOR_ENGINE, food_detector.DETECTOR_INT8):
+            return active
+        weights = active if active.suffix == ".pt" else food_detector.MODEL_PATH
+    return food_detector.engine_weights_path(engine, int8, weights)
+
+
+@functools.lru_cache(maxsize=4)
+def _remapped_datasets(labels_dir: Path) -> frozenset[str]:
+    return frozenset(p.name for p in labels_dir.iterdir() if p.is_dir()) if labels_dir.is_dir() else frozenset()
+
+
+def label_path(image: Path, labels_dir: Path = MASTER_LABELS_DIR) -> Path | None:
+    """
+    Finds the remapped label file of a validation image.
+
+    master_labels keeps each source dataset's layout below a folder named after it, so
+    '.../Fridge objects.v12i.yolov8/valid/images/x.jpg' is labeled by
+    'master_labels/Fridge objects.v12i.yolov8/valid/labels/x.txt'. Images of datasets that
+    were not remapped fall back to the usual YOLO 'labels' folder next to 'images'.
+
+    Returns:
+        Path | None: The label file (which may not exist for an image without objects),
+        or None if no label folder belongs to the image.
+    """
+    parts = image.parts
+    datasets = _remapped_datasets(Path(labels_dir))
+    # The dataset name can appear twice, e.g. Grocery_YOLO_Dataset_Small/Grocery_YOLO_Dataset_Small/.
+    matches = [i for i, part in enumerate(parts) if part in datasets]
+    if matches:
+        root, relative = labels_dir / parts[matches[-1]], list(parts[matches[-1] + 1:])
+    else:
+        root, relative = Path(*parts[:1]), list(parts[1:])
+    if "images" not in relative[:-1]:
+        return None
+    # The last 'images' folder becomes 'labels', as in ultralytics.
+    index = len(relative) - 2 - relative[-2::-1].index("images")
+    relative[index] = "labels"
+    candidate = (root / Path(*relative)).with_suffix(".txt")
+    return candidate if candidate.parent.is_dir() else None
+
+
+def load_ground_truth(images: list[Path], labels_dir: Path = MASTER_LABELS_DIR) -> tuple[list[Path], list]:
+    """
+    Reads the labels of every image, as class ids and normalized xyxy boxes.
+
+    Returns:
+        tuple[list[Path], list]: The images that have a label folder, and one
+        (class_ids, boxes) pair per image. A missing label file means no objects.
+    """
+    kept, truths = [], []
+    for image in images:
+        path = label_path(image, labels_dir)
+        if path is None:
+            continue
+        if path.exists():
+            class_ids, boxes = parse_label_file(path)
+        else:
+            class_ids, boxes = np.empty(0, np.int16), np.empty((0, 4), np.float32)
+        xyxy = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+        kept.append(image)
+        truths.append((class_ids.astype(np.int64), xyxy))
+    return kept, truths
+
+
+def match_predictions(pred_classes: np.ndarray, true_classes: np.ndarray, iou: np.ndarray) -> np.ndarray:
+    """
+    Marks which predictions are true positives at each of IOU_THRESHOLDS.
+
+    Every label is matched to at most one prediction of its class, highest IoU first.
+
+    Args:
+        pred_classes (np.ndarray): N predicted class ids.
+        true_classes (np.ndarray): M labeled class ids.
+        iou (np.ndarray): MxN IoU matrix between the labels and the predictions.
+
+    Returns:
+        np.ndarray: NxT boolean matrix, T = len(IOU_THRESHOLDS).
+    """
+    correct = np.zeros((len(pred_classes), len(IOU_THRESHOLDS)), dtype=bool)
+    iou = iou * (true_classes[:, None] == pred_classes[None, :])
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        labels, predictions = np.nonzero(iou >= threshold)
+        if not len(labels):
+            continue
+        order = np.argsort(-iou[labels, predictions], kind="stable")
+        labels, predictions = labels[order], predictions[order]
+        # np.unique returns the first, i.e. best, pair of every prediction and then of every label.
+        first = np.unique(predictions, return_index=True)[1]
+        labels, predictions = labels[first], predictions[first]
+        first = np.unique(labels, return_index=True)[1]
+        correct[predictions[first], t] = True
+    return correct
+
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """Returns the area under a precision-recall curve, sampled at RECALL_POINTS."""
+    if not len(recall):
+        return 0.0
+    # Precision at a recall level is the best precision at that recall or beyond.
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    index = np.searchsorted(recall, RECALL_POINTS, side="left")
+    return float(np.where(index < len(recall), envelope[np.minimum(index, len(recall) - 1)], 0.0).mean())
+
+
+def collect_matches(detections: list[Detections], sizes: list[tuple[int, int]], truths: list) -> dict:
+    """
+    Matches the predictions of every image to its labels.
+
+    Args:
+        detections (list[Detections]): The predictions, in pixels of the analyzed images.
+        sizes (list[tuple[int, int]]): Height and width of each analyzed image.
+        truths (list): (class_ids, normalized xyxy boxes) per image.
+
+    Returns:
+        dict: Flat arrays over all predictions (correct, confidences, class_ids, image) and
+        over all labels (true_classes, true_image).
+    """
+    correct, confidences, class_ids, image_ids, true_classes, true_images = [], [], [], [], [], []
+    for i, (found, (height, width), (labels, boxes)) in enumerate(zip(detections, sizes, truths)):
+        normalized = found.boxes / np.array([width, height, width, height], dtype=np.float32)
+        pred_classes = found.class_ids.astype(np.int64)
+        correct.append(match_predictions(pred_classes, labels, food_detector.box_iou(boxes, normalized)))
+        confidences.append(found.confidences)
+        class_ids.append(pred_classes)
+        image_ids.append(np.full(len(found), i))
+        true_classes.append(labels)
+        true_images.append(np.full(len(labels), i))
+    return {
+        "correct": np.concatenate(correct), "confidences": np.concatenate(confidences),
+        "class_ids": np.concatenate(class_ids), "image": np.concatenate(image_ids),
+        "true_classes": np.concatenate(true_classes), "true_image": np.concatenate(true_images),
+        "images": len(truths),
+    }
+
+
+def class_thresholds(conf: float, names: list[str]) -> np.ndarray:
+    """Returns conf for every class, except where DETECTOR_CLASS_CONF sets its own threshold."""
+    overrides = {name.lower(): value for name, value in food_detector.DETECTOR_CLASS_CONF.items()}
+    thresholds = np.full(len(names), conf, dtype=np.float32)
+    for i, name in enumerate(names):
+        thresholds[i] = overrides.get(name.lower(), conf)
+    return thresholds
+
+
+def score(matches: dict, names: list[str], conf: float) -> dict:
+    """
+    Computes per-class AP over every prediction, and precision and recall at a confidence threshold.
+
+    AP does not depend on the threshold; precision, recall and the ingredient-level scores
+    count only predictions the app would confirm, matched at IoU 0.5. Means are taken over
+    the classes that have labels.
+
+    Labels with a class id the model does not have (e.g. a model trained on fewer classes
+    than master_data.yaml lists) cannot be found; they are left out and counted instead.
+
+    Returns:
+        dict: Overall precision, recall, map50, map50_95, ingredient precision/recall/F1
+        (whether each labeled ingredient is listed for its image), the number of labels
+        left out as unknown_labels, and per-class scores.
+    """
+    num_classes = len(names)
+    correct, confidences, class_ids = matches["correct"], matches["confidences"], matches["class_ids"]
+    labels = np.bincount(matches["true_classes"], minlength=num_classes)[:num_classes]
+
+    ap = np.zeros((num_classes, len(IOU_THRESHOLDS)))
+    order = np.argsort(-confidences, kind="stable")
+    ranked_correct, ranked_classes = correct[order], class_ids[order]
+    for c in np.flatnonzero(labels):
+        hits = ranked_correct[ranked_classes == c]
+        true_positives = np.cumsum(hits, axis=0)
+        recall = true_positives / labels[c]
+        precision = true_positives / np.arange(1, len(hits) + 1)[:, None]
+        ap[c] = [average_precision(recall[:, t], precision[:, t]) for t in range(len(IOU_THRESHOLDS))]
+
+    confirmed = confidences >= class_thresholds(conf, names)[class_ids]
+    predicted = np.bincount(class_ids[confirmed], minlength=num_classes)[:num_classes]
+    hits = np.bincount(class_ids[confirmed], weights=correct[confirmed, 0], minlength=num_classes)[:num_classes]
+    precision = np.divide(hits, predicted, out=np.zeros(num_classes), where=predicted > 0)
+    recall = np.divide(hits, labels, out=np.zeros(num_classes), where=labels > 0)
+
+    # Ingredient level: the app lists classes per image, so a class found anywhere in an
+    # image that has it counts, however many boxes there are.
+    listed = np.zeros((matches["images"], num_classes), dtype=bool)
+    listed[matches["image"][confirmed], class_ids[confirmed]] = True
+    known = matches["true_classes"] < num_classes
+    present = np.zeros_like(listed)
+    present[matches["true_image"][known], matches["true_classes"][known]] = True
+    both = (listed & present).sum()
+    ingredient_precision = both / listed.sum() if listed.any() else 0.0
+    ingredient_recall = both / present.sum() if present.any() else 0.0
+    f1 = (2 * ingredient_precision * ingredient_recall / (ingredient_precision + ingredient_recall)
+          if both else 0.0)
+
+    has_labels = labels > 0
+    return {
+        "precision": float(precision[has_labels].mean()) if has_labels.any() else 0.0,
+        "recall": float(recall[has_labels].mean()) if has_labels.any() else 0.0,
+        "map50": float(ap[has_labels, 0].mean()) if has_labels.any() else 0.0,
+        "map50_95": float(ap[has_labels].mean()) if has_labels.any() else 0.0,
+        "ingredient_precision": float(ingredient_precision),
+        "ingredient_recall": float(ingredient_recall),
+        "ingredient_f1": float(f1),
+        "unknown_labels": int((~known).sum()),
+        "classes": {
+            names[c]: {"labels": int(labels[c]), "precision": float(precision[c]), "recall": float(recall[c]),
+                       "ap50": float(ap[c, 0]), "ap50_95": float(ap[c].mean())}
+            for c in np.flatnonzero((labels > 0) | (predicted > 0))
+        },
+    }
+
+
+def run_configuration(images: list[Path], loaded: food_detector.LoadedModel, imgsz: int, batch: int,
+                      iou: float, floor: float) -> tuple[list[Detections], list[tuple[int, int]], dict]:
+    """
+    Runs the detector over the images in batches and times it the way the app runs it.
+
+    Each batch is decoded (draft-decoded for imgsz, as in the app) and predicted. The
+    first batch runs once untimed, so lazy initialization is not counted.
+
+    Returns:
+        tuple: The detections and analyzed image sizes per image, and latency: milliseconds
+        per image, percentiles of the batch time, images per second, and the mean
+        ultralytics preprocess, inference and postprocess times per image.
+    """
+    kwargs = {"imgsz": imgsz, "conf": floor, "iou": iou}
+    batches = [images[i:i + batch] for i in range(0, len(images), batch)]
+    food_detector._predict([food_detector.load_image(p, imgsz) for p in batches[0]], loaded, **kwargs)
+
+    detections, sizes, batch_ms = [], [], []
+    stages = {"decode": 0.0, "preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}
+    for paths in batches:
+        start = time.perf_counter()
+        arrays = [food_detector.load_image(p, imgsz) for p in paths]
+        decoded = time.perf_counter()
+        results = food_detector._predict(arrays, loaded, **kwargs)
+        detections.extend(Detections.from_arrays(*food_detector._box_arrays(r), r.names, None, floor,
+                                                 food_detector.DETECTOR_TOP_K) for r in results)
+        batch_ms.append(1000 * (time.perf_counter() - start))
+
+        sizes.extend(array.shape[:2] for array in arrays)
+        stages["decode"] += 1000 * (decoded - start)
+        for result in results:
+            for stage in ("preprocess", "inference", "postprocess"):
+                stages[stage] += result.speed[stage]
+
+    total_ms = sum(batch_ms)
+    latency = {
+        "ms_per_image": total_ms / len(images),
+        "batch_ms": percentiles(batch_ms),
+        "images_per_second": 1000 * len(images) / total_ms,
+        **{f"{stage}_ms": value / len(images) for stage, value in stages.items()},
+    }
+    return detections, sizes, latency
+
+
+def evaluate(data_yaml: Path = MASTER_DATA_YAML, split: str = "val", labels_dir: Path = MASTER_LABELS_DIR,
+             engines: list[str] = ("torch",), imgsz: list[int] = (food_detector.MODEL_IMGSZ,),
+             batch_sizes: list[int] = (1,), ious: list[float] = (0.7,), confs: list[float] = (food_detector.DETECTOR_CONF,),
+             floor: float = food_detector.DETECTOR_MIN_CONF, limit: int = 500,
+             weights: Path | None = None) -> dict:
+    """
+    Evaluates every combination of the given settings on one split.
+
+    Every (engine, imgsz, batch, iou) combination runs the detector once; each
+    confidence threshold is then scored on the same predictions and shares its latency.
+
+    Args:
+        data_yaml (Path): The master_data.yaml-style config listing the image folders.
+        split (str): The split to evaluate ('val' or 'test').
+        labels_dir (Path): The remapped labels.
+        engines (list[str]): Engines such as 'torch', 'onnx' or 'openvino-int8'.
+        imgsz (list[int]): Model input sizes.
+        batch_sizes (list[int]): Images per predict call.
+        ious (list[float]): NMS IoU thresholds.
+        confs (list[float]): Confidence thresholds at which an ingredient is confirmed;
+            DETECTOR_CLASS_CONF still overrides single classes.
+        floor (float): Boxes below this confidence are dropped before scoring. mAP only
+            sees these boxes; the app's DETECTOR_MIN_CONF is the default, 0.001 matches
+            ultralytics' own validation.
+        limit (int): The maximum number of images, spread evenly over the split.
+        weights (Path | None): PyTorch weights; exported engines are looked up next to them.
+            None evaluates the weights the app uses (see weights_for).
+
+    Returns:
+        dict: The dataset, one row per configuration, and per-class scores per configuration.
+    """
+    with open(data_yaml, 'r') as f:
+        names = yaml.safe_load(f).get("names") or []
+
+    images, truths = load_ground_truth(calibration_images(data_yaml, split, limit), labels_dir)
+    if not images:
+        raise FileNotFoundError(f"No labeled '{split}' images found through {data_yaml} and {labels_dir}.")
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "data": str(data_yaml), "split": split,
+                 "images": len(images), "labels": int(sum(len(t[0]) for t in truths)), "floor": floor,
+                 "device": food_detector.DETECTOR_DEVICE or "auto"},
+        "rows": [],
+        "classes": {},
+    }
+
+    for engine_name in engines:
+        engine, int8 = parse_engine(engine_name)
+        weights_path = weights_for(engine, int8, weights)
+        loaded = food_detector.get_model(weights_path)
+        model_names = [loaded.model.names[i] for i in sorted(loaded.model.names)]
+        if len(model_names) != len(names):
+            print(f"Warning: the model has {len(model_names)} classes, {data_yaml.name} lists {len(names)}.")
+        for size, batch, iou in itertools.product(imgsz, batch_sizes, ious):
+            print(f"Running {engine_name}, imgsz {size}, batch {batch}, iou {iou} on {len(images)} images...")
+            detections, sizes, latency = run_configuration(images, loaded, size, batch, iou, floor)
+            matches = collect_matches(detections, sizes, truths)
+            for conf in confs:
+                scores = score(matches, model_names, conf)
+                key = f"{engine_name}/{size}/{batch}/{iou}/{conf}"
+                report["classes"][key] = scores.pop("classes")
+                report["rows"].append({"engine": engine_name, "weights": str(weights_path), "imgsz": size,
+                                       "batch": batch, "iou": iou, "conf": conf, **scores, **latency})
+    return report
+
+
+def pareto_front(rows: list[dict]) -> set[int]:
+    """Returns the rows no other row beats on both mAP50-95 and milliseconds per image."""
+    return {
+        i for i, row in enumerate(rows)
+        if not any(other["map50_95"] >= row["map50_95"] and other["ms_per_image"] <= row["ms_per_image"]
+                   and (other["map50_95"], other["ms_per_image"]) != (row["map50_95"], row["ms_per_image"])
+                   for other in rows)
+    }
+
+
+def print_table(report: dict):
+    meta = report["meta"]
+    print(f"\n{meta['images']} '{meta['split']}' images, {meta['labels']} labels, boxes from conf {meta['floor']}")
+    header = ("engine", "imgsz", "batch", "iou", "conf", "P", "R", "mAP50", "mAP50-95", "ingr F1", "ms/img",
+              "p95 batch", "img/s")
+    print(f"  {header[0]:<14}" + "".join(f"{h:>10}" for h in header[1:]))
+    front = pareto_front(report["rows"])
+    for i, row in enumerate(report["rows"]):
+        marker = "*" if i in front else " "
+        print(f"{marker} {row['engine']:<14}{row['imgsz']:>10}{row['batch']:>10}{row['iou']:>10.2f}{row['conf']:>10.3g}"
+              f"{row['precision']:>10.3f}{row['recall']:>10.3f}{row['map50']:>10.3f}{row['map50_95']:>10.3f}"
+              f"{row['ingredient_f1']:>10.3f}{row['ms_per_image']:>10.1f}{row['batch_ms']['p95']:>10.1f}"
+              f"{row['images_per_second']:>10.2f}")
+    print("* no other configuration is both more accurate (mAP50-95) and faster.")
+
+
+def print_classes(classes: dict):
+    print(f"{'class':>20} | {'labels':>6} | {'P':>6} | {'R':>6} | {'AP50':>6} | {'AP50-95':>7}")
+    for name, stats in sorted(classes.items(), key=lambda item: -item[1]["labels"]):
+        print(f"{name:>20} | {stats['labels']:6d} | {stats['precision']:6.3f} | {stats['recall']:6.3f} | "
+              f"{stats['ap50']:6.3f} | {stats['ap50_95']:7.3f}")
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure detector accuracy and latency for several settings.")
+    parser.add_argument("--data", type=Path, default=MASTER_DATA_YAML, help="master_data.yaml-style config.")
+    parser.add_argument("--split", default="val", help="The split of the config to evaluate.")
+    parser.add_argument("--labels", type=Path, default=MASTER_LABELS_DIR, help="The remapped label folder.")
+    parser.add_argument("--weights", type=Path,
+                        help="PyTorch weights (default: the ones the app uses, see DETECTOR_WEIGHTS).")
+    parser.add_argument("--engines", nargs="+", default=[food_detector.DETECTOR_ENGINE],
+                        help="torch, onnx or openvino, optionally with '-int8', e.g. onnx-int8.")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[food_detector.MODEL_IMGSZ])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1])
+    parser.add_argument("--iou", type=float, nargs="+", default=[0.7], help="NMS IoU thresholds.")
+    parser.add_argument("--conf", type=float, nargs="+", default=[food_detector.DETECTOR_CONF],
+                        help="Confidence thresholds at which an ingredient is listed.")
+    parser.add_argument("--floor", type=float, default=food_detector.DETECTOR_MIN_CONF,
+                        help="Lowest box confidence kept; 0.001 matches ultralytics' mAP.")
+    parser.add_argument("--limit", type=int, default=500, help="Maximum number of images.")
+    parser.add_argument("--per-class", action="store_true", help="Also print per-class scores of every configuration.")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    try:
+        report = evaluate(args.data, args.split, args.labels, args.engines, args.imgsz, args.batch_sizes,
+                          args.iou, args.conf, args.floor, args.limit, args.weights)
+    except (FileNotFoundError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+
+    if args.per_class:
+        for key, classes in report["classes"].items():
+            print(f"\n{key}")
+            print_classes(classes)
+    print_table(report)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
@@ -0,0 +1,198 @@
+import argparse
+import shutil
+from pathlib import Path
+
+import numpy as np
+import yaml
+from PIL import Image
+
+from . import food_detector
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+MASTER_DATA_YAML = PROJECT_ROOT / 'Data' / 'IngreGenius-Final-Model-training-dataset' / 'master_data.yaml'
+TEST_IMAGES_DIR = PROJECT_ROOT / 'Images_for_testing'
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def calibration_images(data_yaml: Path = MASTER_DATA_YAML, split: str = "val", limit: int = 300) -> list[Path]:
+    """
+    Lists the images referenced by a master_data.yaml-style config.
+
+    Args:
+        data_yaml (Path): The dataset config. Relative entries are resolved against its
+            'path' key, or against the config's own folder.
+        split (str): Which split to read ('train', 'val' or 'test').
+        limit (int): The maximum number of images returned, spread evenly over the split.
+
+    Returns:
+        list[Path]: The calibration images.
+    """
+    with open(data_yaml, 'r') as f:
+        data = yaml.safe_load(f)
+
+    root = Path(data.get("path") or data_yaml.parent)
+    entries = data.get(split) or []
+    if isinstance(entries, str):
+        entries = [entries]
+
+    images = []
+    for entry in entries:
+        folder = Path(entry) if Path(entry).is_absolute() else root / entry
+        if not folder.exists():
+            print(f"  - WARNING: Image folder not found at {folder}. Skipping.")
+            continue
+        images.extend(sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES))
+
+    if len(images) > limit:
+        step = len(images) / limit
+        images = [images[int(i * step)] for i in range(limit)]
+    return images
+
+
+def _letterbox(path: Path, imgsz: int) -> np.ndarray:
+    """Resizes an image the way ultralytics does (keep aspect ratio, pad with gray) and returns NCHW float32."""
+    image = Image.fromarray(food_detector.load_image(path))
+    scale = imgsz / max(image.size)
+    resized = image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR)
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(resized, ((imgsz - resized.width) // 2, (imgsz - resized.height) // 2))
+    return (np.asarray(canvas, dtype=np.float32) / 255.0).transpose(2, 0, 1)[None]
+
+
+def _quantize_onnx(fp32_path: Path, int8_path: Path, images: list[Path], imgsz: int):
+    """Statically quantizes an ONNX model to INT8 with onnxruntime, calibrated on the given images."""
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(images)
+
+        def get_next(self):
+            path = next(self._images, None)
+            return None if path is None else {input_name: _letterbox(path, imgsz)}
+
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        ImageReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+def export(engine: str, int8: bool = False, weights: Path = food_detector.MODEL_PATH,
+           data_yaml: Path = MASTER_DATA_YAML, imgsz: int = food_detector.MODEL_IMGSZ,
+           calibration_limit: int = 300) -> Path:
+    """
+    Exports the PyTorch weights for the onnx or openvino engine.
+
+    Models are exported with a dynamic batch dimension so the micro-batcher keeps working.
+    INT8 variants are calibrated on the validation images listed in data_yaml.
+
+    Returns:
+        Path: Where the exported model was written (see food_detector.engine_weights_path).
+    """
+    target = food_detector.engine_weights_path(engine, int8, weights)
+    if engine == "torch":
+        return target
+
+    # Only exporting needs ultralytics; calibration_images() is also used without it.
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+
+    if engine == "openvino":
+        # ultralytics calibrates OpenVINO INT8 models itself using the val split of `data`.
+        exported = Path(model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8,
+                                     data=str(data_yaml) if int8 else None))
+    else:
+        exported = Path(model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+        if int8:
+            images = calibration_images(data_yaml, limit=calibration_limit)
+            if not images:
+                raise FileNotFoundError(f"No calibration images found through {data_yaml}.")
+            print(f"Calibrating INT8 model on {len(images)} images...")
+            _quantize_onnx(exported, target, images, imgsz)
+            exported = target
+
+    if exported.resolve() != target.resolve():
+        if target.exists():
+            shutil.rmtree(target) if target.is_dir() else target.unlink()
+        exported.rename(target)
+    print(f"Exported {engine}{' INT8' if int8 else ''} model to {target}")
+    return target
+
+
+def parity_check(engines: list[str], int8: bool = False, image_dir: Path = TEST_IMAGES_DIR,
+                 weights: Path = food_detector.MODEL_PATH) -> dict:
+    """
+    Compares the detected ingredients of each engine against the torch engine.
+
+    Returns:
+        dict: For every engine, the number of images whose ingredient list differs from
+            torch, the per-image differences, and its total box count next to torch's.
+    """
+    images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    inputs = [food_detector._to_model_input(p) for p in images]
+
+    def run(engine: str, use_int8: bool):
+        loaded = food_detector.get_model(food_detector.engine_weights_path(engine, use_int8, weights))
+        results = loaded.predict(inputs, imgsz=food_detector.MODEL_IMGSZ)
+        return [set(food_detector._names_from_result(r)) for r in results], sum(len(r.boxes) for r in results)
+
+    reference, reference_boxes = run("torch", False)
+
+    report = {}
+    for engine in engines:
+        use_int8 = int8 and engine != "torch"
+        detected, boxes = run(engine, use_int8)
+
+        differences = {}
+        for path, expected, names in zip(images, reference, detected):
+            if names != expected:
+                differences[path.name] = {"missing": sorted(expected - names), "extra": sorted(names - expected)}
+
+        report[f"{engine}{'-int8' if use_int8 else ''}"] = {
+            "images": len(images),
+            "images_with_differences": len(differences),
+            "boxes": boxes,
+            "torch_boxes": reference_boxes,
+            "differences": differences,
+        }
+    return report
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the detector for ONNX Runtime / OpenVINO and check parity.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subcommands.add_parser("export", help="Export best.pt for another inference engine.")
+    export_parser.add_argument("--engine", choices=["onnx", "openvino"], required=True)
+    export_parser.add_argument("--int8", action="store_true", help="Quantize to INT8 using calibration images.")
+    export_parser.add_argument("--weights", type=Path, default=food_detector.MODEL_PATH)
+    export_parser.add_argument("--data", type=Path, default=MASTER_DATA_YAML, help="master_data.yaml-style config.")
+    export_parser.add_argument("--imgsz", type=int, default=food_detector.MODEL_IMGSZ)
+    export_parser.add_argument("--calibration-images", type=int, default=300)
+
+    parity_parser = subcommands.add_parser("parity", help="Compare detections of each engine against torch.")
+    parity_parser.add_argument("--engines", nargs="+", choices=food_detector.ENGINES, default=["onnx", "openvino"])
+    parity_parser.add_argument("--int8", action="store_true")
+    parity_parser.add_argument("--images", type=Path, default=TEST_IMAGES_DIR)
+    parity_parser.add_argument("--weights", type=Path, default=food_detector.MODEL_PATH)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.engine, args.int8, args.weights, args.data, args.imgsz, args.calibration_images)
+    else:
+        for engine, result in parity_check(args.engines, args.int8, args.images, args.weights).items():
+            print(f"{engine:>14}: {result['images_with_differences']}/{result['images']} images differ "
+                  f"from torch, {result['boxes']} boxes vs {result['torch_boxes']}")
+            for name, difference in result["differences"].items():
+                print(f"    {name}: missing {difference['missing']}, extra {difference['extra']}")
@@ -1,41 +1,904 @@
-from ultralytics import YOLO
+import functools
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import numpy as np
+from PIL import Image, ImageOps
 from pathlib import Path
+from dotenv import load_dotenv
+from .batching import MicroBatcher
+from .cache import MISSING, TieredCache
+from .detections import Detections
+from .detector_pool import DETECTOR_POOL_WORKERS, get_detector_pool
+from .singleflight import SingleFlight
+from . import tracing
 
 # We use Path for better cross-platform compatibility (Windows/Mac/Linux)
 MODEL_PATH = Path(__file__).resolve().parent.parent / 'models' / 'IngreGenius_SuperModel_Run13' / 'weights' / 'best.pt'
 
-def get_ingredients_from_image(image_path: str) -> list[str]:
+# --- Configuration ---
+load_dotenv()
+
+# Inference engine: "torch" runs best.pt, "onnx" and "openvino" run the files written by
+# `python -m src.ingregenius.export_model export`. DETECTOR_INT8=1 selects the INT8 variant.
+ENGINES = ("torch", "onnx", "openvino")
+DETECTOR_ENGINE = os.getenv("DETECTOR_ENGINE", "torch").lower()
+DETECTOR_INT8 = os.getenv("DETECTOR_INT8", "0") == "1"
+
+# Device passed to ultralytics ("cpu", "0", "mps", ...). None lets ultralytics choose.
+DETECTOR_DEVICE = os.getenv("DETECTOR_DEVICE") or None
+
+# Micro-batching of concurrent single-image requests. A max batch size of 1 disables it.
+DETECTOR_MAX_BATCH_SIZE = int(os.getenv("DETECTOR_MAX_BATCH_SIZE", "8"))
+DETECTOR_MAX_WAIT_MS = float(os.getenv("DETECTOR_MAX_WAIT_MS", "5"))
+
+# Detection cache: number of results kept in memory (0 disables the cache) and an
+# optional directory for a persistent tier that survives restarts.
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "256"))
+DETECTION_CACHE_DIR = os.getenv("DETECTION_CACHE_DIR") or None
+
+# Video / stream mode: keyframes analyzed per second of video (or of wall time for live
+# streams), the mean grayscale difference (0-255) below which a frame counts as a
+# near-duplicate of the last keyframe, and the confidence summed over keyframes a
+# class that was never confirmed needs before it is reported.
+VIDEO_TARGET_FPS = float(os.getenv("VIDEO_TARGET_FPS", "2"))
+VIDEO_DIFF_THRESHOLD = float(os.getenv("VIDEO_DIFF_THRESHOLD", "6"))
+VIDEO_MIN_SCORE = float(os.getenv("VIDEO_MIN_SCORE", "0.8"))
+
+# Post-processing: boxes down to DETECTOR_MIN_CONF are kept, and an ingredient counts as
+# found once a box reaches DETECTOR_CONF or its class's own threshold from
+# DETECTOR_CLASS_CONF (e.g. "egg=0.5,garlic=0.4"; class names in any case). Ingredients
+# seen only between the two are offered as "not sure". DETECTOR_TOP_K keeps the most
+# confident boxes (0 = all).
+DETECTOR_CONF = float(os.getenv("DETECTOR_CONF", "0.25"))
+DETECTOR_MIN_CONF = float(os.getenv("DETECTOR_MIN_CONF", "0.1"))
+DETECTOR_CLASS_CONF = {
+    name.strip(): float(value)
+    for name, _, value in (item.rpartition("=") for item in os.getenv("DETECTOR_CLASS_CONF", "").split(","))
+    if name.strip()
+}
+DETECTOR_TOP_K = int(os.getenv("DETECTOR_TOP_K", "100"))
+
+# Tiled high-resolution mode for photos with many small items. A low-resolution pass
+# over the whole photo finds candidate regions (boxes down to TILE_SELECT_CONF); only
+# the overlapping MODEL_IMGSZ tiles that contain uncertain or small candidates are run
+# again at native resolution, at most TILE_MAX_TILES of them, and all boxes are merged
+# with class-aware NMS. Photos whose longer side is below TILE_MIN_SIDE are not tiled.
+# TILE_SELECT_CONF=0 runs every tile.
+DETECTOR_TILED = os.getenv("DETECTOR_TILED", "0") == "1"
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_MIN_SIDE = int(os.getenv("TILE_MIN_SIDE", "1280"))
+TILE_SELECT_CONF = float(os.getenv("TILE_SELECT_CONF", "0.05"))
+TILE_MAX_TILES = int(os.getenv("TILE_MAX_TILES", "16"))
+TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", "0.5"))
+
+# Square input size of the model (matches the training imgsz).
+MODEL_IMGSZ = 640
+# Smallest side uploads are draft-decoded to; tiling needs the native resolution.
+DECODE_MAX_SIDE = None if DETECTOR_TILED else MODEL_IMGSZ
+# Boxes whose longer side is below this many pixels of model input count as small.
+TILE_SMALL_BOX_PX = 32
+
+# Anything the detector accepts: a file path, encoded image bytes or a file-like object,
+# an RGB NumPy array, or a PIL image.
+ImageSource = str | Path | bytes | io.IOBase | np.ndarray | Image.Image
+
+
+class LoadedModel:
+    """A YOLO model held by the registry together with its inference lock."""
+
+    def __init__(self, model, weights_path: Path, device: str | None, mtime_ns: int, weights_hash: str):
+        self.model = model
+        self.weights_path = weights_path
+        self.device = device
+        self.mtime_ns = mtime_ns
+        self.weights_hash = weights_hash
+        # ultralytics predictors keep per-call state, so one model must not run
+        # two predictions at the same time.
+        self.lock = threading.Lock()
+
+    def predict(self, source, **kwargs):
+        with self.lock:
+            return self.model.predict(source=source, device=self.device, verbose=False, **kwargs)
+
+
+def engine_weights_path(engine: str = DETECTOR_ENGINE, int8: bool = DETECTOR_INT8, weights: Path = MODEL_PATH) -> Path:
+    """
+    Returns where the weights for an inference engine live next to the PyTorch weights.
+
+    Args:
+        engine (str): One of ENGINES.
+        int8 (bool): Whether to use the INT8-quantized variant (onnx and openvino only).
+        weights (Path): The PyTorch weights the exported models were built from.
+
+    Returns:
+        Path: best.pt, best.onnx / best_int8.onnx, or best_openvino_model / best_int8_openvino_model.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown detector engine '{engine}'. Choose one of {', '.join(ENGINES)}.")
+    if engine == "torch":
+        if int8:
+            raise ValueError("INT8 quantization is only available for the onnx and openvino engines.")
+        return weights
+    suffix = "_int8" if int8 else ""
+    if engine == "onnx":
+        return weights.with_name(f"{weights.stem}{suffix}.onnx")
+    return weights.with_name(f"{weights.stem}{suffix}_openvino_model")
+
+
+# --- Detector Registry ---
+# Process-wide cache of loaded models keyed by (resolved weights path, device).
+_registry: dict[tuple[str, str | None], LoadedModel] = {}
+_registry_lock = threading.Lock()
+_active_weights_path = Path(os.getenv("DETECTOR_WEIGHTS") or engine_weights_path())
+
+
+def _hash_file(path: Path) -> str:
+    """Returns the SHA-256 hex digest of a file, or of every file in a directory."""
+    digest = hashlib.sha256()
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_weights(weights_path: Path):
+    """Raises FileNotFoundError with a hint on how to create missing exported weights."""
+    if not weights_path.exists():
+        hint = "" if weights_path.suffix == ".pt" else " Run `python -m src.ingregenius.export_model export` to create it."
+        raise FileNotFoundError(f"Model file not found at {weights_path}.{hint}")
+
+
+def _load_model(weights_path: Path, device: str | None) -> LoadedModel:
+    """Loads the weights from disk and runs a warmup inference on a dummy image."""
+    _check_weights(weights_path)
+
+    # ultralytics pulls in torch, which takes seconds; only pay for it when a model is loaded.
+    from ultralytics import YOLO
+
+    mtime_ns = weights_path.stat().st_mtime_ns
+    model = YOLO(weights_path, task="detect")
+    loaded = LoadedModel(model, weights_path, device, mtime_ns, _hash_file(weights_path))
+
+    # The first predict builds the predictor and initializes torch; pay for it here
+    # instead of on the first user upload.
+    loaded.predict(np.zeros((MODEL_IMGSZ, MODEL_IMGSZ, 3), dtype=np.uint8))
+    return loaded
+
+
+def get_model(weights_path: str | Path | None = None, device: str | None = None) -> LoadedModel:
+    """
+    Returns the registry's model for the given weights and device, loading it on first use.
+
+    Args:
+        weights_path (str | Path | None): The weights to use. Defaults to the active weights.
+        device (str | None): The inference device. Defaults to DETECTOR_DEVICE.
+
+    Returns:
+        LoadedModel: The shared, warmed-up model.
+    """
+    path = Path(weights_path or _active_weights_path).resolve()
+    device = device or DETECTOR_DEVICE
+    key = (str(path), device)
+
+    loaded = _registry.get(key)
+    if loaded is not None:
+        return loaded
+
+    with _registry_lock:
+        # Another thread may have finished loading while we waited for the lock.
+        loaded = _registry.get(key)
+        if loaded is None:
+            loaded = _load_model(path, device)
+            _registry[key] = loaded
+    return loaded
+
+
+def reload_model(weights_path: str | Path | None = None, device: str | None = None) -> LoadedModel | None:
+    """
+    Hot-swaps to new weights without restarting the process.
+
+    The new model is loaded and warmed up before it replaces the old one, so requests
+    in flight keep using the previous model until the swap is complete. Passing a new
+    weights_path also makes it the default for later calls.
+
+    With a detector pool the models live in the workers, so the pool is recycled
+    instead: the cache key only switches to the new weights once every new worker
+    has loaded them.
+
+    Args:
+        weights_path (str | Path | None): The new weights. Defaults to the active weights,
+            which reloads a best.pt that was overwritten in place.
+        device (str | None): The inference device. Defaults to DETECTOR_DEVICE.
+
+    Returns:
+        LoadedModel | None: The newly loaded model, or None with a detector pool.
+    """
+    global _active_weights_path, _served_weights
+
+    path = Path(weights_path or _active_weights_path).resolve()
+    device = device or DETECTOR_DEVICE
+    if DETECTOR_POOL_WORKERS > 0:
+        _check_weights(path)
+        loaded, served = None, (path, path.stat().st_mtime_ns, _hash_file(path))
+        get_detector_pool().recycle(path)
+    else:
+        loaded = _load_model(path, device)
+        served = (path, loaded.mtime_ns, loaded.weights_hash)
+
+    with _registry_lock:
+        # Free the replaced weights on every device they were loaded on; callers still
+        # holding them finish their request.
+        if loaded is not None:
+            replaced = str(_active_weights_path.resolve())
+            for key in [key for key in _registry if key[0] == replaced]:
+                del _registry[key]
+            _registry[(str(path), device)] = loaded
+        _active_weights_path = path
+        _served_weights = served
+
+    # Results of the replaced weights can never be hit again; drop them from disk.
+    cache = get_detection_cache()
+    if cache is not None and cache.disk is not None:
+        cache.disk.prune_except_prefix(served[2])
+    print(f"Detector now serving {path} on device {device or 'auto'}.")
+    return loaded
+
+
+def reload_if_changed(device: str | None = None) -> bool:
+    """
+    Reloads the active model if its weights file was modified since it was loaded.
+
+    Returns:
+        bool: True if the model was reloaded.
+    """
+    if DETECTOR_POOL_WORKERS > 0:
+        active_weights_hash()
+        path, mtime_ns, _ = _served_weights
+    else:
+        loaded = get_model(device=device)
+        path, mtime_ns, device = loaded.weights_path, loaded.mtime_ns, loaded.device
+    if path.stat().st_mtime_ns == mtime_ns:
+        return False
+    reload_model(path, device)
+    return True
+
+
+# The (path, mtime_ns, hash) of the weights being served when no model is loaded in this
+# process. It is taken once and then only changed by reload_model, so overwriting best.pt
+# does not change cache keys before the workers have switched to it.
+_served_weights: tuple[Path, int, str] | None = None
+
+
+def active_weights_hash() -> str:
+    """
+    Returns the hash of the active weights without loading them.
+
+    With a detector pool the models live in the worker processes, so the parent uses
+    this for cache keys instead of loading a replica of its own.
+    """
+    global _served_weights
+
+    path = _active_weights_path.resolve()
+    loaded = _registry.get((str(path), DETECTOR_DEVICE))
+    if loaded is not None:
+        return loaded.weights_hash
+    with _registry_lock:
+        if _served_weights is None or _served_weights[0] != path:
+            _check_weights(path)
+            _served_weights = (path, path.stat().st_mtime_ns, _hash_file(path))
+        return _served_weights[2]
+
+
+def active_weights_path() -> Path:
+    """Returns the weights the detector serves: DETECTOR_WEIGHTS, the engine's default, or the last reload."""
+    return _active_weights_path
+
+
+def clear_registry():
+    """Drops every loaded model, e.g. to free memory in long-running workers."""
+    with _registry_lock:
+        _registry.clear()
+
+
+def load_image(source: ImageSource, max_side: int | None = DECODE_MAX_SIDE) -> np.ndarray:
+    """
+    Decodes an image once into an RGB array that can be shared by the preview and the detector.
+
+    JPEGs are draft-decoded: libjpeg scales them down by 1/2, 1/4 or 1/8 while decoding,
+    as long as the result stays at least max_side pixels on each side. The model resizes
+    to its input size anyway, so this skips decoding pixels that would be thrown away.
+
+    Args:
+        source (ImageSource): The image to decode. NumPy arrays are returned unchanged.
+        max_side (int | None): The smallest size the draft decoder may reduce to.
+            None decodes at full resolution. Defaults to MODEL_IMGSZ, or None in tiled mode.
+
+    Returns:
+        np.ndarray: An HxWx3 uint8 array in RGB order.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+
+    with tracing.span("image.decode"):
+        if isinstance(source, Image.Image):
+            image = source
+        else:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                source = io.BytesIO(source)
+            image = Image.open(source)
+            if max_side:
+                image.draft("RGB", (max_side, max_side))
+
+        image = ImageOps.exif_transpose(image)
+        return np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+
+
+def _to_model_input(source: ImageSource) -> np.ndarray:
+    """Decodes a source for ultralytics, which expects NumPy images in BGR order."""
+    return np.ascontiguousarray(load_image(source)[..., ::-1])
+
+
+@functools.lru_cache(maxsize=8)
+def _class_thresholds(class_names: tuple[str, ...]) -> np.ndarray:
+    """
+    Returns the confirmation threshold of every class id of a model.
+
+    DETECTOR_CLASS_CONF names are matched case-insensitively; a name the model does not
+    know raises ValueError instead of being ignored.
     """
-    Takes the path to an image, runs inference using the trained YOLOv8 model,
+    thresholds = np.full(len(class_names), DETECTOR_CONF, dtype=np.float32)
+    index = {name.lower(): i for i, name in enumerate(class_names)}
+    unknown = [name for name in DETECTOR_CLASS_CONF if name.lower() not in index]
+    if unknown:
+        raise ValueError(f"DETECTOR_CLASS_CONF names unknown classes: {', '.join(unknown)}. "
+                         f"The model knows: {', '.join(class_names)}.")
+    for name, threshold in DETECTOR_CLASS_CONF.items():
+        thresholds[index[name.lower()]] = threshold
+    return thresholds
+
+
+def _to_detections(boxes: np.ndarray, confidences: np.ndarray, class_ids: np.ndarray,
+                   names: dict[int, str]) -> Detections:
+    """Applies the confidence floor, the per-class thresholds and top-k to raw boxes."""
+    return Detections.from_arrays(boxes, confidences, class_ids, names, _class_thresholds(tuple(names.values())),
+                                  DETECTOR_MIN_CONF, DETECTOR_TOP_K)
+
+
+def _detections_from_result(result) -> Detections:
+    """Post-processes one ultralytics result on its tensors, without a loop over the boxes."""
+    return _to_detections(*_box_arrays(result), result.names)
+
+
+def _names_from_result(result) -> list[str]:
+    """Returns the unique confirmed class names in one ultralytics result."""
+    return _detections_from_result(result).ingredients
+
+
+def _box_arrays(result) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the xyxy boxes, confidences and class ids of one ultralytics result as NumPy arrays."""
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy().astype(np.float32), boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.cls.cpu().numpy().astype(np.int64))
+
+
+def _predict(images: list[ImageSource], loaded: LoadedModel | None = None, **kwargs) -> list:
+    """Runs one batched predict over the images and returns the ultralytics results."""
+    loaded = loaded or get_model()
+    with tracing.span("detector.batch", engine=DETECTOR_ENGINE) as span:
+        span.set(batch_size=len(images))
+        results = loaded.predict([_to_model_input(image) for image in images], batch=len(images),
+                                 **{**_PREDICT_KWARGS, **kwargs})
+        # ultralytics times preprocess, inference and NMS itself, in milliseconds per image.
+        for result in results:
+            for stage in ("preprocess", "inference", "postprocess"):
+                tracing.record(f"detector.{stage}", result.speed[stage] / 1000, engine=DETECTOR_ENGINE)
+        return results
+
+
+def _detect_batch(images: list[ImageSource], loaded: LoadedModel | None = None) -> list[Detections]:
+    """Runs one batched predict over the images, without consulting the cache."""
+    if not images:
+        return []
+    if DETECTOR_TILED:
+        # Every image is already a batch of tiles.
+        return [detect_tiled(image, loaded) for image in images]
+    return [_detections_from_result(result) for result in _predict(images, loaded)]
+
+
+# --- Tiled High-Resolution Mode ---
+class TiledDetection(Detections):
+    """Detections merged over tiles, in full-resolution pixels, with how many tiles were run."""
+
+    __slots__ = ("tiles_run", "tiles_total")
+
+    @classmethod
+    def merged(cls, detections: Detections, tiles_run: int, tiles_total: int) -> "TiledDetection":
+        tiled = cls(detections.class_ids, detections.confidences, detections.boxes, detections.confirmed,
+                    detections.names)
+        tiled.tiles_run = tiles_run
+        tiled.tiles_total = tiles_total
+        return tiled
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the NxM matrix of IoUs between two sets of xyxy boxes."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def class_aware_nms(boxes: np.ndarray, confidences: np.ndarray, class_ids: np.ndarray,
+                    iou_threshold: float = TILE_NMS_IOU) -> np.ndarray:
+    """
+    Greedy non-maximum suppression that only lets boxes of the same class suppress each other.
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, most confident first.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Shifting every class into its own coordinate range keeps classes from overlapping.
+    shifted = boxes + (class_ids * (float(boxes.max()) + 1))[:, None]
+    order = np.argsort(-confidences, kind="stable")
+    keep = []
+    while order.size:
+        best, order = order[0], order[1:]
+        keep.append(best)
+        order = order[box_iou(shifted[best:best + 1], shifted[order])[0] <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def tile_grid(height: int, width: int, tile: int = MODEL_IMGSZ, overlap: float = TILE_OVERLAP) -> np.ndarray:
+    """Returns the xyxy pixel bounds of overlapping tiles covering an image, row by row."""
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def origins(length: int) -> list[int]:
+        if length <= tile:
+            return [0]
+        return list(range(0, length - tile, stride)) + [length - tile]
+
+    return np.array([(x, y, min(x + tile, width), min(y + tile, height))
+                     for y in origins(height) for x in origins(width)], dtype=np.float32)
+
+
+def select_tiles(tiles: np.ndarray, boxes: np.ndarray, confidences: np.ndarray,
+                 max_tiles: int = TILE_MAX_TILES) -> np.ndarray:
+    """
+    Picks the tiles worth running from the candidate boxes of the low-resolution pass.
+
+    Each tile is scored by the confidence of the candidates it contains, weighted by the
+    fraction of each candidate that falls inside it.
+
+    Returns:
+        np.ndarray: Indices of at most max_tiles tiles with a positive score, best first.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    top_left = np.maximum(tiles[:, None, :2], boxes[None, :, :2])
+    bottom_right = np.minimum(tiles[:, None, 2:], boxes[None, :, 2:])
+    inside = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area = np.maximum((boxes[:, 2:] - boxes[:, :2]).prod(axis=1), 1e-9)
+    scores = (inside / area * confidences).sum(axis=1)
+    order = np.argsort(-scores, kind="stable")[:max_tiles]
+    return order[scores[order] > 0]
+
+
+def detect_tiled(image: ImageSource, loaded: LoadedModel | None = None, overlap: float = TILE_OVERLAP,
+                 select_conf: float = TILE_SELECT_CONF, max_tiles: int = TILE_MAX_TILES,
+                 min_side: int = TILE_MIN_SIDE) -> TiledDetection:
+    """
+    Detects ingredients in a high-resolution photo, re-running only promising tiles at native resolution.
+
+    Args:
+        image (ImageSource): The photo; encoded sources are decoded at full resolution.
+        loaded (LoadedModel | None): The model to use. Defaults to the active model.
+        overlap (float): Fraction of a tile shared with its neighbours.
+        select_conf (float): Lowest confidence of a low-resolution box that can select
+            a tile; 0 runs every tile.
+        max_tiles (int): The most tiles run per photo.
+        min_side (int): Photos with a shorter longer side are only run once, untiled.
+
+    Returns:
+        TiledDetection: The merged boxes and how many tiles were run.
+    """
+    loaded = loaded or get_model()
+    image = load_image(image, max_side=None)
+    height, width = image.shape[:2]
+
+    with tracing.span("detector.tiled", engine=DETECTOR_ENGINE) as span:
+        overview = _predict([image], loaded, conf=max(min(select_conf, DETECTOR_MIN_CONF), 0.001))[0]
+        boxes, confidences, class_ids = _box_arrays(overview)
+        if max(height, width) < min_side:
+            return TiledDetection.merged(_to_detections(boxes, confidences, class_ids, overview.names), 0, 0)
+
+        thresholds = _class_thresholds(tuple(overview.names.values()))
+        confident = confidences >= thresholds[class_ids]
+
+        tiles = tile_grid(height, width, MODEL_IMGSZ, overlap)
+        if select_conf <= 0:
+            selected = np.arange(len(tiles))
+        else:
+            # Confident boxes big enough for the overview need no second look, and boxes
+            # below select_conf (the overview runs at the lower of it and the floor) none at all.
+            scale = MODEL_IMGSZ / max(height, width)
+            small = (boxes[:, 2:] - boxes[:, :2]).max(axis=1) * scale < TILE_SMALL_BOX_PX
+            candidates = (~confident | small) & (confidences >= select_conf)
+            selected = select_tiles(tiles, boxes[candidates], confidences[candidates], max_tiles)
+        span.set(tiles_total=len(tiles), tiles_run=len(selected))
+
+        kept = confidences >= DETECTOR_MIN_CONF
+        merged = [(boxes[kept], confidences[kept], class_ids[kept])]
+        if len(selected):
+            bounds = tiles[selected].astype(np.int64)
+            crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in bounds]
+            for (x0, y0, x1, y1), result in zip(bounds, _predict(crops, loaded)):
+                tile_boxes, tile_confidences, tile_class_ids = _box_arrays(result)
+                # Boxes cut off by an inner tile edge are seen whole by the neighbouring tile.
+                cut = (((tile_boxes[:, 0] <= 1) & (x0 > 0)) | ((tile_boxes[:, 1] <= 1) & (y0 > 0))
+                       | ((tile_boxes[:, 2] >= x1 - x0 - 1) & (x1 < width))
+                       | ((tile_boxes[:, 3] >= y1 - y0 - 1) & (y1 < height)))
+                tile_boxes = tile_boxes[~cut] + np.array([x0, y0, x0, y0], dtype=np.float32)
+                merged.append((tile_boxes, tile_confidences[~cut], tile_class_ids[~cut]))
+
+        boxes, confidences, class_ids = (np.concatenate(parts) for parts in zip(*merged))
+        keep = class_aware_nms(boxes, confidences, class_ids)
+        detections = _to_detections(boxes[keep], confidences[keep], class_ids[keep], overview.names)
+        return TiledDetection.merged(detections, len(selected), len(tiles))
+
+
+# --- Detection Cache ---
+# Inference parameters that change the output; they are part of every cache key.
+_PREDICT_KWARGS = {"imgsz": MODEL_IMGSZ, "conf": DETECTOR_MIN_CONF}
+
+_detection_cache: TieredCache | None = None
+_detection_cache_lock = threading.Lock()
+
+
+def get_detection_cache() -> TieredCache | None:
+    """Returns the process-wide detection cache, or None if DETECTION_CACHE_SIZE is 0."""
+    global _detection_cache
+
+    if DETECTION_CACHE_SIZE <= 0:
+        return None
+    if _detection_cache is None:
+        with _detection_cache_lock:
+            if _detection_cache is None:
+                disk_path = Path(DETECTION_CACHE_DIR) / "detections.sqlite3" if DETECTION_CACHE_DIR else None
+                _detection_cache = TieredCache(DETECTION_CACHE_SIZE, disk_path)
+    return _detection_cache
+
+
+def detection_cache_stats() -> dict:
+    """Returns the hit, miss and eviction counters of the detection cache."""
+    cache = get_detection_cache()
+    return cache.stats.as_dict() if cache is not None else {}
+
+
+def hash_image(source: ImageSource) -> str:
+    """
+    Returns a SHA-256 hex digest of the image content.
+
+    Encoded images (paths, bytes, file-like objects) are hashed as stored, decoded images
+    (arrays, PIL images) by their pixels, so hashing never decodes anything.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, np.ndarray):
+        digest.update(f"{source.shape}{source.dtype}".encode())
+        digest.update(memoryview(np.ascontiguousarray(source)))
+    elif isinstance(source, Image.Image):
+        digest.update(f"{source.size}{source.mode}".encode())
+        digest.update(source.tobytes())
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    else:
+        position = source.tell()
+        digest.update(source.read())
+        source.seek(position)
+    return digest.hexdigest()
+
+
+def _cache_key(image: ImageSource) -> str:
+    """Builds the cache key from the weights hash, the inference parameters and the image hash."""
+    params = {**_PREDICT_KWARGS, "max_side": DECODE_MAX_SIDE, "class_conf": [DETECTOR_CONF, DETECTOR_CLASS_CONF],
+              "top_k": DETECTOR_TOP_K, "engine": [DETECTOR_ENGINE, DETECTOR_INT8]}
+    if DETECTOR_TILED:
+        params["tiled"] = [TILE_OVERLAP, TILE_MIN_SIDE, TILE_SELECT_CONF, TILE_MAX_TILES, TILE_NMS_IOU]
+    params = json.dumps(params, sort_keys=True)
+    params_hash = hashlib.sha256(params.encode()).hexdigest()[:16]
+    return f"{active_weights_hash()}:{params_hash}:{hash_image(image)}"
+
+
+def detect_images(images: list[ImageSource], use_cache: bool = True) -> list[Detections]:
+    """
+    Runs one batched inference over several images.
+
+    Images already in the detection cache are not run again.
+
+    Args:
+        images (list[ImageSource]): The images to analyze.
+        use_cache (bool): Whether to read from and write to the detection cache.
+
+    Returns:
+        list[Detections]: The detections of each image, in input order.
+    """
+    cache = get_detection_cache() if use_cache else None
+    if cache is None:
+        return _detect_batch(images)
+
+    keys = [_cache_key(image) for image in images]
+    results = [cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is MISSING]
+    results = [None if result is MISSING else Detections.from_dict(result) for result in results]
+
+    for i, detections in zip(missing, _detect_batch([images[i] for i in missing])):
+        cache.put(keys[i], detections.as_dict())
+        results[i] = detections
+    return results
+
+
+def get_ingredients_from_images(images: list[ImageSource], use_cache: bool = True) -> list[list[str]]:
+    """Returns the unique ingredient names for each image; see detect_images()."""
+    return [detections.ingredients for detections in detect_images(images, use_cache)]
+
+
+def detect_image_unbatched(image: ImageSource) -> Detections:
+    """Runs inference on a single image without going through the micro-batcher or the cache."""
+    return _detect_batch([image])[0]
+
+
+def get_ingredients_from_image_unbatched(image: ImageSource) -> list[str]:
+    return detect_image_unbatched(image).ingredients
+
+
+_batcher: MicroBatcher | None = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> MicroBatcher:
+    """Returns the process-wide micro-batcher, starting it on first use."""
+    global _batcher
+
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(_detect_batch, DETECTOR_MAX_BATCH_SIZE, DETECTOR_MAX_WAIT_MS)
+    return _batcher
+
+
+# Identical images submitted while one of them is still being analyzed share that run.
+_detection_flights = SingleFlight()
+
+
+def detection_flight_stats() -> dict:
+    """Returns how many detections ran and how many identical requests were coalesced into them."""
+    return _detection_flights.stats()
+
+
+def _detect_one(image: ImageSource, key: str | None, cache: TieredCache | None) -> Detections:
+    if DETECTOR_POOL_WORKERS > 0:
+        detections = get_detector_pool().detect(image)
+    elif DETECTOR_MAX_BATCH_SIZE <= 1:
+        detections = detect_image_unbatched(image)
+    else:
+        detections = get_batcher()(image)
+
+    if cache is not None:
+        cache.put(key, detections.as_dict())
+    return detections
+
+
+def detect_image(image: ImageSource, use_cache: bool = True, coalesce: bool = True) -> Detections:
+    """
+    Runs inference using the trained YOLOv8 model and returns every box it kept,
+    with per-ingredient counts and confidences.
+
+    Results are looked up in the detection cache first. Concurrent requests for the
+    same image share one run, and concurrent misses for different images are
+    gathered by the micro-batcher and run as one batch, or spread over the worker
+    processes when DETECTOR_POOL_WORKERS is set.
+
+    Args:
+        image (ImageSource): A file path, encoded image bytes, an RGB NumPy array
+            or a PIL image.
+        use_cache (bool): Whether to read from and write to the detection cache.
+        coalesce (bool): Whether to share the run with identical requests in flight.
+
+    Returns:
+        Detections: The boxes, confirmed ingredients and low-confidence ingredients.
+    """
+    with tracing.span("detector.detect", engine=DETECTOR_ENGINE) as span:
+        cache = get_detection_cache() if use_cache else None
+        key = _cache_key(image) if cache is not None or coalesce else None
+        if cache is not None:
+            cached = cache.get(key)
+            span.set(cache_hit=cached is not MISSING)
+            if cached is not MISSING:
+                return Detections.from_dict(cached)
+
+        if not coalesce:
+            return _detect_one(image, key, cache)
+        return _detection_flights.do(key, _detect_one, image, key, cache)
+
+
+def get_ingredients_from_image(image: ImageSource, use_cache: bool = True, coalesce: bool = True) -> list[str]:
+    """
+    Takes an image, runs inference using the trained YOLOv8 model,
     and returns a clean list of unique detected ingredient names.
 
+    A view over detect_image(), which also has the counts and low-confidence items.
+
+    Returns:
+        list[str]: A list of unique ingredient names found in the image, most confident first.
+    """
+    return detect_image(image, use_cache, coalesce).ingredients
+
+
+# --- Video / Stream Mode ---
+class StreamDetection:
+    """
+    Detections merged over the keyframes of a video or camera stream.
+
+    An ingredient confirmed in any keyframe is reported, as it would be for a photo.
+    Every keyframe also adds the highest confidence of each class it contains, confirmed
+    or not, to that class's score; an ingredient seen only below its threshold is
+    reported once its score reaches min_score. So something seen faintly in several
+    frames passes, while a single faint false positive does not.
+    """
+
+    def __init__(self, min_score: float = VIDEO_MIN_SCORE):
+        self.min_score = min_score
+        self.scores: dict[str, float] = {}
+        self.sightings: dict[str, int] = {}
+        self.confirmed: set[str] = set()
+        self.frames = 0
+        self.keyframes = 0
+        self.skipped_similar = 0
+        self.skipped_budget = 0
+
+    def add(self, detections: Detections):
+        """Adds the detections of one keyframe."""
+        self.keyframes += 1
+        self.confirmed.update(detections.counts)
+        for name, confidence in detections.max_conf.items():
+            self.scores[name] = self.scores.get(name, 0.0) + confidence
+            self.sightings[name] = self.sightings.get(name, 0) + 1
+
+    @property
+    def ingredients(self) -> list[str]:
+        """The confirmed ingredients and those whose accumulated score reached min_score, most certain first."""
+        passed = [name for name, score in self.scores.items() if name in self.confirmed or score >= self.min_score]
+        return sorted(passed, key=lambda name: -self.scores[name])
+
+
+def _thumbnail(frame: np.ndarray, size: int = 32) -> np.ndarray:
+    """A tiny grayscale version of a frame for cheap change detection (strided, no resampling)."""
+    step_y, step_x = max(1, frame.shape[0] // size), max(1, frame.shape[1] // size)
+    return frame[::step_y, ::step_x].mean(axis=2, dtype=np.float32)
+
+
+def video_frames(path: str | Path):
+    """
+    Reads a video file with OpenCV.
+
+    Returns:
+        tuple[Iterator[np.ndarray], float]: RGB frames and the frame rate of the file.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Could not open video: {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def frames():
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield frame[..., ::-1]
+        finally:
+            capture.release()
+
+    return frames(), fps
+
+
+def detect_stream(frames, fps: float | None = None, target_fps: float = VIDEO_TARGET_FPS,
+                  diff_threshold: float = VIDEO_DIFF_THRESHOLD, min_score: float = VIDEO_MIN_SCORE,
+                  batch_size: int = DETECTOR_MAX_BATCH_SIZE) -> StreamDetection:
+    """
+    Detects ingredients in a sequence of frames, running the model only on keyframes.
+
+    A frame becomes a keyframe when at least 1 / target_fps seconds have passed since
+    the last keyframe and it differs visibly from it. With fps given (a video file),
+    time is the position in the video and keyframes are run in batches; without it
+    (a live stream), time is wall time and each keyframe is run as soon as it is picked.
+
     Args:
-        image_path (str): The file path of the image to analyze.
+        frames: An iterable of RGB NumPy frames (or any ImageSource).
+        fps (float | None): The frame rate of a recorded video; None for live streams.
+        target_fps (float): The most keyframes analyzed per second.
+        diff_threshold (float): Mean grayscale difference (0-255) to the last keyframe
+            below which a frame is skipped as a near-duplicate.
+        min_score (float): Accumulated confidence a class that was never confirmed needs to be reported.
+        batch_size (int): Keyframes per predict call for recorded videos.
 
     Returns:
-        list[str]: A list of unique ingredient names found in the image.
+        StreamDetection: The merged ingredients, per-class scores and frame counters.
     """
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
+    detection = StreamDetection(min_score)
+    interval = 1.0 / target_fps if target_fps > 0 else 0.0
+    # With a detector pool the model lives in the workers; the keyframes are spread over them.
+    use_pool = DETECTOR_POOL_WORKERS > 0
+    loaded = None if use_pool else get_model()
+    last_time, last_thumbnail = None, None
+    pending = []
 
-    model = YOLO(MODEL_PATH)
+    def flush():
+        if pending:
+            if use_pool:
+                keyframes = get_detector_pool().detect_all(pending)
+            else:
+                keyframes = [_detections_from_result(result) for result in _predict(pending, loaded)]
+            for detections in keyframes:
+                detection.add(detections)
+            pending.clear()
 
-    results = model.predict(source=image_path, verbose=False)
+    start = time.perf_counter()
+    for index, frame in enumerate(frames):
+        detection.frames += 1
+        now = index / fps if fps else time.perf_counter() - start
+        if last_time is not None and now - last_time < interval:
+            detection.skipped_budget += 1
+            continue
 
-    detected_names = set()
+        frame = load_image(frame)
+        thumbnail = _thumbnail(frame)
+        if last_thumbnail is not None and np.abs(thumbnail - last_thumbnail).mean() < diff_threshold:
+            detection.skipped_similar += 1
+            continue
 
-    result = results[0]
+        last_time, last_thumbnail = now, thumbnail
+        pending.append(frame)
+        if not fps or len(pending) >= batch_size:
+            flush()
+    flush()
+    return detection
 
-    for box in result.boxes:
-        class_id = int(box.cls)
-        object_name = result.names[class_id]
-        detected_names.add(object_name)
 
-    return list(detected_names)
+def get_ingredients_from_video(source, target_fps: float = VIDEO_TARGET_FPS, **kwargs) -> list[str]:
+    """
+    Returns one ingredient list for a video file or an iterable of camera frames.
+
+    Args:
+        source: A path to a video file, or an iterable of RGB frames from a live stream.
+        target_fps (float): The most keyframes analyzed per second; see detect_stream().
+
+    Returns:
+        list[str]: The ingredients found, most certain first.
+    """
+    if isinstance(source, (str, Path)):
+        frames, fps = video_frames(source)
+        return detect_stream(frames, fps, target_fps, **kwargs).ingredients
+    return detect_stream(source, None, target_fps, **kwargs).ingredients
+
 
 # --- This block allows testing the function directly ---
 if __name__ == '__main__':
-    test_image = '/home/atirmalle/Schreibtisch/Computer_Vision/IngreGenius/Data/Fridge objects.v12i.yolov8/test/images/img8_png.rf.ac8d6693193d5725f27ac49eb2234669.jpg'
+    test_image = Path(__file__).resolve().parent.parent.parent / 'Images_for_testing' / 'Test_image-01.jpg'
 
     try:
         ingredients = get_ingredients_from_image(test_image)
@@ -47,4 +910,4 @@ if __name__ == '__main__':
     except FileNotFoundError as e:
         print(f"Error: {e}")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"An unexpected error occurred: {e}")
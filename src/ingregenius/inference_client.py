@@ -0,0 +1,120 @@
+import json
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# --- Configuration ---
+load_dotenv()
+
+# Base URL of a running inference_service, e.g. "http://127.0.0.1:8500". When set, the
+# app sends detections and recipe requests there instead of running them in-process.
+INFERENCE_SERVICE_URL = os.getenv("INFERENCE_SERVICE_URL") or None
+INFERENCE_CLIENT_TIMEOUT = float(os.getenv("INFERENCE_CLIENT_TIMEOUT", "180"))
+# Attempts after a 429 from the service before giving up.
+INFERENCE_CLIENT_RETRIES = int(os.getenv("INFERENCE_CLIENT_RETRIES", "5"))
+
+
+class InferenceServiceError(Exception):
+    """Raised when the inference service cannot be reached or keeps answering 429."""
+
+
+class InferenceClient:
+    """
+    Talks to inference_service over pooled, kept-alive HTTP connections.
+
+    detect_image(), detect() and stream_recipes() have the same signatures and return
+    types as food_detector.detect_image, food_detector.get_ingredients_from_image and
+    recipe_generator.stream_two_recipes, so the app can use either.
+    """
+
+    def __init__(self, base_url: str, timeout: float = INFERENCE_CLIENT_TIMEOUT,
+                 retries: int = INFERENCE_CLIENT_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        # Imported here so the app does not load httpx when it runs without the service.
+        import httpx
+
+        self._client = httpx.Client(base_url=self.base_url, timeout=timeout)
+
+    def _send(self, method: str, path: str, stream: bool = False, **kwargs):
+        """Sends a request, waiting and retrying while the service answers 429. Returns the httpx.Response."""
+        import httpx
+
+        for attempt in range(self.retries + 1):
+            try:
+                request = self._client.build_request(method, path, **kwargs)
+                response = self._client.send(request, stream=stream)
+            except httpx.HTTPError as e:
+                raise InferenceServiceError(f"Inference service at {self.base_url} unreachable: {e}") from e
+            if response.status_code != 429:
+                if response.status_code >= 400:
+                    response.read()
+                    raise InferenceServiceError(f"Inference service returned {response.status_code}: {response.text}")
+                return response
+            response.close()
+            if attempt < self.retries:
+                retry_after = float(response.headers.get("retry-after", "1"))
+                time.sleep(retry_after + random.uniform(0, retry_after))
+        raise InferenceServiceError("Inference service is overloaded, please try again.")
+
+    def _post_image(self, image_bytes: bytes) -> dict:
+        response = self._send("POST", "/detect", content=image_bytes,
+                              headers={"Content-Type": "application/octet-stream"})
+        return response.json()
+
+    def detect_image(self, image_bytes: bytes):
+        """Sends an encoded image and returns its Detections: boxes, counts and low-confidence ingredients."""
+        # Imported here so the app does not load NumPy before the first page either.
+        from .detections import Detections
+
+        return Detections.from_dict(self._post_image(image_bytes)["detections"])
+
+    def detect(self, image_bytes: bytes) -> list[str]:
+        """Sends an encoded image and returns the unique ingredient names found in it."""
+        return self._post_image(image_bytes)["ingredients"]
+
+    def stream_recipes(self, meal_type: str, ingredients: list[str]):
+        """
+        Streams the two recipes from the service.
+
+        Yields:
+            tuple[str, str | None]: ("healthy" or "tasty", the next piece of that recipe's
+            Markdown, or None when the recipe starts over; see recipe_generator.stream_two_recipes).
+        """
+        try:
+            response = self._send("POST", "/recipes", stream=True,
+                                  json={"meal_type": meal_type, "ingredients": ingredients, "stream": True})
+        except InferenceServiceError as e:
+            print(e)
+            error_message = "Sorry, I couldn't generate recipes at the moment. Please try again."
+            yield "healthy", error_message
+            yield "tasty", error_message
+            return
+        try:
+            for line in response.iter_lines():
+                if line:
+                    piece = json.loads(line)
+                    yield piece["section"], piece["text"]
+        finally:
+            response.close()
+
+    def health(self) -> dict:
+        return self._client.get("/health").json()
+
+
+_client: InferenceClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_inference_client() -> InferenceClient:
+    """Returns the process-wide client for INFERENCE_SERVICE_URL."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = InferenceClient(INFERENCE_SERVICE_URL)
+    return _client
@@ -0,0 +1,311 @@
+import argparse
+import itertools
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+from PIL import UnidentifiedImageError
+
+from . import food_detector, recipe_generator, tracing
+from .detections import Detections
+from .detector_pool import DETECTOR_POOL_WORKERS, get_detector_pool
+
+# A headless HTTP front for the detector and the recipe generator, so the model runs in
+# its own process (or on its own machine) and Streamlit sessions only wait on a socket:
+#
+#   python -m src.ingregenius.inference_service --workers 2 --queue-size 32
+#   INFERENCE_SERVICE_URL=http://127.0.0.1:8500 streamlit run app.py
+#
+#   POST /detect    body: encoded image bytes   -> {"ingredients": [...], "counts": {...},
+#                      "low_confidence": [...], "detections": {boxes, classes, confidences}}
+#   POST /recipes   body: {"meal_type": ..., "ingredients": [...], "stream": true}
+#                   -> one JSON line per piece {"section": ..., "text": ...}, or
+#                      {"healthy": ..., "tasty": ...} when stream is false
+#   GET  /health    -> queue and cache state; 503 while shutting down
+#   GET  /metrics   -> tracing histograms in the Prometheus format (with TRACING=1)
+
+# --- Configuration ---
+load_dotenv()
+
+INFERENCE_SERVICE_HOST = os.getenv("INFERENCE_SERVICE_HOST", "127.0.0.1")
+INFERENCE_SERVICE_PORT = int(os.getenv("INFERENCE_SERVICE_PORT", "8500"))
+# Threads running detections. They feed the detector's micro-batcher, so a few are enough.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+# Detections allowed to wait for a worker before new ones are turned away with 429.
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "32"))
+# Recipe requests (mostly waiting on the LLM) handled at once before 429.
+INFERENCE_MAX_RECIPE_REQUESTS = int(os.getenv("INFERENCE_MAX_RECIPE_REQUESTS", "32"))
+INFERENCE_MAX_IMAGE_MB = float(os.getenv("INFERENCE_MAX_IMAGE_MB", "20"))
+# Seconds an idle keep-alive connection stays open; also bounds how long shutdown waits for them.
+INFERENCE_IDLE_TIMEOUT = float(os.getenv("INFERENCE_IDLE_TIMEOUT", "5"))
+
+
+class Overloaded(Exception):
+    """Raised when a request arrives while every worker and queue slot is taken."""
+
+
+class InferenceService:
+    """
+    Runs detections on a fixed pool of worker threads behind a bounded queue.
+
+    Admission is decided up front: a request either gets one of workers + queue_size
+    slots or is rejected immediately, so a burst cannot pile up unbounded work.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, queue_size: int = INFERENCE_QUEUE_SIZE,
+                 max_recipe_requests: int = INFERENCE_MAX_RECIPE_REQUESTS):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.draining = False
+        self.rejected = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="inference")
+        self._detect_slots = threading.BoundedSemaphore(workers + queue_size)
+        self._recipe_slots = threading.BoundedSemaphore(max_recipe_requests)
+        self._max_recipe_requests = max_recipe_requests
+        self._in_flight = 0
+        self._recipes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _admit(self, slots: threading.BoundedSemaphore):
+        if self.draining or not slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded()
+
+    def detect(self, image_bytes: bytes) -> Detections:
+        """Runs one detection on the worker pool, raising Overloaded when the queue is full."""
+        self._admit(self._detect_slots)
+        with self._lock:
+            self._in_flight += 1
+        try:
+            image = food_detector.load_image(image_bytes)
+            return self._executor.submit(food_detector.detect_image, image).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.completed += 1
+            self._detect_slots.release()
+
+    def recipes(self, meal_type: str, ingredients: list[str]):
+        """
+        Yields the (section, text) pieces of the two recipes, raising Overloaded when full.
+
+        RECIPE_DEADLINE is not applied here: the app wraps this stream in its own
+        DeadlineRecipeStream, so the template recipes also cover a slow or busy service.
+        """
+        self._admit(self._recipe_slots)
+        with self._lock:
+            self._recipes_in_flight += 1
+        try:
+            yield from recipe_generator.stream_two_recipes(meal_type, ingredients)
+        finally:
+            with self._lock:
+                self._recipes_in_flight -= 1
+                self.completed += 1
+            self._recipe_slots.release()
+
+    def health(self) -> dict:
+        with self._lock:
+            in_flight, recipes_in_flight = self._in_flight, self._recipes_in_flight
+        return {
+            "status": "draining" if self.draining else "ok",
+            "workers": self.workers,
+            "detections_in_flight": in_flight,
+            "detections_queued": max(0, in_flight - self.workers),
+            "queue_size": self.queue_size,
+            "recipes_in_flight": recipes_in_flight,
+            "max_recipe_requests": self._max_recipe_requests,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "weights_hash": food_detector.active_weights_hash()[:16],
+            "detector_pool_workers": DETECTOR_POOL_WORKERS,
+            "detection_cache": food_detector.detection_cache_stats(),
+            "recipe_cache": recipe_generator.recipe_cache_stats(),
+        }
+
+    def shutdown(self):
+        """Stops admitting requests and waits for the running detections to finish."""
+        self.draining = True
+        self._executor.shutdown(wait=True)
+
+
+def make_handler(service: InferenceService):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = INFERENCE_IDLE_TIMEOUT
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if service.draining:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _send_overloaded(self):
+            self._send_json(429, {"error": "The inference service is busy, try again shortly."}, {"Retry-After": "1"})
+
+        def _read_body(self) -> bytes | None:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > INFERENCE_MAX_IMAGE_MB * 1024 * 1024:
+                self._send_json(413, {"error": "Request body too large."})
+                self.close_connection = True
+                return None
+            return self.rfile.read(length)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                health = service.health()
+                self._send_json(503 if service.draining else 200, health)
+            elif self.path.rstrip("/") == "/metrics":
+                body = tracing.render_metrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            path = self.path.rstrip("/")
+            if path not in ("/detect", "/recipes"):
+                self._send_json(404, {"error": "not found"})
+                return
+            body = self._read_body()
+            if body is None:
+                return
+            if path == "/detect":
+                self._detect(body)
+            else:
+                self._recipes(body)
+
+        def _detect(self, body: bytes):
+            if not body:
+                self._send_json(400, {"error": "Send the encoded image as the request body."})
+                return
+            try:
+                detections = service.detect(body)
+            except Overloaded:
+                self._send_overloaded()
+                return
+            except UnidentifiedImageError:
+                self._send_json(400, {"error": "The request body is not an image."})
+                return
+            except Exception as e:
+                print(f"Detection failed: {e}")
+                self._send_json(500, {"error": f"Detection failed: {e.__class__.__name__}"})
+                return
+            self._send_json(200, {"ingredients": detections.ingredients, "counts": detections.counts,
+                                  "low_confidence": detections.low_confidence, "detections": detections.as_dict()})
+
+        def _recipes(self, body: bytes):
+            try:
+                request = json.loads(body or b"{}")
+                meal_type, ingredients = str(request["meal_type"]), [str(i) for i in request["ingredients"]]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {"error": "Expected JSON with 'meal_type' and 'ingredients'."})
+                return
+
+            pieces = service.recipes(meal_type, ingredients)
+            try:
+                first = next(pieces, None)
+            except Overloaded:
+                self._send_overloaded()
+                return
+
+            all_pieces = itertools.chain([first] if first else [], pieces)
+            if not request.get("stream", True):
+                recipes = {"healthy": "", "tasty": ""}
+                for section, text in all_pieces:
+                    recipes[section] = "" if text is None else recipes[section] + text
+                self._send_json(200, {section: text.strip() for section, text in recipes.items()})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for section, text in all_pieces:
+                    self.wfile.write((json.dumps({"section": section, "text": text}) + "\n").encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The session went away; stop pulling pieces so its slot is freed.
+                pieces.close()
+
+    return InferenceHandler
+
+
+def start_inference_service(host: str = INFERENCE_SERVICE_HOST, port: int = 0,
+                            service: InferenceService | None = None):
+    """
+    Loads the model and starts the service on a background thread.
+
+    Returns:
+        tuple[ThreadingHTTPServer, str]: The server (see stop_inference_service) and its base URL.
+    """
+    service = service or InferenceService()
+    # Load and warm the model (or every pool replica) before the first request has to wait for it.
+    if DETECTOR_POOL_WORKERS > 0:
+        get_detector_pool().warmup()
+    else:
+        food_detector.get_model()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    # Handler threads are joined on close, so in-flight requests get their answers.
+    server.daemon_threads = False
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def stop_inference_service(server: ThreadingHTTPServer):
+    """Graceful shutdown: reject new work, stop listening, then let running requests finish."""
+    server.service.draining = True
+    server.shutdown()
+    server.server_close()
+    server.service.shutdown()
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve ingredient detection and recipes over HTTP.")
+    parser.add_argument("--host", default=INFERENCE_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=INFERENCE_SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=INFERENCE_QUEUE_SIZE)
+    parser.add_argument("--max-recipe-requests", type=int, default=INFERENCE_MAX_RECIPE_REQUESTS)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    server, url = start_inference_service(
+        args.host, args.port, InferenceService(args.workers, args.queue_size, args.max_recipe_requests))
+    print(f"Inference service listening on {url} with {args.workers} workers")
+    stop.wait()
+
+    print("Shutting down, finishing requests in flight...")
+    start = time.perf_counter()
+    stop_inference_service(server)
+    print(f"Stopped after {time.perf_counter() - start:.1f}s.")
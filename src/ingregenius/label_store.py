@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+# --- Configuration ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DATASET_DIR = PROJECT_ROOT / 'Data' / 'IngreGenius-Final-Model-training-dataset'
+MASTER_LABELS_DIR = DATASET_DIR / 'master_labels'
+MASTER_CLASSES_FILE = DATASET_DIR / 'master_classes.txt'
+LABEL_STORE_DIR = PROJECT_ROOT / '.cache' / 'label_store'
+
+# Folder names that mark a split in the remapped layout, e.g. "train/labels" or "labels/val".
+SPLIT_NAMES = {"train": "train", "valid": "val", "val": "val", "test": "test"}
+SPLITS = ("train", "val", "test", "unknown")
+ARRAYS = ("class_ids", "boxes", "offsets", "image_source", "image_split")
+
+
+def parse_label_file(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reads one YOLO label file.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Class ids (int16) and boxes as normalized
+        x_center, y_center, width, height (float32, shape (n, 4)).
+    """
+    lines = [line.split() for line in Path(path).read_text().splitlines() if line.strip()]
+    class_ids = np.array([int(parts[0]) for parts in lines], dtype=np.int16)
+    boxes = np.empty((len(lines), 4), dtype=np.float32)
+    for i, parts in enumerate(lines):
+        values = np.array(parts[1:], dtype=np.float32)
+        if len(values) == 4:
+            boxes[i] = values
+        else:
+            # A segmentation polygon: store its bounding box.
+            xs, ys = values[0::2], values[1::2]
+            boxes[i] = ((xs.min() + xs.max()) / 2, (ys.min() + ys.max()) / 2, xs.max() - xs.min(), ys.max() - ys.min())
+    return class_ids, boxes
+
+
+def _split_of(relative_path: Path) -> str:
+    for part in relative_path.parts[1:]:
+        if part in SPLIT_NAMES:
+            return SPLIT_NAMES[part]
+    return "unknown"
+
+
+def build_label_store(labels_dir: Path = MASTER_LABELS_DIR, store_dir: Path = LABEL_STORE_DIR,
+                      force: bool = False) -> dict:
+    """
+    Packs every label file below labels_dir into one set of NumPy arrays in store_dir.
+
+    The first folder below labels_dir is taken as the source dataset. Files whose size and
+    mtime match the previous build are copied over from the old arrays instead of being
+    parsed again, so rebuilding after a few labels changed is quick.
+
+    Returns:
+        dict: How many images were parsed, reused and removed.
+    """
+    labels_dir, store_dir = Path(labels_dir), Path(store_dir)
+    old = None if force or not (store_dir / "index.json").exists() else LabelStore(store_dir)
+    old_rows = {path: i for i, path in enumerate(old.image_paths)} if old else {}
+
+    paths = sorted(labels_dir.rglob("*.txt"))
+    image_paths, files, sources = [], {}, []
+    class_parts, box_parts, image_source, image_split = [], [], [], []
+    parsed = 0
+
+    for path in paths:
+        relative_path = path.relative_to(labels_dir)
+        key = relative_path.as_posix()
+        stat = path.stat()
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        row = old_rows.get(key)
+        if row is not None and old.files.get(key) == signature:
+            start, end = old.offsets[row], old.offsets[row + 1]
+            # Copies, not views: a view would keep the old memmaps open past `del old` below.
+            class_ids, boxes = np.array(old.class_ids[start:end]), np.array(old.boxes[start:end])
+        else:
+            class_ids, boxes = parse_label_file(path)
+            parsed += 1
+
+        source = relative_path.parts[0]
+        if source not in sources:
+            sources.append(source)
+
+        image_paths.append(key)
+        files[key] = signature
+        class_parts.append(class_ids)
+        box_parts.append(boxes)
+        image_source.append(sources.index(source))
+        image_split.append(SPLITS.index(_split_of(relative_path)))
+
+    counts = np.array([len(c) for c in class_parts], dtype=np.int64)
+    arrays = {
+        "class_ids": np.concatenate(class_parts) if class_parts else np.empty(0, np.int16),
+        "boxes": np.concatenate(box_parts) if box_parts else np.empty((0, 4), np.float32),
+        "offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "image_source": np.array(image_source, dtype=np.int16),
+        "image_split": np.array(image_split, dtype=np.int8),
+    }
+    names = MASTER_CLASSES_FILE.read_text().split("\n") if MASTER_CLASSES_FILE.exists() else []
+    index = {"names": [n.strip() for n in names if n.strip()], "sources": sources,
+             "images": image_paths, "files": files}
+
+    # The old arrays may still be memory-mapped, so write new files and swap them in.
+    del old
+    store_dir.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(store_dir / f"{name}.tmp.npy", array)
+        os.replace(store_dir / f"{name}.tmp.npy", store_dir / f"{name}.npy")
+    (store_dir / "index.tmp.json").write_text(json.dumps(index))
+    os.replace(store_dir / "index.tmp.json", store_dir / "index.json")
+
+    return {"images": len(image_paths), "boxes": int(counts.sum()), "parsed": parsed,
+            "reused": len(image_paths) - parsed, "removed": len(old_rows.keys() - files.keys())}
+
+
+class LabelStore:
+    """
+    Read-only, memory-mapped view of a store written by build_label_store().
+
+    Boxes of image i are rows offsets[i]:offsets[i + 1] of class_ids and boxes. Every
+    query takes optional split ('train', 'val', 'test') and source (dataset folder name)
+    filters and is answered with vectorized NumPy operations.
+    """
+
+    def __init__(self, store_dir: Path = LABEL_STORE_DIR):
+        store_dir = Path(store_dir)
+        index = json.loads((store_dir / "index.json").read_text())
+        self.names: list[str] = index["names"]
+        self.sources: list[str] = index["sources"]
+        self.image_paths: list[str] = index["images"]
+        self.files: dict = index["files"]
+
+        arrays = {name: np.load(store_dir / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        self.class_ids = arrays["class_ids"]
+        self.boxes = arrays["boxes"]
+        self.offsets = arrays["offsets"]
+        self.image_source = arrays["image_source"]
+        self.image_split = arrays["image_split"]
+        self.boxes_per_image = np.diff(self.offsets)
+        # The image each box belongs to.
+        self.box_image = np.repeat(np.arange(len(self.image_paths)), self.boxes_per_image)
+
+    @property
+    def num_classes(self) -> int:
+        return max(len(self.names), int(self.class_ids.max()) + 1 if len(self.class_ids) else 0)
+
+    def image_mask(self, split: str | None = None, source: str | None = None) -> np.ndarray:
+        """Returns a boolean mask over images matching the filters."""
+        mask = np.ones(len(self.image_paths), dtype=bool)
+        if split is not None:
+            mask &= self.image_split == SPLITS.index(SPLIT_NAMES.get(split, split))
+        if source is not None:
+            mask &= self.image_source == (self.sources.index(source) if source in self.sources else -1)
+        return mask
+
+    def box_mask(self, split: str | None = None, source: str | None = None) -> np.ndarray:
+        """Returns a boolean mask over boxes whose image matches the filters."""
+        return self.image_mask(split, source)[self.box_image]
+
+    def class_histogram(self, split: str | None = None, source: str | None = None) -> np.ndarray:
+        """Returns the number of boxes per class id."""
+        return np.bincount(self.class_ids[self.box_mask(split, source)], minlength=self.num_classes)
+
+    def images_per_class(self, split: str | None = None, source: str | None = None) -> np.ndarray:
+        """Returns the number of images containing at least one box of each class id."""
+        mask = self.box_mask(split, source)
+        pairs = np.unique(self.box_image[mask].astype(np.int64) * self.num_classes + self.class_ids[mask])
+        return np.bincount(pairs % self.num_classes, minlength=self.num_classes)
+
+    def boxes_per_image_distribution(self, split: str | None = None, source: str | None = None) -> np.ndarray:
+        """Returns how many images have 0, 1, 2, ... boxes."""
+        return np.bincount(self.boxes_per_image[self.image_mask(split, source)])
+
+    def box_size_stats(self, split: str | None = None, source: str | None = None) -> dict:
+        """
+        Summarizes box width, height and area (all relative to the image size).
+
+        Returns:
+            dict: Percentiles (p5, p50, p95) and mean of width, height and area over all
+            matching boxes, plus the mean area of each class id.
+        """
+        mask = self.box_mask(split, source)
+        boxes = self.boxes[mask]
+        width, height = boxes[:, 2], boxes[:, 3]
+        area = width * height
+        stats = {}
+        for name, values in (("width", width), ("height", height), ("area", area)):
+            if len(values):
+                p5, p50, p95 = np.percentile(values, [5, 50, 95])
+                stats[name] = {"mean": float(values.mean()), "p5": float(p5), "p50": float(p50), "p95": float(p95)}
+        counts = np.bincount(self.class_ids[mask], minlength=self.num_classes)
+        area_sums = np.bincount(self.class_ids[mask], weights=area, minlength=self.num_classes)
+        stats["mean_area_per_class"] = np.divide(area_sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+        return stats
+
+
+def print_stats(store: LabelStore, split: str | None = None, source: str | None = None):
+    start = time.perf_counter()
+    histogram = store.class_histogram(split, source)
+    images = store.images_per_class(split, source)
+    per_image = store.boxes_per_image_distribution(split, source)
+    sizes = store.box_size_stats(split, source)
+    elapsed_ms = 1000 * (time.perf_counter() - start)
+
+    total = int(histogram.sum())
+    print(f"{int(store.image_mask(split, source).sum())} images, {total} boxes "
+          f"(split: {split or 'all'}, source: {source or 'all'})")
+    print(f"{'class':>16} | {'boxes':>6} | {'share':>6} | {'images':>6} | {'mean area':>9}")
+    for class_id in np.argsort(-histogram):
+        name = store.names[class_id] if class_id < len(store.names) else f"class {class_id}"
+        print(f"{name:>16} | {histogram[class_id]:6d} | {histogram[class_id] / max(total, 1):6.1%} | "
+              f"{images[class_id]:6d} | {sizes['mean_area_per_class'][class_id]:9.4f}")
+    print("Boxes per image: " + ", ".join(f"{n}: {count}" for n, count in enumerate(per_image) if count))
+    if "area" in sizes:
+        area = sizes["area"]
+        print(f"Box area: p5 {area['p5']:.4f}, median {area['p50']:.4f}, p95 {area['p95']:.4f}")
+    print(f"Queries took {elapsed_ms:.1f} ms.")
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack the remapped labels into one store and query it.")
+    parser.add_argument("--store", type=Path, default=LABEL_STORE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Create or update the store from master_labels.")
+    build_parser.add_argument("--labels", type=Path, default=MASTER_LABELS_DIR)
+    build_parser.add_argument("--force", action="store_true", help="Parse every file again.")
+
+    stats_parser = subparsers.add_parser("stats", help="Print class balance and box statistics.")
+    stats_parser.add_argument("--split", choices=["train", "val", "test"])
+    stats_parser.add_argument("--source", help="Only count one source dataset.")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        summary = build_label_store(args.labels, args.store, args.force)
+        print(f"Packed {summary['boxes']} boxes from {summary['images']} label files into {args.store} "
+              f"in {time.perf_counter() - start:.2f}s ({summary['parsed']} parsed, "
+              f"{summary['reused']} unchanged, {summary['removed']} removed).")
+    else:
+        print_stats(LabelStore(args.store), args.split, args.source)
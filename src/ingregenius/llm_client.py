@@ -0,0 +1,253 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from dotenv import load_dotenv
+
+# --- Configuration ---
+load_dotenv()
+
+LLM_API_KEY = os.getenv("LLM_API_KEY")
+# Point this at `python -m src.ingregenius.llm_stub_server` to run without OpenRouter.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+# Seconds before a single attempt is abandoned.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+# Extra attempts after a 429, a 5xx, a timeout or a connection error.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Requests in flight across the whole process.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Seconds after which a duplicate request is fired; the first response wins. 0 disables hedging.
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0"))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Returns True for throttling, server errors, timeouts and dropped connections."""
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def backoff_delay(attempt: int, error: Exception | None = None,
+                  base: float = LLM_BACKOFF_BASE, maximum: float = LLM_BACKOFF_MAX) -> float:
+    """
+    Returns how long to sleep before retry number `attempt` (starting at 0).
+
+    Uses exponential backoff with full jitter, but honours a Retry-After header sent
+    with a 429 when there is one.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), maximum)
+        except ValueError:
+            pass
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+class LLMClient:
+    """
+    A long-lived, pooled OpenAI-compatible client shared by every Streamlit session.
+
+    Keeps HTTP connections alive between requests, caps the number of requests in flight
+    with a semaphore, retries 429/5xx responses with exponential backoff and can hedge
+    slow requests by firing a duplicate after hedge_delay seconds.
+    """
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str | None = LLM_API_KEY,
+                 timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, hedge_delay: float = LLM_HEDGE_DELAY):
+        self.max_retries = max_retries
+        self.hedge_delay = hedge_delay
+        self.retries = 0
+        self.hedges = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # The openai package takes most of a second to import; defer it to the first client.
+        from openai import OpenAI
+
+        # Retries are ours, so the SDK's own retry loop is switched off.
+        self._client = OpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=0,
+            http_client=httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=2 * max_concurrency, max_keepalive_connections=max_concurrency),
+            ),
+        )
+        self._hedge_pool = ThreadPoolExecutor(max_workers=2 * max_concurrency, thread_name_prefix="llm-hedge")
+
+    def _create(self, **kwargs):
+        with self._semaphore:
+            return self._client.chat.completions.create(**kwargs)
+
+    def _create_hedged(self, **kwargs):
+        primary = self._hedge_pool.submit(self._create, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        pending = {primary, self._hedge_pool.submit(self._create, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower request cannot be interrupted; its result is discarded.
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def chat(self, **kwargs):
+        """Runs chat.completions.create with retries (and hedging, if enabled)."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.hedge_delay > 0:
+                    return self._create_hedged(**kwargs)
+                return self._create(**kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                delay = backoff_delay(attempt, e)
+                print(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def stream(self, **kwargs):
+        """
+        Streams a chat completion, yielding the SDK's chunks.
+
+        Failures before the first chunk are retried; once text has been yielded the
+        stream cannot be restarted, so later errors are raised. Streams are not hedged.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self._semaphore:
+                    for chunk in self._client.chat.completions.create(stream=True, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                delay = backoff_delay(attempt, e)
+                print(f"LLM stream failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+
+class AsyncLLMClient:
+    """The asyncio counterpart of LLMClient. The losing hedged request is cancelled."""
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str | None = LLM_API_KEY,
+                 timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, hedge_delay: float = LLM_HEDGE_DELAY):
+        self.max_retries = max_retries
+        self.hedge_delay = hedge_delay
+        self.retries = 0
+        self.hedges = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        from openai import AsyncOpenAI
+
+        self._client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=2 * max_concurrency, max_keepalive_connections=max_concurrency),
+            ),
+        )
+
+    async def _create(self, **kwargs):
+        async with self._semaphore:
+            return await self._client.chat.completions.create(**kwargs)
+
+    async def _create_hedged(self, **kwargs):
+        primary = asyncio.ensure_future(self._create(**kwargs))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        pending = {primary, asyncio.ensure_future(self._create(**kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def chat(self, **kwargs):
+        """Runs chat.completions.create with retries (and hedging, if enabled)."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.hedge_delay > 0:
+                    return await self._create_hedged(**kwargs)
+                return await self._create(**kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, e))
+
+    async def stream(self, **kwargs):
+        """Streams a chat completion; only failures before the first chunk are retried."""
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self._semaphore:
+                    async for chunk in await self._client.chat.completions.create(stream=True, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, e))
+
+
+_client: LLMClient | None = None
+_client_lock = threading.Lock()
+# httpx.AsyncClient and asyncio.Semaphore belong to one event loop, so keep one client per loop.
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_llm_client() -> LLMClient:
+    """Returns the process-wide pooled client, creating it on first use."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def get_async_llm_client() -> AsyncLLMClient:
+    """Returns the pooled asyncio client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncLLMClient()
+    return client
@@ -0,0 +1,212 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local stand-in for OpenRouter's OpenAI-compatible chat API. It answers with canned
+# recipes after a configurable delay and can inject 429 and 500 responses, so the
+# recipe generator can be exercised without network access or an API key. Prompts for a
+# single recipe (fan-out mode) get one recipe back, and every answer reports its token usage:
+#
+#   python -m src.ingregenius.llm_stub_server --latency-ms 800 --error-rate 0.1
+#   LLM_BASE_URL=http://127.0.0.1:8765/v1 LLM_API_KEY=stub streamlit run app.py
+
+
+class StubSettings:
+    """Behaviour of the stand-in server; can be changed while it is running."""
+
+    def __init__(self, latency_ms: float = 500, jitter_ms: float = 100, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, tokens_per_second: float = 200, omit_separator: bool = False):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.tokens_per_second = tokens_per_second
+        self.omit_separator = omit_separator
+        # Scripted behaviour of the next requests, used before the random rates: each entry is a
+        # status code to answer with (429 or 500), or None for a normal answer.
+        self.planned_statuses = deque()
+        # Latency of the next requests in milliseconds, replacing latency_ms and jitter_ms.
+        self.planned_latency_ms = deque()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Arrival time of every request, by time.monotonic().
+        self.arrivals = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+
+def _fake_answer(omit_separator: bool, messages: list[dict] | None = None) -> str:
+    """Builds a recipe-shaped Markdown answer in the format the prompt asks for."""
+    first = ("# Stub Healthy Bowl\n\n## Ingredients\n- Whatever is in the fridge\n\n"
+             "## Instructions\n1. Steam everything.\n2. Season lightly.\n")
+    second = ("# Stub Tasty Bake\n\n## Ingredients\n- Whatever is in the fridge\n- Butter and cheese\n\n"
+              "## Instructions\n1. Layer everything.\n2. Bake until golden.\n")
+    prompt = (messages or [{}])[-1].get("content", "")
+    if prompt and "---SEPARATOR---" not in prompt:
+        # A fan-out prompt asking for only one of the two recipes.
+        return second if "tasty" in prompt.lower() else first
+    return first + ("\n" if omit_separator else "\n---SEPARATOR---\n\n") + second
+
+
+def _tokens(text: str) -> list[str]:
+    """Splits text into word-sized pieces that concatenate back to the original."""
+    pieces, start = [], 0
+    for i, char in enumerate(text):
+        if char in " \n":
+            pieces.append(text[start:i + 1])
+            start = i + 1
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def make_handler(settings: StubSettings):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped listening, e.g. a hedged request that lost.
+                pass
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with settings.lock:
+                settings.requests += 1
+                number = settings.requests
+                settings.arrivals.append(time.monotonic())
+                settings.in_flight += 1
+                settings.max_in_flight = max(settings.max_in_flight, settings.in_flight)
+                status = settings.planned_statuses.popleft() if settings.planned_statuses else None
+                latency_ms = settings.planned_latency_ms.popleft() if settings.planned_latency_ms else None
+            try:
+                self._answer(request, number, status, latency_ms)
+            finally:
+                with settings.lock:
+                    settings.in_flight -= 1
+
+        def _answer(self, request: dict, number: int, status: int | None, latency_ms: float | None):
+            if latency_ms is None:
+                latency_ms = settings.latency_ms + random.uniform(-1, 1) * settings.jitter_ms
+            time.sleep(max(0.0, latency_ms) / 1000)
+
+            if status is None:
+                roll = random.random()
+                if roll < settings.rate_limit_rate:
+                    status = 429
+                elif roll < settings.rate_limit_rate + settings.error_rate:
+                    status = 500
+            if status == 429:
+                self._send_json(429, {"error": {"message": "stub rate limit", "code": 429}}, {"Retry-After": "0.1"})
+                return
+            if status is not None:
+                self._send_json(status, {"error": {"message": "stub server error", "code": status}})
+                return
+
+            messages = request.get("messages", [])
+            answer = _fake_answer(settings.omit_separator, messages)
+            # The request number tells the caller which attempt produced the answer.
+            completion_id = f"chatcmpl-{number}-{uuid.uuid4().hex[:12]}"
+            prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+            tokens = _tokens(answer)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                     "total_tokens": prompt_tokens + len(tokens)}
+            with settings.lock:
+                settings.prompt_tokens += prompt_tokens
+                settings.completion_tokens += len(tokens)
+            base = {"id": completion_id, "created": int(time.time()), "model": request.get("model", "stub")}
+
+            if not request.get("stream"):
+                time.sleep(len(tokens) / settings.tokens_per_second)
+                self._send_json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}]})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for token in tokens:
+                    chunk = {**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(1 / settings.tokens_per_second)
+                final = {**base, "object": "chat.completion.chunk", "usage": usage,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped listening, e.g. a hedged request that lost.
+                pass
+
+    return StubHandler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, settings: StubSettings | None = None):
+    """
+    Starts the stand-in server on a background thread.
+
+    Returns:
+        tuple[ThreadingHTTPServer, str]: The server (call shutdown() to stop it) and its base URL.
+    """
+    settings = settings or StubSettings()
+    server = ThreadingHTTPServer((host, port), make_handler(settings))
+    server.daemon_threads = True
+    server.settings = settings
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stand-in for OpenRouter.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500, help="Delay before the first token.")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction answered with 429.")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--omit-separator", action="store_true", help="Forget ---SEPARATOR--- like a sloppy LLM.")
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                            args.tokens_per_second, args.omit_separator)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(settings))
+    print(f"Stub LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
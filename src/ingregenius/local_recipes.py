@@ -0,0 +1,118 @@
+from .ingredients import INGREDIENT_DATABASE
+
+# A template-based recipe engine that runs without network access. It is what the app
+# shows when the LLM misses its deadline: less inventive, but instant and always there.
+# Ingredients are sorted into roles by their INGREDIENT_DATABASE category and the
+# healthy and tasty templates for the meal type are filled in from those roles.
+
+NOTE = "_A quick recipe from your pantry while the chef is busy._"
+GRAINS = ("Rice", "Pasta", "Quinoa", "Oats", "Bread")
+ROLES = {"Proteins": "protein", "Vegetables": "vegetable", "Fruits": "fruit", "Dairy & Eggs": "dairy"}
+
+_DISHES = {
+    "healthy": {"breakfast": "Power Bowl", "lunch": "Grain Bowl", "dinner": "Sheet-Pan Supper"},
+    "tasty": {"breakfast": "Breakfast Skillet", "lunch": "Skillet Melt", "dinner": "Golden Bake"},
+}
+_HEALTHY_COOKING = {
+    "breakfast": "cook in a lightly oiled non-stick pan",
+    "lunch": "grill or pan-sear with a teaspoon of olive oil",
+    "dinner": "roast at 200°C (400°F) for 18-25 minutes",
+}
+
+# Lowercase name -> role, built once from the database.
+_ROLE_OF = {
+    item.lower(): ("grain" if item in GRAINS else ROLES.get(category, "seasoning"))
+    for category, items in INGREDIENT_DATABASE.items() for item in items
+}
+# Eggs anchor a breakfast like a protein does.
+_ROLE_OF["eggs"] = "protein"
+
+
+def sort_by_role(ingredients: list[str]) -> dict[str, list[str]]:
+    """
+    Groups ingredients by their role in a dish.
+
+    Returns:
+        dict[str, list[str]]: protein, vegetable, fruit, dairy, grain and seasoning lists;
+        ingredients missing from INGREDIENT_DATABASE count as vegetables.
+    """
+    roles = {role: [] for role in ("protein", "vegetable", "fruit", "dairy", "grain", "seasoning")}
+    for item in dict.fromkeys(i.strip() for i in ingredients if i.strip()):
+        roles[_ROLE_OF.get(item.lower(), "vegetable")].append(item)
+    return roles
+
+
+def _join(items: list[str]) -> str:
+    items = [item.lower() for item in items]
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def _title(style: str, meal: str, roles: dict[str, list[str]]) -> str:
+    main = (roles["protein"] + roles["vegetable"] + roles["grain"] + roles["fruit"] + roles["dairy"])[:2]
+    dish = _DISHES[style].get(meal, _DISHES[style]["dinner"])
+    return f"{' & '.join(main)} {dish}" if main else f"Pantry {dish}"
+
+
+def _healthy_steps(meal: str, roles: dict[str, list[str]], seasoning: str) -> list[str]:
+    steps = []
+    if roles["grain"]:
+        steps.append(f"Cook the {_join(roles['grain'])} according to the package, without butter.")
+    if roles["vegetable"]:
+        steps.append(f"Rinse and chop the {_join(roles['vegetable'])}, then steam or roast until just tender, 5-10 minutes.")
+    if roles["protein"]:
+        cooking = _HEALTHY_COOKING.get(meal, _HEALTHY_COOKING["dinner"])
+        steps.append(f"Season the {_join(roles['protein'])} with {seasoning} and {cooking}, until cooked through.")
+    if roles["fruit"]:
+        steps.append(f"Slice the {_join(roles['fruit'])} and scatter over the top.")
+    if roles["dairy"]:
+        steps.append(f"Finish with a small spoonful of {_join(roles['dairy'])}.")
+    steps.append("Add a squeeze of lemon or a splash of vinegar, taste, and serve.")
+    return steps
+
+
+def _tasty_steps(meal: str, roles: dict[str, list[str]], seasoning: str) -> list[str]:
+    steps = ["Preheat the oven to 200°C (400°F)." if meal == "dinner" else "Melt a knob of butter in a large skillet."]
+    if roles["protein"]:
+        steps.append(f"Season the {_join(roles['protein'])} with {seasoning} and brown in butter over "
+                     "medium-high heat until golden and cooked through.")
+    if roles["vegetable"]:
+        steps.append(f"Add the {_join(roles['vegetable'])} and cook until caramelized at the edges, 6-8 minutes.")
+    if roles["grain"]:
+        steps.append(f"Stir in the cooked {_join(roles['grain'])} so it soaks up the pan juices.")
+    cheese = _join(roles["dairy"]) if roles["dairy"] else "a generous handful of grated cheese"
+    finish = "bake for 10 minutes" if meal == "dinner" else "cover with a lid for 2 minutes"
+    steps.append(f"Top with {cheese} and {finish}, until bubbling.")
+    if roles["fruit"]:
+        steps.append(f"Serve with the {_join(roles['fruit'])} on the side.")
+    steps.append("Season generously and serve hot.")
+    return steps
+
+
+def _markdown(title: str, ingredients: list[str], staples: str, steps: list[str]) -> str:
+    lines = [f"# {title}", "", NOTE, "", "## Ingredients"]
+    lines += [f"- {item}" for item in ingredients] + [f"- {staples}", "", "## Instructions"]
+    lines += [f"{i}. {step}" for i, step in enumerate(steps, 1)]
+    return "\n".join(lines) + "\n"
+
+
+def local_recipes(meal_type: str, ingredients: list[str]) -> tuple[str, str]:
+    """
+    Builds a healthy and a tasty recipe from templates, without calling the LLM.
+
+    Args:
+        meal_type (str): "Breakfast", "Lunch" or "Dinner".
+        ingredients (list[str]): The ingredients to cook with.
+
+    Returns:
+        tuple[str, str]: The healthy and the tasty recipe in Markdown.
+    """
+    meal = meal_type.strip().lower()
+    roles = sort_by_role(ingredients)
+    used = [item for role in ("protein", "vegetable", "grain", "fruit", "dairy", "seasoning") for item in roles[role]]
+    seasoning = _join(roles["seasoning"]) if roles["seasoning"] else "salt and black pepper"
+
+    healthy = _markdown(_title("healthy", meal, roles), used, "Olive oil, salt and black pepper",
+                        _healthy_steps(meal, roles, seasoning))
+    tasty = _markdown(_title("tasty", meal, roles), used, "Butter, grated cheese, salt and black pepper",
+                      _tasty_steps(meal, roles, seasoning))
+    return healthy, tasty
@@ -1,6 +1,15 @@
+import json
 import os
-from openai import OpenAI
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from .cache import MISSING, TieredCache
+from .llm_client import get_llm_client
+from .local_recipes import local_recipes
+from .singleflight import SingleFlight
+from . import tracing
 
 # --- Configuration ---
 # Load environment variables from the .env file in your project root
@@ -8,70 +17,641 @@ load_dotenv()
 
 # Securely get your OpenRouter API key (using the name from your file)
 OPENROUTER_API_KEY = os.getenv("LLM_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek/deepseek-r1:free")
+
+# Recipe cache: entries kept in memory (0 disables the cache), their lifetime in seconds,
+# an optional directory for a persistent tier, and the Jaccard similarity above which a
+# cached result for a slightly different ingredient set is reused (0 disables near matches).
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "256"))
+RECIPE_CACHE_TTL = float(os.getenv("RECIPE_CACHE_TTL", "3600"))
+RECIPE_CACHE_DIR = os.getenv("RECIPE_CACHE_DIR") or None
+RECIPE_CACHE_NEAR_MATCH = float(os.getenv("RECIPE_CACHE_NEAR_MATCH", "0"))
+
+# Latency SLA: seconds the LLM gets to produce its first text before the local template
+# recipes are shown instead (0 waits for the LLM), and how long the page then keeps
+# waiting for the LLM recipes to replace them.
+RECIPE_DEADLINE = float(os.getenv("RECIPE_DEADLINE", "0"))
+RECIPE_LATE_WAIT = float(os.getenv("RECIPE_LATE_WAIT", "120"))
+
+# "single" asks for both recipes in one completion, "fanout" sends one request per
+# recipe at the same time; each recipe then appears (and is retried) on its own.
+RECIPE_MODES = ("single", "fanout")
+RECIPE_MODE = os.getenv("RECIPE_MODE", "single").lower()
+if RECIPE_MODE not in RECIPE_MODES:
+    raise ValueError(f"Unknown RECIPE_MODE '{RECIPE_MODE}'. Choose one of {', '.join(RECIPE_MODES)}.")
+# Fan-out mode: extra attempts for a recipe whose stream broke off after it had started.
+RECIPE_FANOUT_RETRIES = int(os.getenv("RECIPE_FANOUT_RETRIES", "1"))
+
+SEPARATOR = "---SEPARATOR---"
+MISSING_SECOND_RECIPE = "Sorry, I had trouble generating the second recipe. Please try again."
+MISSING_KEY_MESSAGE = "Error: LLM_API_KEY not found. Please check your .env file."
+LLM_ERROR_MESSAGE = ("Sorry, I couldn't generate recipes at the moment. The API returned an error. "
+                     "Please check the console for details.")
+
+
+def _build_messages(meal_type: str, ingredients: list[str]) -> list[dict]:
+    """Builds the chat messages asking for a healthy and a tasty recipe separated by SEPARATOR."""
+    ingredients_str = ", ".join(ingredients)
+    return [
+        {"role": "system", "content": "You are a creative and helpful chef. You will generate two distinct recipes based on the user's request and separate them with a specific marker."},
+        {"role": "user", "content": f"""
+            Generate TWO distinct recipes for **{meal_type}** using the available ingredients: **{ingredients_str}**.
+            You can assume common pantry staples are also available.
+
+            **Recipe 1: Healthy and Diet-Conscious**
+            Focus on fresh ingredients, low-fat cooking methods, and high nutritional value.
+
+            **Recipe 2: Tasty and Flavorful**
+            Prioritize taste and satisfaction. Feel free to use butter, cheese, or other rich ingredients.
+            
+            Please format both outputs in Markdown with a title, ingredients, and instructions.
+            
+            **IMPORTANT:** After the first recipe, place the exact separator `{SEPARATOR}` before starting the second recipe.
+        """}
+    ]
+
+
+# What each recipe of the pair is about, for the prompts of fan-out mode.
+RECIPE_STYLES = {
+    "healthy": ("Healthy and Diet-Conscious",
+                "Focus on fresh ingredients, low-fat cooking methods, and high nutritional value."),
+    "tasty": ("Tasty and Flavorful",
+              "Prioritize taste and satisfaction. Feel free to use butter, cheese, or other rich ingredients."),
+}
+
+
+def _build_recipe_messages(meal_type: str, ingredients: list[str], section: str) -> list[dict]:
+    """Builds the chat messages asking for only the healthy or only the tasty recipe."""
+    title, focus = RECIPE_STYLES[section]
+    return [
+        {"role": "system", "content": "You are a creative and helpful chef."},
+        {"role": "user", "content": f"""
+            Generate ONE **{title}** recipe for **{meal_type}** using the available ingredients: **{", ".join(ingredients)}**.
+            You can assume common pantry staples are also available.
+
+            {focus}
+
+            Please format the output in Markdown with a title, ingredients, and instructions.
+        """}
+    ]
+
+
+class RecipeStreamParser:
+    """
+    Splits a streamed two-recipe response into its "healthy" and "tasty" parts.
+
+    Text is routed to the healthy recipe until SEPARATOR has been seen, then to the
+    tasty recipe. The separator may be split across chunks, so the end of a chunk
+    that could be the start of the separator is held back until the next chunk.
+    """
+
+    def __init__(self):
+        self.section = "healthy"
+        self._pending = ""
+        self._started = {"healthy": False, "tasty": False}
+
+    def _emit(self, section: str, text: str) -> list[tuple[str, str]]:
+        # Leading whitespace of a recipe is dropped, like str.strip() in split_recipes.
+        if not self._started[section]:
+            text = text.lstrip()
+            self._started[section] = bool(text)
+        return [(section, text)] if text else []
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """Consumes one chunk and returns the (section, text) pieces that are safe to show."""
+        text = self._pending + chunk
+        self._pending = ""
+
+        if self.section == "tasty":
+            return self._emit("tasty", text)
+
+        index = text.find(SEPARATOR)
+        if index >= 0:
+            self.section = "tasty"
+            return self._emit("healthy", text[:index]) + self._emit("tasty", text[index + len(SEPARATOR):])
+
+        # Hold back the longest tail that could be the beginning of the separator.
+        for size in range(min(len(SEPARATOR) - 1, len(text)), 0, -1):
+            if SEPARATOR.startswith(text[-size:]):
+                self._pending = text[-size:]
+                text = text[:-size]
+                break
+        return self._emit("healthy", text)
+
+    def finish(self) -> list[tuple[str, str]]:
+        """Flushes held-back text; adds an apology if the second recipe never started."""
+        pieces = self._emit(self.section, self._pending)
+        self._pending = ""
+        if not self._started["tasty"]:
+            pieces += self._emit("tasty", MISSING_SECOND_RECIPE)
+        return pieces
+
+
+# --- Recipe Cache ---
+def canonical_ingredients(ingredients: list[str]) -> tuple[str, ...]:
+    """Lowercases, deduplicates and sorts ingredient names, so ["Tomato","Onion"] == ["onion","tomato"]."""
+    return tuple(sorted({item.strip().lower() for item in ingredients if item.strip()}))
+
+
+def recipe_cache_key(meal_type: str, ingredients: list[str]) -> str:
+    """Returns the canonical cache key for a request: LLM model, meal type and ingredient set."""
+    return json.dumps([LLM_MODEL, meal_type.strip().lower(), list(canonical_ingredients(ingredients))])
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class RecipeCache:
+    """
+    Caches recipe pairs under their canonical key with a TTL, LRU eviction and an
+    optional SQLite tier.
+
+    With near_match > 0, a miss falls back to the cached entry for the same model and
+    meal type whose ingredient set has the highest Jaccard similarity, if that
+    similarity is at least near_match.
+    """
+
+    def __init__(self, max_entries: int, disk_path=None, ttl_seconds: float | None = None, near_match: float = 0.0):
+        self._cache = TieredCache(max_entries, disk_path, ttl_seconds)
+        self.near_match = near_match
+        self.near_hits = 0
+        # (model, meal type) -> {key: ingredient set}, used for near-match lookups.
+        self._index: dict[tuple[str, str], dict[str, frozenset]] = {}
+        self._index_lock = threading.Lock()
+        if self._cache.disk is not None:
+            for key in self._cache.disk.keys(ttl_seconds):
+                self._add_to_index(key)
+
+    def _add_to_index(self, key: str):
+        model, meal_type, ingredients = json.loads(key)
+        with self._index_lock:
+            self._index.setdefault((model, meal_type), {})[key] = frozenset(ingredients)
+
+    def _find_near_match(self, key: str):
+        model, meal_type, ingredients = json.loads(key)
+        wanted = frozenset(ingredients)
+        with self._index_lock:
+            candidates = sorted(
+                ((_jaccard(wanted, others), other) for other, others in self._index.get((model, meal_type), {}).items()),
+                reverse=True,
+            )
+        for similarity, other in candidates:
+            if similarity < self.near_match:
+                break
+            value = self._cache.get(other, count=False)
+            if value is not MISSING:
+                return value
+            # Expired or evicted from every tier.
+            with self._index_lock:
+                self._index.get((model, meal_type), {}).pop(other, None)
+        return MISSING
+
+    def get(self, meal_type: str, ingredients: list[str]) -> tuple[str, str] | None:
+        """Returns the cached (healthy, tasty) recipes, or None on a miss."""
+        key = recipe_cache_key(meal_type, ingredients)
+        stats = self._cache.stats
+        value = self._cache.get(key, count=False)
+        if value is MISSING and self.near_match > 0:
+            value = self._find_near_match(key)
+            if value is not MISSING:
+                self.near_hits += 1
+        if value is MISSING:
+            stats.misses += 1
+            return None
+        stats.hits += 1
+        return value[0], value[1]
+
+    def put(self, meal_type: str, ingredients: list[str], recipes: tuple[str, str]):
+        key = recipe_cache_key(meal_type, ingredients)
+        self._cache.put(key, list(recipes))
+        if self.near_match > 0:
+            self._add_to_index(key)
+
+    def stats(self) -> dict:
+        return {**self._cache.stats.as_dict(), "near_hits": self.near_hits}
+
+
+_recipe_cache: RecipeCache | None = None
+_recipe_cache_lock = threading.Lock()
+
+
+def get_recipe_cache() -> RecipeCache | None:
+    """Returns the process-wide recipe cache, or None if RECIPE_CACHE_SIZE is 0."""
+    global _recipe_cache
+
+    if RECIPE_CACHE_SIZE <= 0:
+        return None
+    if _recipe_cache is None:
+        with _recipe_cache_lock:
+            if _recipe_cache is None:
+                disk_path = os.path.join(RECIPE_CACHE_DIR, "recipes.sqlite3") if RECIPE_CACHE_DIR else None
+                _recipe_cache = RecipeCache(RECIPE_CACHE_SIZE, disk_path, RECIPE_CACHE_TTL, RECIPE_CACHE_NEAR_MATCH)
+    return _recipe_cache
+
+
+def recipe_cache_stats() -> dict:
+    """Returns the hit, near-hit, miss and eviction counters of the recipe cache."""
+    cache = get_recipe_cache()
+    return cache.stats() if cache is not None else {}
+
+
+# Identical requests (same canonical key) made while one is in flight share its LLM call.
+_recipe_flights = SingleFlight()
+
+
+def recipe_flight_stats() -> dict:
+    """Returns how many LLM calls ran and how many identical requests were coalesced into them."""
+    return _recipe_flights.stats()
+
+
+def stream_two_recipes(meal_type: str, ingredients: list[str]):
+    """
+    Streams the two recipes as the LLM generates them.
+
+    Cached recipes are yielded in one piece each. Concurrent identical requests
+    share one streamed LLM call and each receive every piece from the start.
+    In fan-out mode a recipe whose stream broke off is started again: a piece with
+    text None means that recipe's text so far must be dropped.
+
+    Yields:
+        tuple[str, str | None]: ("healthy" or "tasty", the next piece of that recipe's
+        Markdown, or None when the recipe starts over).
+    """
+    cache = get_recipe_cache()
+    cached = cache.get(meal_type, ingredients) if cache is not None else None
+    if cached is not None:
+        yield "healthy", cached[0]
+        yield "tasty", cached[1]
+        return
+
+    if not OPENROUTER_API_KEY:
+        error_message = MISSING_KEY_MESSAGE
+        print(error_message)
+        yield "healthy", error_message
+        yield "tasty", error_message
+        return
+
+    key = ("stream", RECIPE_MODE, recipe_cache_key(meal_type, ingredients))
+    stream_fn = _stream_fanout if RECIPE_MODE == "fanout" else _stream_from_llm
+    yield from _recipe_flights.stream(key, stream_fn, meal_type, ingredients, cache)
+
+
+def _stream_from_llm(meal_type: str, ingredients: list[str], cache: RecipeCache | None):
+    parser = RecipeStreamParser()
+    recipes = {"healthy": "", "tasty": ""}
+    try:
+        print("Streaming two recipes with a single API call...")
+        with tracing.span("llm.stream", model=LLM_MODEL) as span:
+            start = time.perf_counter()
+            first_token_at = None
+            stream = get_llm_client().stream(
+                model=LLM_MODEL,
+                messages=_build_messages(meal_type, ingredients),
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    _record_usage(span, chunk.usage)
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    tracing.record("llm.ttft", first_token_at - start, model=LLM_MODEL)
+                    print(f"First recipe token after {first_token_at - start:.2f}s")
+                for section, text in parser.feed(content):
+                    recipes[section] += text
+                    yield section, text
+            separator_seen = parser.section == "tasty"
+            yield from parser.finish()
+        print(f"Recipe stream finished after {time.perf_counter() - start:.2f}s")
+
+        # Only complete answers are worth serving again.
+        if cache is not None and separator_seen:
+            cache.put(meal_type, ingredients, (recipes["healthy"].strip(), recipes["tasty"].strip()))
+
+    except Exception as e:
+        print(f"An error occurred while calling the LLM: {e}")
+        error_message = LLM_ERROR_MESSAGE
+        yield parser.section, "\n\n" + error_message
+        if parser.section == "healthy":
+            yield "tasty", error_message
+
+
+# --- Deadline Mode ---
+_source_counts = {"llm": 0, "fallback": 0, "late_fill": 0}
+_source_lock = threading.Lock()
+_TIMED_OUT = object()
+_FINISHED = object()
+
+
+def _count_source(source: str):
+    with _source_lock:
+        _source_counts[source] += 1
+    tracing.count("recipes.source", source=source)
+
+
+def recipe_source_stats() -> dict:
+    """Returns how often deadline-mode requests were answered by the LLM or the local fallback."""
+    with _source_lock:
+        counts = dict(_source_counts)
+    answered = counts["llm"] + counts["fallback"]
+    return {**counts,
+            "llm_rate": counts["llm"] / answered if answered else 0.0,
+            "fallback_rate": counts["fallback"] / answered if answered else 0.0,
+            "late_fill_rate": counts["late_fill"] / counts["fallback"] if counts["fallback"] else 0.0}
+
+
+def _is_error(text: str | None) -> bool:
+    return text is not None and (MISSING_KEY_MESSAGE in text or LLM_ERROR_MESSAGE in text)
+
+
+class DeadlineRecipeStream:
+    """
+    Streams the two recipes, but never leaves the user waiting longer than deadline_s.
+
+    The LLM stream is consumed on a background thread. If its first usable text arrives
+    within the deadline, iterating yields the LLM pieces as they come. If it fails or is
+    too slow, iterating yields the local template recipes at once, source becomes
+    "fallback", and late_recipes() can wait for the LLM to finish in the background.
+
+    Args:
+        meal_type (str): The meal type.
+        ingredients (list[str]): The ingredients.
+        deadline_s (float): Seconds until the first LLM text; 0 or less waits forever.
+        stream_fn: Produces the (section, text) pieces; stream_two_recipes by default.
+            Any generator works, so the whole path can run without network access.
+    """
+
+    def __init__(self, meal_type: str, ingredients: list[str], deadline_s: float = RECIPE_DEADLINE,
+                 stream_fn=None):
+        self.meal_type = meal_type
+        self.ingredients = ingredients
+        self.deadline_s = deadline_s
+        self.source = None
+        self._pieces = queue.Queue()
+        self._recipes = {"healthy": "", "tasty": ""}
+        self._failed = False
+        self._finished = threading.Event()
+        pieces = (stream_fn or stream_two_recipes)(meal_type, ingredients)
+        threading.Thread(target=self._consume, args=(pieces,), name="recipe-deadline", daemon=True).start()
+
+    def _consume(self, pieces):
+        try:
+            for section, text in pieces:
+                if _is_error(text):
+                    self._failed = True
+                if text is None:
+                    self._recipes[section] = ""
+                else:
+                    self._recipes[section] += text
+                self._pieces.put((section, text))
+        except Exception as e:
+            print(f"Recipe stream failed: {e}")
+            self._failed = True
+        finally:
+            self._finished.set()
+            self._pieces.put(None)
+
+    def __iter__(self):
+        deadline = time.monotonic() + self.deadline_s
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if self.source is None and self.deadline_s > 0 else None
+            try:
+                piece = self._pieces.get(timeout=timeout)
+            except queue.Empty:
+                piece = _TIMED_OUT
+
+            if self.source is None:
+                if piece is _TIMED_OUT or piece is None or _is_error(piece[1]):
+                    reason = "missed the deadline" if piece is _TIMED_OUT else "failed"
+                    print(f"LLM {reason}; answering with the local recipes.")
+                    self.source = "fallback"
+                    _count_source("fallback")
+                    healthy, tasty = local_recipes(self.meal_type, self.ingredients)
+                    yield "healthy", healthy
+                    yield "tasty", tasty
+                    return
+                self.source = "llm"
+                _count_source("llm")
+            if piece is None:
+                return
+            yield piece
+
+    @property
+    def finished(self) -> bool:
+        """Whether the LLM stream has ended, with or without usable recipes."""
+        return self._finished.is_set()
+
+    def late_recipes(self, timeout: float = RECIPE_LATE_WAIT) -> tuple[str, str] | None:
+        """
+        After a fallback, waits up to timeout seconds for the LLM to finish.
+
+        A timeout of 0 only checks, so a page can poll without blocking.
+
+        Returns:
+            tuple[str, str] | None: The LLM's healthy and tasty recipes, or None if they
+            did not arrive in time or were not usable, e.g. the second one is missing.
+        """
+        if self.source != "fallback" or not self._finished.wait(timeout) or self._failed:
+            return None
+        healthy, tasty = self._recipes["healthy"].strip(), self._recipes["tasty"].strip()
+        if not healthy or not tasty or tasty == MISSING_SECOND_RECIPE:
+            return None
+        _count_source("late_fill")
+        return healthy, tasty
+
+
+def stream_two_recipes_with_deadline(meal_type: str, ingredients: list[str], deadline_s: float = RECIPE_DEADLINE,
+                                     stream_fn=None):
+    """
+    Returns the recipe stream, or a DeadlineRecipeStream over it when deadline_s is above 0.
+
+    stream_fn replaces stream_two_recipes, e.g. with InferenceClient.stream_recipes, so
+    the deadline also holds when the LLM is called by the inference service.
+    """
+    stream_fn = stream_fn or stream_two_recipes
+    if deadline_s <= 0:
+        return stream_fn(meal_type, ingredients)
+    return DeadlineRecipeStream(meal_type, ingredients, deadline_s, stream_fn)
+
+
+def _stream_one_recipe(section: str, meal_type: str, ingredients: list[str], pieces: queue.Queue) -> bool:
+    """
+    Streams one recipe of a fan-out into the shared queue, retrying it on its own.
+
+    Failures before the first chunk are retried by the LLM client. A stream that
+    breaks off later is started again, up to RECIPE_FANOUT_RETRIES times, after a
+    (section, None) piece that tells consumers to drop the text they have of it.
+
+    Returns:
+        bool: Whether the recipe was completed.
+    """
+    for attempt in range(RECIPE_FANOUT_RETRIES + 1):
+        started = False
+        try:
+            with tracing.span("llm.stream", model=LLM_MODEL, recipe=section) as span:
+                start = time.perf_counter()
+                stream = get_llm_client().stream(
+                    model=LLM_MODEL,
+                    messages=_build_recipe_messages(meal_type, ingredients, section),
+                    stream_options={"include_usage": True},
+                )
+                for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        _record_usage(span, chunk.usage)
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if not started:
+                        # Leading whitespace of a recipe is dropped, as in single mode.
+                        content = content.lstrip()
+                        if not content:
+                            continue
+                        started = True
+                        tracing.record("llm.ttft", time.perf_counter() - start, model=LLM_MODEL, recipe=section)
+                        print(f"First {section} recipe token after {time.perf_counter() - start:.2f}s")
+                    pieces.put((section, content))
+            return True
+        except Exception as e:
+            print(f"An error occurred while streaming the {section} recipe: {e}")
+            if attempt == RECIPE_FANOUT_RETRIES:
+                pieces.put((section, ("\n\n" if started else "") + LLM_ERROR_MESSAGE))
+                return False
+            if started:
+                pieces.put((section, None))
+    return False
+
+
+def _stream_fanout(meal_type: str, ingredients: list[str], cache: RecipeCache | None):
+    """Streams both recipes from two concurrent requests, yielding pieces of either as they arrive."""
+    print("Streaming two recipes with two concurrent API calls...")
+    pieces = queue.Queue()
+    recipes = {"healthy": "", "tasty": ""}
+    completed = {}
+
+    def run(section: str):
+        try:
+            completed[section] = _stream_one_recipe(section, meal_type, ingredients, pieces)
+        finally:
+            pieces.put((section, _FINISHED))
+
+    start = time.perf_counter()
+    for section in RECIPE_STYLES:
+        threading.Thread(target=run, args=(section,), name=f"recipe-{section}", daemon=True).start()
+
+    running = len(RECIPE_STYLES)
+    while running:
+        section, text = pieces.get()
+        if text is _FINISHED:
+            running -= 1
+            print(f"The {section} recipe finished after {time.perf_counter() - start:.2f}s")
+            continue
+        # Only the attempt that completed a recipe is cached.
+        recipes[section] = "" if text is None else recipes[section] + text
+        yield section, text
+
+    if cache is not None and all(completed.get(section) for section in RECIPE_STYLES):
+        cache.put(meal_type, ingredients, (recipes["healthy"].strip(), recipes["tasty"].strip()))
+
+
+def _record_usage(span, usage):
+    """Attaches the prompt and completion token counts of an LLM call to its span and counters."""
+    span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    tracing.count("llm.tokens", usage.prompt_tokens, kind="prompt", model=LLM_MODEL)
+    tracing.count("llm.tokens", usage.completion_tokens, kind="completion", model=LLM_MODEL)
+
+
+def split_recipes(full_response: str) -> tuple[str, str]:
+    """Splits a complete response on SEPARATOR into the healthy and the tasty recipe."""
+    if SEPARATOR in full_response:
+        parts = full_response.split(SEPARATOR, 1)
+        return parts[0].strip(), parts[1].strip()
+    # Fallback in case the LLM doesn't follow instructions perfectly
+    return full_response, MISSING_SECOND_RECIPE
+
 
 def generate_two_recipes(meal_type: str, ingredients: list[str]) -> tuple[str, str]:
     """
     Connects to the Deepseek LLM via OpenRouter to generate two distinct recipes
     using a single, efficient API call.
+
+    Results are served from the recipe cache when the same meal type and
+    ingredient set were requested before, and concurrent identical requests
+    share one API call. With RECIPE_MODE=fanout, each recipe gets its own
+    concurrent call instead.
     """
+    cache = get_recipe_cache()
+    cached = cache.get(meal_type, ingredients) if cache is not None else None
+    if cached is not None:
+        return cached
+
     if not OPENROUTER_API_KEY:
-        error_message = "Error: LLM_API_KEY not found. Please check your .env file."
+        error_message = MISSING_KEY_MESSAGE
         print(error_message)
         return error_message, error_message
 
-    try:
-        # --- Initialize the API Client for OpenRouter ---
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=OPENROUTER_API_KEY,
-        )
+    key = ("blocking", RECIPE_MODE, recipe_cache_key(meal_type, ingredients))
+    generate_fn = _generate_fanout if RECIPE_MODE == "fanout" else _generate_from_llm
+    return _recipe_flights.do(key, generate_fn, meal_type, ingredients, cache)
 
-        ingredients_str = ", ".join(ingredients)
-        
-        # --- Construct a Single, Combined Prompt ---
+
+def _generate_from_llm(meal_type: str, ingredients: list[str], cache: RecipeCache | None) -> tuple[str, str]:
+    try:
         print("Generating two recipes with a single API call...")
-        response = client.chat.completions.create(
-            model="deepseek/deepseek-r1:free", 
-            messages=[
-                {"role": "system", "content": "You are a creative and helpful chef. You will generate two distinct recipes based on the user's request and separate them with a specific marker."},
-                {"role": "user", "content": f"""
-                    Generate TWO distinct recipes for **{meal_type}** using the available ingredients: **{ingredients_str}**.
-                    You can assume common pantry staples are also available.
-
-                    **Recipe 1: Healthy and Diet-Conscious**
-                    Focus on fresh ingredients, low-fat cooking methods, and high nutritional value.
-
-                    **Recipe 2: Tasty and Flavorful**
-                    Prioritize taste and satisfaction. Feel free to use butter, cheese, or other rich ingredients.
-                    
-                    Please format both outputs in Markdown with a title, ingredients, and instructions.
-                    
-                    **IMPORTANT:** After the first recipe, place the exact separator `---SEPARATOR---` before starting the second recipe.
-                """}
-            ]
-        )
+        with tracing.span("llm.chat", model=LLM_MODEL) as span:
+            response = get_llm_client().chat(
+                model=LLM_MODEL, 
+                messages=_build_messages(meal_type, ingredients)
+            )
+            if response.usage:
+                _record_usage(span, response.usage)
         
         full_response = response.choices[0].message.content
 
         # --- Split the Response into Two Recipes ---
-        separator = "---SEPARATOR---"
-        if separator in full_response:
-            parts = full_response.split(separator, 1)
-            healthy_recipe = parts[0].strip()
-            tasty_recipe = parts[1].strip()
-        else:
-            # Fallback in case the LLM doesn't follow instructions perfectly
-            healthy_recipe = full_response
-            tasty_recipe = "Sorry, I had trouble generating the second recipe. Please try again."
-
+        healthy_recipe, tasty_recipe = split_recipes(full_response)
+        if cache is not None and SEPARATOR in full_response:
+            cache.put(meal_type, ingredients, (healthy_recipe, tasty_recipe))
         return healthy_recipe, tasty_recipe
 
     except Exception as e:
         print(f"An error occurred while calling the LLM: {e}")
-        error_message = f"Sorry, I couldn't generate recipes at the moment. The API returned an error. Please check the console for details."
+        error_message = LLM_ERROR_MESSAGE
         return error_message, error_message
 
 
+def _generate_one_recipe(section: str, meal_type: str, ingredients: list[str]) -> tuple[str, bool]:
+    """Generates one recipe of a fan-out. Returns the recipe (or an error message) and whether it succeeded."""
+    for attempt in range(RECIPE_FANOUT_RETRIES + 1):
+        try:
+            with tracing.span("llm.chat", model=LLM_MODEL, recipe=section) as span:
+                response = get_llm_client().chat(
+                    model=LLM_MODEL,
+                    messages=_build_recipe_messages(meal_type, ingredients, section)
+                )
+                if response.usage:
+                    _record_usage(span, response.usage)
+            return response.choices[0].message.content.strip(), True
+        except Exception as e:
+            print(f"An error occurred while generating the {section} recipe: {e}")
+    return LLM_ERROR_MESSAGE, False
+
+
+def _generate_fanout(meal_type: str, ingredients: list[str], cache: RecipeCache | None) -> tuple[str, str]:
+    print("Generating two recipes with two concurrent API calls...")
+    with ThreadPoolExecutor(max_workers=len(RECIPE_STYLES), thread_name_prefix="recipe") as pool:
+        futures = [pool.submit(_generate_one_recipe, section, meal_type, ingredients) for section in RECIPE_STYLES]
+        (healthy_recipe, healthy_ok), (tasty_recipe, tasty_ok) = (future.result() for future in futures)
+
+    if cache is not None and healthy_ok and tasty_ok:
+        cache.put(meal_type, ingredients, (healthy_recipe, tasty_recipe))
+    return healthy_recipe, tasty_recipe
+
+
 # --- This block allows you to test the file directly ---
 if __name__ == '__main__':
     print("--- Testing recipe_generator.py ---")
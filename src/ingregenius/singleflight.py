@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator
+
+
+class _Broadcast:
+    """Replays the items of one iterable to any number of readers, including late joiners."""
+
+    def __init__(self):
+        self._items = []
+        self._done = False
+        self._error: BaseException | None = None
+        self._condition = threading.Condition()
+
+    def run(self, iterable: Iterable):
+        try:
+            for item in iterable:
+                with self._condition:
+                    self._items.append(item)
+                    self._condition.notify_all()
+        except BaseException as e:
+            self._error = e
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def __iter__(self) -> Iterator:
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._items) and not self._done:
+                    self._condition.wait()
+                if index < len(self._items):
+                    item = self._items[index]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            index += 1
+            yield item
+
+
+def _start(target: Callable, *args):
+    threading.Thread(target=target, args=args, name="singleflight", daemon=True).start()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one underlying call.
+
+    The first caller for a key starts the work on a background thread; everyone who
+    asks for the same key while it is running waits for that result, or gets its
+    exception. Because the work does not run on a waiter's thread, a waiter that gives
+    up (a Streamlit rerun, a timeout, a cancelled task) does not cancel it for the
+    others. Once the call finishes the key is forgotten, so later calls run again.
+
+    Every flight gets a thread of its own rather than one from a fixed pool, so this
+    adds no concurrency limit of its own: the work is only limited where it is done,
+    e.g. by LLM_MAX_CONCURRENCY for recipe streams.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: dict = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key, create: Callable):
+        """Returns (shared handle, True if this caller created it and must start the work)."""
+        with self._lock:
+            handle = self._in_flight.get(key)
+            if handle is not None:
+                self.coalesced += 1
+                return handle, False
+            handle = self._in_flight[key] = create()
+            self.calls += 1
+            return handle, True
+
+    def _forget(self, key, handle):
+        with self._lock:
+            if self._in_flight.get(key) is handle:
+                del self._in_flight[key]
+
+    def _run(self, key, future: Future, fn: Callable, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._forget(key, future)
+            future.set_exception(e)
+        else:
+            self._forget(key, future)
+            future.set_result(result)
+
+    def _run_stream(self, key, broadcast: _Broadcast, fn: Callable, args, kwargs):
+        try:
+            broadcast.run(fn(*args, **kwargs))
+        finally:
+            self._forget(key, broadcast)
+
+    def do(self, key, fn: Callable, *args, timeout: float | None = None, **kwargs):
+        """Runs fn(*args, **kwargs) once per key among concurrent callers and returns its result."""
+        future, leader = self._join(key, Future)
+        if leader:
+            _start(self._run, key, future, fn, args, kwargs)
+        return future.result(timeout)
+
+    def stream(self, key, fn: Callable[..., Iterable], *args, **kwargs) -> Iterator:
+        """
+        Like do(), for a function returning an iterable: the items produced by the one
+        underlying call are replayed to every caller in order, from the first item on.
+        """
+        broadcast, leader = self._join(key, _Broadcast)
+        if leader:
+            _start(self._run_stream, key, broadcast, fn, args, kwargs)
+        return iter(broadcast)
+
+    async def do_async(self, key, coroutine_fn: Callable, *args, **kwargs):
+        """
+        The asyncio form of do(). The shared task is shielded, so cancelling one waiter
+        leaves it running for the rest. Keys used here should not also be used with do().
+        """
+        task, leader = self._join(key, lambda: asyncio.ensure_future(coroutine_fn(*args, **kwargs)))
+        if leader:
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """Returns how many underlying calls ran and how many callers were coalesced into them."""
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
@@ -0,0 +1,211 @@
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Streamlit should draw the welcome page before anything heavy is imported. The detector
+# (ultralytics and torch) and the recipe generator (openai) are imported, and the model
+# loaded, on a background thread that the first pages start, so they are usually ready
+# by the time the user uploads a photo:
+#
+#   startup.start_preload()                        # on the welcome page, returns at once
+#   startup.get_food_detector().detect_image(...)  # later; waits only if still importing
+#
+# `python -m src.ingregenius.startup` reports the import time of every module on the
+# way to the first page, and fails --compare when startup got slower.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# What app.py imports before it draws the first page.
+STARTUP_MODULES = ("streamlit", "src.ingregenius.tracing", "src.ingregenius.ingredients",
+                   "src.ingregenius.inference_client", "src.ingregenius.startup")
+# What the background preload imports; the two modules only import their heavy
+# dependencies when a model or client is created, so those are listed too.
+PRELOAD_MODULES = ("src.ingregenius.food_detector", "src.ingregenius.recipe_generator", "ultralytics", "openai")
+# Packages that must not be imported on the way to the first page.
+HEAVY_PACKAGES = ("torch", "ultralytics", "openai", "cv2")
+# Phases this much slower than the baseline are always within noise.
+MIN_REGRESSION_MS = 50
+
+_preload_thread: threading.Thread | None = None
+_preload_lock = threading.Lock()
+
+
+def get_food_detector():
+    """Returns the food_detector module, importing it (or waiting for the preload to) on first use."""
+    return importlib.import_module(".food_detector", __package__)
+
+
+def get_recipe_generator():
+    """Returns the recipe_generator module, importing it (or waiting for the preload to) on first use."""
+    return importlib.import_module(".recipe_generator", __package__)
+
+
+def _preload(load_model: bool):
+    start = time.perf_counter()
+    try:
+        for module in PRELOAD_MODULES:
+            importlib.import_module(module)
+        food_detector = get_food_detector()
+        if load_model:
+            if food_detector.DETECTOR_POOL_WORKERS > 0:
+                food_detector.get_detector_pool().warmup()
+            else:
+                food_detector.get_model()
+    except Exception as e:
+        # The page that needs the module raises the same error again, where the user sees it.
+        print(f"Background preload failed: {e}")
+        return
+    print(f"Background preload finished in {time.perf_counter() - start:.1f}s.")
+
+
+def start_preload(load_model: bool = True) -> threading.Thread:
+    """
+    Starts importing the detector and the recipe generator on a background thread, once per process.
+
+    Python's import lock makes a page that needs a module before the preload is done
+    wait for that import instead of starting a second one.
+
+    Args:
+        load_model (bool): Also load and warm up the detector model (or the detector pool).
+
+    Returns:
+        threading.Thread: The preload thread.
+    """
+    global _preload_thread
+
+    with _preload_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(target=_preload, args=(load_model,), name="preload", daemon=True)
+            _preload_thread.start()
+    return _preload_thread
+
+
+# --- Startup profile ---
+# Runs in a fresh interpreter with -X importtime; the marker line splits the two phases.
+_PROFILE_SCRIPT = """
+import json, sys, time
+phases, missing, heavy = {}, [], []
+for phase, modules in json.loads(sys.argv[1]).items():
+    print(f"# phase {phase}", file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    for module in modules:
+        try:
+            __import__(module)  # importlib.import_module() would hide the module itself from -X importtime
+        except ModuleNotFoundError as e:
+            missing.append(f"{module} ({e.name})")
+    phases[phase] = 1000 * (time.perf_counter() - start)
+    if phase == "startup":
+        heavy = sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules)
+if sys.argv[3] == "1":
+    start = time.perf_counter()
+    sys.modules["src.ingregenius.food_detector"].get_model()
+    phases["model_load"] = 1000 * (time.perf_counter() - start)
+print(json.dumps({"phases_ms": phases, "missing": missing, "heavy_at_startup": heavy}))
+"""
+
+
+def _parse_importtime(lines: list[str]) -> dict:
+    """Turns `-X importtime` lines into per-phase lists of (module, depth, self ms, cumulative ms)."""
+    phases, current = {}, None
+    for line in lines:
+        if line.startswith("# phase "):
+            current = phases.setdefault(line[len("# phase "):].strip(), [])
+        elif line.startswith("import time:") and current is not None:
+            fields = line[len("import time:"):].split("|")
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue  # the header line
+            self_us, cumulative_us, name = fields
+            # Nested imports are indented by two more spaces per level.
+            current.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2,
+                            int(self_us) / 1000, int(cumulative_us) / 1000))
+    return phases
+
+
+def profile_startup(load_model: bool = False) -> dict:
+    """
+    Imports the startup modules, then the preloaded ones, in a fresh interpreter.
+
+    Returns:
+        dict: Wall time per phase, the cumulative import time of every module imported
+        directly by each phase, the slowest modules by their own time, modules that
+        are not installed, and heavy packages that were imported at startup.
+    """
+    phases = {"startup": list(STARTUP_MODULES), "preload": list(PRELOAD_MODULES)}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROFILE_SCRIPT, json.dumps(phases),
+         json.dumps(HEAVY_PACKAGES), "1" if load_model else "0"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith(("import time:", "# phase"))]
+        raise RuntimeError("Startup profile failed:\n" + "\n".join(errors[-20:]))
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    for phase, rows in _parse_importtime(completed.stderr.splitlines()).items():
+        report[phase] = {
+            "modules_ms": {name: cumulative for name, depth, _, cumulative in rows if depth == 0},
+            "slowest_ms": dict(sorted(((name, own) for name, _, own, _ in rows), key=lambda row: -row[1])[:15]),
+        }
+    return report
+
+
+def print_profile(report: dict, top: int):
+    for phase in ("startup", "preload"):
+        print(f"{phase}: {report['phases_ms'].get(phase, 0):.0f} ms")
+        modules = sorted(report.get(phase, {}).get("modules_ms", {}).items(), key=lambda row: -row[1])
+        for name, ms in modules[:top]:
+            print(f"  {ms:8.1f} ms  {name}")
+    if "model_load" in report["phases_ms"]:
+        print(f"model load: {report['phases_ms']['model_load']:.0f} ms")
+    print("Slowest modules at startup (own time):")
+    for name, ms in list(report.get("startup", {}).get("slowest_ms", {}).items())[:top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    if report["missing"]:
+        print(f"Not installed: {', '.join(report['missing'])}")
+    if report["heavy_at_startup"]:
+        print(f"Warning: imported before the first page: {', '.join(report['heavy_at_startup'])}")
+
+
+def compare_profiles(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Lists the phases that got slower than the baseline by more than threshold, and new heavy imports."""
+    problems = []
+    for phase, old in baseline["phases_ms"].items():
+        new = current["phases_ms"].get(phase)
+        if new is not None and old > 0 and new - old > max(threshold * old, MIN_REGRESSION_MS):
+            problems.append(f"{phase}: {old:.0f} ms -> {new:.0f} ms ({(new - old) / old:+.0%})")
+    for name in sorted(set(current["heavy_at_startup"]) - set(baseline["heavy_at_startup"])):
+        problems.append(f"{name} is now imported before the first page")
+    return problems
+
+
+# --- Command line interface ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report the import time of every module on the way to the first page.")
+    parser.add_argument("--top", type=int, default=10, help="Modules listed per section.")
+    parser.add_argument("--model", action="store_true", help="Also time loading the detector model.")
+    parser.add_argument("--output", type=Path, help="Write the profile to this JSON file.")
+    parser.add_argument("--compare", type=Path, help="A previous JSON profile to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed relative slowdown for --compare.")
+    args = parser.parse_args()
+
+    report = profile_startup(args.model)
+    print_profile(report, args.top)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Profile written to {args.output}")
+
+    if args.compare:
+        problems = compare_profiles(json.loads(args.compare.read_text()), report, args.threshold)
+        if problems:
+            print(f"\nStartup regressed compared to {args.compare}:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\nNo startup regressions beyond {args.threshold:.0%} compared to {args.compare}.")
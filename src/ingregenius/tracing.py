@@ -0,0 +1,230 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from dotenv import load_dotenv
+
+# Per-stage latency tracing. Code wraps its stages in spans:
+#
+#   with tracing.span("llm.stream", model=LLM_MODEL) as s:
+#       ...
+#       s.set(prompt_tokens=..., completion_tokens=...)
+#
+# Span durations are aggregated into Prometheus histograms served on
+# http://127.0.0.1:TRACING_METRICS_PORT/metrics, and every finished span can also be
+# appended to a JSONL file. With TRACING unset, span() returns a shared no-op object.
+
+# --- Configuration ---
+load_dotenv()
+
+TRACING_ENABLED = os.getenv("TRACING", "0").lower() in ("1", "true", "yes")
+# Port of the local /metrics endpoint; 0 disables it.
+TRACING_METRICS_PORT = int(os.getenv("TRACING_METRICS_PORT", "9464"))
+# Append every finished span to this file as one JSON object per line.
+TRACING_JSONL = os.getenv("TRACING_JSONL") or None
+
+# Histogram upper bounds in seconds, from sub-millisecond decoding to long LLM generations.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRIC_PREFIX = "ingregenius"
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Span duration histograms and counters, keyed by name and labels."""
+
+    def __init__(self):
+        self.histograms: dict[tuple, _Histogram] = {}
+        self.counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, labels: dict):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def add(self, name: str, value: float, labels: dict):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        def format_labels(pairs) -> str:
+            return ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        metric = f"{METRIC_PREFIX}_span_duration_seconds"
+        lines += [f"# HELP {metric} Duration of traced stages.", f"# TYPE {metric} histogram"]
+        for (name, labels), histogram in histograms:
+            base = format_labels((("span", name),) + labels)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{base}}} {histogram.sum}")
+            lines.append(f"{metric}_count{{{base}}} {histogram.count}")
+
+        for name in sorted({name for (name, _), _ in counters}):
+            metric = f"{METRIC_PREFIX}_{name.replace('.', '_')}_total"
+            lines += [f"# TYPE {metric} counter"]
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f"{metric}{{{format_labels(labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_jsonl_lock = threading.Lock()
+
+
+class Span:
+    """One timed stage. Labels become histogram labels; attributes only go to the JSONL trace."""
+
+    __slots__ = ("name", "labels", "attributes", "trace_id", "span_id", "parent_id", "start", "_token")
+
+    def __init__(self, name: str, labels: dict):
+        parent = _current_span.get()
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+
+    def set(self, **attributes):
+        """Attaches attributes such as token counts to the span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited in another context, e.g. a generator resumed on a different thread.
+            pass
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        registry.observe(self.name, duration, self.labels)
+        _write_jsonl({"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                      "name": self.name, "start": time.time() - duration, "duration_ms": 1000 * duration,
+                      "labels": self.labels, "attributes": self.attributes})
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _write_jsonl(record: dict):
+    if TRACING_JSONL:
+        line = json.dumps(record, default=str) + "\n"
+        with _jsonl_lock, open(TRACING_JSONL, "a") as f:
+            f.write(line)
+
+
+def span(name: str, **labels):
+    """Returns a context manager timing one stage; a shared no-op when tracing is off."""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, labels)
+
+
+def record(name: str, seconds: float, **labels):
+    """Records a duration measured elsewhere (e.g. ultralytics' own timings) as a child of the current span."""
+    if not TRACING_ENABLED:
+        return
+    registry.observe(name, seconds, labels)
+    if TRACING_JSONL:
+        parent = _current_span.get()
+        _write_jsonl({"trace_id": parent.trace_id if parent else None, "parent_id": parent.span_id if parent else None,
+                      "name": name, "start": time.time() - seconds, "duration_ms": 1000 * seconds, "labels": labels})
+
+
+def count(name: str, value: float = 1, **labels):
+    """Adds to a counter, e.g. count("llm.tokens", 120, kind="completion")."""
+    if TRACING_ENABLED:
+        registry.add(name, value, labels)
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = TRACING_METRICS_PORT, host: str = "127.0.0.1"):
+    """Serves /metrics on a background thread, once per process. Returns the server, or None if the port is taken."""
+    global _metrics_server
+
+    # Imported here: http.server is only needed with tracing on, and the app imports this module at startup.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            body = render_metrics().encode() if self.path.rstrip("/") == "/metrics" else b"not found\n"
+            self.send_response(200 if self.path.rstrip("/") == "/metrics" else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                print(f"Tracing: could not serve metrics on {host}:{port} ({e}).")
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            print(f"Tracing: metrics at http://{host}:{_metrics_server.server_address[1]}/metrics")
+    return _metrics_server
+
+
+if TRACING_ENABLED and TRACING_METRICS_PORT:
+    start_metrics_server()
@@ -1,7 +1,15 @@
+import argparse
+import hashlib
+import json
 import os
-import roboflow
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+
+import numpy as np
+from PIL import Image
 from dotenv import load_dotenv
 
 # --- Configuration ---
@@ -12,65 +20,246 @@ ROBOFLOW_WORKSPACE_ID = os.getenv("WORKSPACE_ID")
 ROBOFLOW_PROJECT_ID = os.getenv("PROJECT_ID")
 
 DATASET_PATH = Path("/home/atirmalle/Schreibtisch/Computer_Vision/Data/Dataset(to_be_labelled)/")
+# One JSON line per uploaded image, so a rerun skips everything that already made it.
+MANIFEST_NAME = ".roboflow_upload_manifest.jsonl"
+SPLIT_WEIGHTS = (("train", 0.7), ("valid", 0.2), ("test", 0.1))
+# Images whose perceptual hashes differ in at most this many of 64 bits count as the same photo.
+NEAR_DUPLICATE_BITS = 4
 # --- End of Configuration ---
 
-def upload_images_to_roboflow(api_key: str, workspace_id: str, project_id: str, dataset_dir: Path):
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dhash(path: Path) -> int:
+    """64-bit difference hash: survives resizing and re-encoding, unlike a content hash."""
+    with Image.open(path) as image:
+        image.draft("L", (64, 64))
+        pixels = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def split_for(sha256: str) -> str:
+    """Assigns train/valid/test from the file hash, so an image always lands in the same split."""
+    position = int(sha256[:8], 16) / 0x100000000
+    for split, weight in SPLIT_WEIGHTS:
+        if position < weight:
+            return split
+        position -= weight
+    return SPLIT_WEIGHTS[-1][0]
+
+
+def load_manifest(manifest_path: Path) -> list[dict]:
+    if not manifest_path.exists():
+        return []
+    with open(manifest_path, 'r') as f:
+        # A crash can leave a half-written last line; everything before it is still valid.
+        entries = []
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+        return entries
+
+
+def _hash_image(image_path: Path) -> tuple:
+    """Returns (sha256, dhash), or (None, error) for a file that cannot be read or decoded."""
+    try:
+        return file_sha256(image_path), dhash(image_path)
+    except Exception as e:
+        return None, e
+
+
+def _hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    diff = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class FakeProject:
+    """
+    Stands in for a roboflow Project: records uploads instead of sending them.
+
+    Used by --dry-run, and lets the uploader run without network access. failure_rate
+    makes that fraction of calls raise, to exercise the retries.
+    """
+
+    def __init__(self, name: str = "dry-run", failure_rate: float = 0.0, latency_s: float = 0.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.latency_s = latency_s
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def upload(self, image_path: str, split: str, tag_names: list[str], **kwargs):
+        time.sleep(self.latency_s)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("fake upload failure")
+        with self._lock:
+            self.uploads.append({"image_path": image_path, "split": split, "tag_names": tag_names})
+
+
+def connect_project(api_key: str, workspace_id: str, project_id: str):
+    import roboflow
+
+    rf = roboflow.Roboflow(api_key=api_key)
+    return rf.workspace(workspace_id).project(project_id)
+
+
+def _upload_with_retries(project, image_path: Path, split: str, label: str, max_retries: int,
+                         backoff_base: float = 1.0, backoff_max: float = 30.0):
+    for attempt in range(max_retries + 1):
+        try:
+            project.upload(image_path=str(image_path), split=split, tag_names=[label])
+            return
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt))
+            print(f"    - Upload of {image_path.name} failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def upload_images_to_roboflow(api_key: str, workspace_id: str, project_id: str, dataset_dir: Path,
+                              project=None, workers: int = 8, max_retries: int = 4,
+                              near_duplicate_bits: int = NEAR_DUPLICATE_BITS,
+                              manifest_path: Path | None = None) -> dict:
     """
     Uploads images from a directory structure to a Roboflow project.
     Each sub-directory in dataset_dir is treated as a class label.
+
+    Uploads run on a pool of `workers` threads and failed uploads are retried with
+    backoff. Every finished upload is appended to a manifest in dataset_dir, so a rerun
+    resumes where the last one stopped. Images that cannot be read or uploaded are
+    recorded there as failed and tried again on the next run. Exact duplicates (same
+    SHA-256) and near-duplicates (perceptual hashes within near_duplicate_bits) are skipped.
+
+    Args:
+        project: An object with the roboflow Project upload() method. Defaults to the
+            real project; pass a FakeProject to try the upload without sending anything.
+        manifest_path (Path): Where finished uploads are recorded. Defaults to a file in dataset_dir.
+
+    Returns:
+        dict: Counts of uploaded, already uploaded, duplicate, near-duplicate and failed images.
     """
-    rf = roboflow.Roboflow(api_key=api_key)
-    project = rf.workspace(workspace_id).project(project_id)
+    if project is None:
+        project = connect_project(api_key, workspace_id, project_id)
 
     print(f"Connected to project: {project.name}")
     print("-" * 30)
 
-    class_dirs = [d for d in dataset_dir.iterdir() if d.is_dir()]
+    class_dirs = sorted(d for d in dataset_dir.iterdir() if d.is_dir())
     if not class_dirs:
         print(f"Error: No subdirectories found in {dataset_dir}. Please structure your data correctly.")
-        return
+        return {}
 
     print(f"Found {len(class_dirs)} classes to upload.")
 
+    candidates = []
     for class_dir in class_dirs:
         label = class_dir.name.replace("\\", "-").replace(" ", "-").strip()
-        print(f"\nProcessing Folder: '{class_dir.name}' -> Using Label: '{label}'")
+        image_paths = sorted(list(class_dir.glob("*.jpg")) + list(class_dir.glob("*.png")))
+        print(f"  - Folder '{class_dir.name}' -> Label '{label}': {len(image_paths)} images")
+        candidates.extend((image_path, label) for image_path in image_paths)
+
+    # Hashing decodes every image, so it runs on the pool as well.
+    print(f"\nHashing {len(candidates)} images...")
+    with ThreadPoolExecutor(workers) as executor:
+        hashes = list(executor.map(lambda c: _hash_image(c[0]), candidates))
 
-        image_paths = list(class_dir.glob("*.jpg")) + list(class_dir.glob("*.png"))
-        
-        if not image_paths:
-            print(f"  - No images found. Skipping.")
+    manifest_path = manifest_path or dataset_dir / MANIFEST_NAME
+    manifest_lock = threading.Lock()
+
+    def record(entry: dict):
+        with manifest_lock, open(manifest_path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    # Failed entries only document what went wrong; those images are tried again.
+    manifest = [entry for entry in load_manifest(manifest_path) if "failed" not in entry]
+    uploaded_sha = {entry["sha256"] for entry in manifest}
+    seen_sha = set(uploaded_sha)
+    known_dhash = np.zeros(len(manifest) + len(candidates), dtype=np.uint64)
+    known_dhash[:len(manifest)] = [entry["dhash"] for entry in manifest]
+    known = len(manifest)
+    summary = {"uploaded": 0, "already_uploaded": 0, "duplicates": 0, "near_duplicates": 0, "failed": 0}
+
+    pending = []
+    for (image_path, label), (sha256, perceptual) in zip(candidates, hashes):
+        if sha256 is None:
+            print(f"    - FAILED to read {image_path.name}. Error: {perceptual}")
+            summary["failed"] += 1
+            record({"path": str(image_path.relative_to(dataset_dir)), "label": label, "failed": str(perceptual)})
+            continue
+        if sha256 in seen_sha:
+            summary["already_uploaded" if sha256 in uploaded_sha else "duplicates"] += 1
+            continue
+        if known and _hamming_distances(known_dhash[:known], perceptual).min() <= near_duplicate_bits:
+            print(f"    - Skipping near-duplicate: {image_path.name}")
+            summary["near_duplicates"] += 1
             continue
-            
-        print(f"  - Found {len(image_paths)} images. Starting upload...")
-
-        batch_size = 100 
-        for i in range(0, len(image_paths), batch_size):
-            batch = image_paths[i:i + batch_size]
-            
-            for image_path in batch:
-                try:
-                    project.upload(
-                        image_path=str(image_path),
-                        split=random.choices(["train", "valid", "test"], [0.7, 0.2, 0.1], k=1)[0],
-                        tag_names=[label]
-                    )
-                    print(f"    -> Uploaded: {image_path.name}")
-                except Exception as e:
-                    print(f"    - FAILED to upload {image_path.name}. Error: {e}")
+        seen_sha.add(sha256)
+        known_dhash[known] = perceptual
+        known += 1
+        pending.append((image_path, label, sha256, perceptual))
+
+    print(f"Uploading {len(pending)} new images with {workers} threads "
+          f"({summary['already_uploaded']} already uploaded, "
+          f"{summary['duplicates'] + summary['near_duplicates']} duplicates skipped)...")
+
+    def upload(image_path: Path, label: str, sha256: str, perceptual: int):
+        split = split_for(sha256)
+        entry = {"sha256": sha256, "dhash": perceptual, "path": str(image_path.relative_to(dataset_dir)),
+                 "label": label, "split": split}
+        try:
+            _upload_with_retries(project, image_path, split, label, max_retries)
+        except Exception as e:
+            record({**entry, "failed": str(e)})
+            raise
+        record(entry)
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {executor.submit(upload, *item): item[0] for item in pending}
+        for future in as_completed(futures):
+            image_path = futures[future]
+            try:
+                future.result()
+                summary["uploaded"] += 1
+                print(f"    -> Uploaded: {image_path.name}")
+            except Exception as e:
+                summary["failed"] += 1
+                print(f"    - FAILED to upload {image_path.name}. Error: {e}")
 
     print("\n" + "-" * 30)
+    print(f"Uploaded {summary['uploaded']}, failed {summary['failed']} (rerun to retry them).")
     print("? Upload process complete. Your next step is to annotate the images in the Roboflow UI.")
+    return summary
+
 
 if __name__ == "__main__":
-    if not all([ROBOFLOW_API_KEY, ROBOFLOW_WORKSPACE_ID, ROBOFLOW_PROJECT_ID]):
+    parser = argparse.ArgumentParser(description="Upload class-sorted images to Roboflow.")
+    parser.add_argument("--dataset", type=Path, default=DATASET_PATH)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="Use a fake project instead of uploading.")
+    args = parser.parse_args()
+
+    if not args.dry_run and not all([ROBOFLOW_API_KEY, ROBOFLOW_WORKSPACE_ID, ROBOFLOW_PROJECT_ID]):
         print("Error: Missing environment variables. Check your .env file.")
-    elif not DATASET_PATH.exists() or not DATASET_PATH.is_dir():
-        print(f"Error: The dataset path '{DATASET_PATH}' does not exist.")
+    elif not args.dataset.exists() or not args.dataset.is_dir():
+        print(f"Error: The dataset path '{args.dataset}' does not exist.")
     else:
         upload_images_to_roboflow(
             api_key=ROBOFLOW_API_KEY,
             workspace_id=ROBOFLOW_WORKSPACE_ID,
             project_id=ROBOFLOW_PROJECT_ID,
-            dataset_dir=DATASET_PATH
-        )
\ No newline at end of file
+            dataset_dir=args.dataset,
+            project=FakeProject() if args.dry_run else None,
+            workers=args.workers,
+            # A dry run must not mark images as uploaded for the real run.
+            manifest_path=args.dataset / f"{MANIFEST_NAME}.dry-run" if args.dry_run else None,
+        )
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from src.ingregenius.batching import MicroBatcher
+
+
+class RecordingBatch:
+    """A batch function that doubles its items and records the size of every batch."""
+
+    def __init__(self):
+        self.sizes = []
+
+    def __call__(self, items):
+        self.sizes.append(len(items))
+        return [item * 2 for item in items]
+
+
+def test_flushes_when_the_batch_is_full():
+    batch_fn = RecordingBatch()
+    # The wait is far longer than the test, so only the size can end the batch.
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=10_000)
+
+    start = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(4)]
+    results = [future.result(timeout=2) for future in futures]
+
+    assert time.perf_counter() - start < 2
+    assert results == [0, 2, 4, 6]
+    assert batch_fn.sizes == [4]
+    batcher.close()
+
+
+def test_flushes_when_the_wait_runs_out():
+    batch_fn = RecordingBatch()
+    batcher = MicroBatcher(batch_fn, max_batch_size=100, max_wait_ms=50)
+
+    start = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(3)]
+    results = [future.result(timeout=2) for future in futures]
+
+    assert time.perf_counter() - start >= 0.04
+    assert results == [0, 2, 4]
+    assert batch_fn.sizes == [3]
+    batcher.close()
+
+
+def test_batch_error_reaches_every_caller():
+    def failing(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(failing, max_batch_size=3, max_wait_ms=10_000)
+    futures = [batcher.submit(i) for i in range(3)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=2)
+    batcher.close()
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+from src.ingregenius import cache
+from src.ingregenius.cache import MISSING, LRUCache, TieredCache
+
+
+class Clock:
+    """Stands in for the time module so entries can be aged without sleeping."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def _disk_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    lru = LRUCache(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+
+    assert lru.get("b") is MISSING
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats.evictions == 1
+
+
+def test_expired_entry_is_evicted_from_both_tiers(clock, tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    tiered = TieredCache(8, path, ttl_seconds=60)
+    tiered.put("key", {"value": 1})
+    clock.now += 30
+    assert tiered.get("key") == {"value": 1}
+
+    clock.now += 31
+
+    assert tiered.get("key") is MISSING
+    assert len(tiered.memory) == 0
+    assert _disk_rows(path) == 0
+    assert tiered.stats.expirations == 1
+
+
+def test_disk_hit_keeps_its_creation_time(clock, tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    TieredCache(8, path, ttl_seconds=60).put("key", [1, 2])
+    clock.now += 50
+
+    # A new process: the entry is promoted from disk without extending its lifetime.
+    restarted = TieredCache(8, path, ttl_seconds=60)
+    assert restarted.get("key") == [1, 2]
+    assert restarted.stats.disk_hits == 1
+    clock.now += 11
+
+    assert restarted.get("key") is MISSING
+    assert _disk_rows(path) == 0
+
+
+def test_expired_disk_entries_are_deleted_on_startup(clock, tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    TieredCache(8, path, ttl_seconds=60).put("old", 1)
+    clock.now += 61
+    TieredCache(8, path, ttl_seconds=60).put("new", 2)
+
+    assert _disk_rows(path) == 1
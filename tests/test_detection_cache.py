@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from src.ingregenius import food_detector
+from src.ingregenius.cache import TieredCache
+from src.ingregenius.detections import Detections
+from src.ingregenius.food_detector import detect_image
+
+NAMES = {0: "egg", 1: "garlic"}
+PHOTO = b"encoded photo"
+
+
+class FakeModel:
+    """Stands in for _predict, counting the images it is asked to analyze."""
+
+    def __init__(self):
+        self.images = 0
+        self.weights_hash = "weights-1"
+
+    def predict(self, images, loaded=None, **kwargs):
+        self.images += len(images)
+        return images
+
+    def detections(self, result):
+        return Detections.from_arrays(np.array([[0, 0, 10, 10]]), np.array([0.9]), np.array([0]), NAMES)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(food_detector, "_predict", fake.predict)
+    monkeypatch.setattr(food_detector, "_detections_from_result", fake.detections)
+    monkeypatch.setattr(food_detector, "active_weights_hash", lambda: fake.weights_hash)
+    monkeypatch.setattr(food_detector, "_detection_cache", TieredCache(16))
+    monkeypatch.setattr(food_detector, "DETECTOR_POOL_WORKERS", 0)
+    monkeypatch.setattr(food_detector, "DETECTOR_MAX_BATCH_SIZE", 1)
+    return fake
+
+
+def test_same_bytes_and_settings_are_served_from_the_cache(model):
+    first = detect_image(PHOTO)
+    second = detect_image(bytes(PHOTO))
+
+    assert model.images == 1
+    assert second.counts == first.counts == {"egg": 1}
+    assert food_detector.detection_cache_stats()["hits"] == 1
+
+
+def test_different_bytes_are_run_again(model):
+    detect_image(PHOTO)
+    detect_image(PHOTO + b"!")
+
+    assert model.images == 2
+
+
+def test_use_cache_false_always_runs(model):
+    detect_image(PHOTO)
+    detect_image(PHOTO, use_cache=False)
+
+    assert model.images == 2
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("DETECTOR_ENGINE", "onnx"),
+    ("DETECTOR_INT8", True),
+    ("DETECTOR_CONF", 0.5),
+    ("DETECTOR_CLASS_CONF", {"egg": 0.6}),
+    ("DETECTOR_TOP_K", 5),
+    ("_PREDICT_KWARGS", {"imgsz": 480, "conf": food_detector.DETECTOR_MIN_CONF}),
+])
+def test_changed_settings_invalidate_the_cache(model, monkeypatch, setting, value):
+    detect_image(PHOTO)
+    monkeypatch.setattr(food_detector, setting, value)
+    detect_image(PHOTO)
+
+    assert model.images == 2
+
+
+def test_new_weights_invalidate_the_cache(model):
+    detect_image(PHOTO)
+    model.weights_hash = "weights-2"
+    detect_image(PHOTO)
+    model.weights_hash = "weights-1"
+    detect_image(PHOTO)
+
+    # Switching back finds the first weights' entry again.
+    assert model.images == 2
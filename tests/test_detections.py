@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from src.ingregenius import food_detector
+from src.ingregenius.detections import Detections
+
+NAMES = {0: "egg", 1: "garlic", 2: "tomato"}
+# Five boxes: two eggs, a faint garlic, a tomato and a box below every floor.
+BOXES = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50], [60, 60, 70, 70], [80, 80, 90, 90]])
+CONFIDENCES = np.array([0.6, 0.9, 0.3, 0.45, 0.05])
+CLASS_IDS = np.array([0, 0, 1, 2, 2])
+
+
+def test_boxes_are_sorted_and_the_floor_is_applied():
+    detections = Detections.from_arrays(BOXES, CONFIDENCES, CLASS_IDS, NAMES, min_conf=0.1)
+
+    assert len(detections) == 4
+    assert detections.confidences.tolist() == pytest.approx([0.9, 0.6, 0.45, 0.3])
+    assert detections.boxes[0].tolist() == [20, 20, 30, 30]
+    assert detections.class_ids.dtype == np.int16
+
+
+def test_per_class_thresholds_split_confirmed_and_low_confidence():
+    thresholds = np.array([0.5, 0.35, 0.4], dtype=np.float32)
+    detections = Detections.from_arrays(BOXES, CONFIDENCES, CLASS_IDS, NAMES, thresholds, min_conf=0.1)
+
+    assert detections.confirmed.tolist() == [True, True, True, False]
+    assert detections.counts == {"egg": 2, "tomato": 1}
+    assert detections.ingredients == ["egg", "tomato"]
+    assert detections.low_confidence == ["garlic"]
+    assert detections.max_conf == pytest.approx({"egg": 0.9, "tomato": 0.45, "garlic": 0.3})
+
+
+def test_top_k_keeps_the_most_confident_boxes():
+    detections = Detections.from_arrays(BOXES, CONFIDENCES, CLASS_IDS, NAMES, top_k=2)
+
+    assert detections.counts == {"egg": 2}
+    assert detections.names == {0: "egg"}
+
+
+def test_empty_output():
+    detections = Detections.from_arrays(np.empty((0, 4)), np.empty(0), np.empty(0), NAMES, min_conf=0.1)
+
+    assert len(detections) == 0
+    assert detections.counts == {}
+    assert detections.low_confidence == []
+
+
+def test_dict_round_trip():
+    thresholds = np.array([0.5, 0.35, 0.4], dtype=np.float32)
+    detections = Detections.from_arrays(BOXES, CONFIDENCES, CLASS_IDS, NAMES, thresholds, min_conf=0.1)
+
+    restored = Detections.from_dict(detections.as_dict())
+
+    assert restored.class_ids.tolist() == detections.class_ids.tolist()
+    assert restored.confidences.tolist() == detections.confidences.tolist()
+    assert restored.boxes.tolist() == detections.boxes.tolist()
+    assert restored.confirmed.tolist() == detections.confirmed.tolist()
+    assert (restored.counts, restored.low_confidence, restored.names) == (
+        detections.counts, detections.low_confidence, detections.names)
+
+
+@pytest.fixture
+def class_conf(monkeypatch):
+    """Sets DETECTOR_CLASS_CONF for one test, without leaking cached thresholds into others."""
+    def set_class_conf(value: dict):
+        monkeypatch.setattr(food_detector, "DETECTOR_CLASS_CONF", value)
+        food_detector._class_thresholds.cache_clear()
+
+    yield set_class_conf
+    food_detector._class_thresholds.cache_clear()
+
+
+def test_class_thresholds_match_names_in_any_case(class_conf):
+    class_conf({"Garlic": 0.4, "EGG": 0.5})
+
+    thresholds = food_detector._class_thresholds(("egg", "garlic", "tomato"))
+
+    assert thresholds.tolist() == pytest.approx([0.5, 0.4, food_detector.DETECTOR_CONF])
+
+
+def test_unknown_class_threshold_raises(class_conf):
+    class_conf({"truffle": 0.4})
+
+    with pytest.raises(ValueError, match="truffle"):
+        food_detector._class_thresholds(("egg", "garlic", "tomato"))
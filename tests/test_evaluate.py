@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.ingregenius import evaluate, food_detector
+from src.ingregenius.detections import Detections
+from src.ingregenius.evaluate import average_precision, collect_matches, match_predictions, score
+
+NAMES = {0: "apple", 1: "bacon", 2: "cheese"}
+
+
+def test_each_label_matches_its_best_prediction_once():
+    # Two predictions of class 0 on one label: only the one with the higher IoU counts.
+    iou = np.array([[0.9, 0.6, 0.8]])
+    correct = match_predictions(np.array([0, 0, 1]), np.array([0]), iou)
+
+    assert correct[:, 0].tolist() == [True, False, False]
+    # IoU 0.9 still counts at the 0.90 threshold, but not at 0.95.
+    assert correct[0].tolist() == [True] * 9 + [False]
+
+
+def test_two_labels_are_matched_to_two_predictions():
+    iou = np.array([[0.8, 0.7], [0.75, 0.0]])
+    correct = match_predictions(np.array([0, 0]), np.array([0, 0]), iou)
+
+    # Greedy by IoU: label 0 takes prediction 0, label 1 is left with none at 0.5.
+    assert correct[:, 0].tolist() == [True, False]
+
+
+def test_average_precision_of_known_curves():
+    assert average_precision(np.array([0.5, 1.0]), np.array([1.0, 1.0])) == pytest.approx(1.0)
+    # Recall never passes 0.5: the upper 50 of 101 recall points have no precision.
+    assert average_precision(np.array([0.25, 0.5]), np.array([1.0, 1.0])) == pytest.approx(51 / 101)
+    # A false positive first: precision 1/2 up to full recall.
+    assert average_precision(np.array([0.0, 1.0]), np.array([0.0, 0.5])) == pytest.approx(0.5)
+    assert average_precision(np.array([]), np.array([])) == 0.0
+
+
+def test_score_of_a_synthetic_split():
+    # Image 0: two apples and a bacon; image 1: one cheese. Boxes are normalized xyxy.
+    truths = [(np.array([0, 0, 1]), np.array([[0, 0, .5, .5], [.5, .5, 1, 1], [0, .5, .5, 1]], np.float32)),
+              (np.array([2]), np.array([[.1, .1, .4, .4]], np.float32))]
+    # Predictions in pixels of 100x100 images: apple hit, apple miss, apple hit, bacon in the wrong place.
+    detections = [
+        Detections.from_arrays(np.array([[0, 0, 50, 50], [60, 0, 90, 30], [50, 50, 100, 100], [60, 0, 90, 30]]),
+                               np.array([0.9, 0.8, 0.6, 0.3]), np.array([0, 0, 0, 1]), NAMES),
+        Detections.from_arrays(np.array([[10, 10, 40, 40]]), np.array([0.7]), np.array([2]), NAMES),
+    ]
+
+    matches = collect_matches(detections, [(100, 100), (100, 100)], truths)
+    result = score(matches, list(NAMES.values()), conf=0.5)
+
+    # Apple: hit, miss, hit -> recall 1/2, 1/2, 1 at precision 1, 1/2, 2/3.
+    apple_ap = (51 * 1.0 + 50 * 2 / 3) / 101
+    assert result["classes"]["apple"]["ap50"] == pytest.approx(apple_ap)
+    assert result["classes"]["bacon"]["ap50"] == 0.0
+    assert result["classes"]["cheese"]["ap50"] == pytest.approx(1.0)
+    assert result["map50"] == pytest.approx((apple_ap + 0 + 1) / 3)
+    # The bacon box is below conf 0.5, so it is not counted as a false positive.
+    assert result["classes"]["apple"]["precision"] == pytest.approx(2 / 3)
+    assert result["classes"]["bacon"]["recall"] == 0.0
+    # Listed ingredients: apple and cheese, both right; bacon is missing.
+    assert result["ingredient_precision"] == 1.0
+    assert result["ingredient_recall"] == pytest.approx(2 / 3)
+
+
+def test_default_weights_follow_the_app(monkeypatch):
+    custom = Path("/models/custom.pt")
+    monkeypatch.setattr(food_detector, "_active_weights_path", custom)
+
+    assert evaluate.weights_for(food_detector.DETECTOR_ENGINE, food_detector.DETECTOR_INT8) == custom
+    assert evaluate.weights_for("onnx", True) == Path("/models/custom_int8.onnx")
+    assert evaluate.weights_for("onnx", False, Path("/other/best.pt")) == Path("/other/best.onnx")
+
+
+def test_default_weights_follow_a_reload(monkeypatch):
+    monkeypatch.setattr(food_detector, "_active_weights_path", Path("/models/first.pt"))
+    assert evaluate.weights_for("onnx", False) == Path("/models/first.onnx")
+
+    monkeypatch.setattr(food_detector, "_active_weights_path", Path("/models/second.pt"))
+    assert evaluate.weights_for("onnx", False) == Path("/models/second.onnx")
+
+
+def test_labels_of_classes_the_model_does_not_have_are_left_out():
+    # Class 5 is in the labels but not in the model's three classes.
+    truths = [(np.array([0, 5]), np.array([[0, 0, .5, .5], [.5, .5, 1, 1]], np.float32))]
+    detections = [Detections.from_arrays(np.array([[0, 0, 50, 50]]), np.array([0.9]), np.array([0]), NAMES)]
+
+    result = score(collect_matches(detections, [(100, 100)], truths), list(NAMES.values()), conf=0.5)
+
+    assert result["unknown_labels"] == 1
+    assert result["ingredient_recall"] == 1.0
+    assert result["classes"]["apple"]["ap50"] == pytest.approx(1.0)
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import openai
+import pytest
+
+from src.ingregenius import llm_client
+from src.ingregenius.llm_client import AsyncLLMClient, LLMClient, backoff_delay
+from src.ingregenius.llm_stub_server import StubSettings, start_stub_server
+
+REQUEST = {"model": "stub", "messages": [{"role": "user", "content": "Two recipes, ---SEPARATOR--- between."}]}
+
+
+@pytest.fixture
+def stub():
+    settings = StubSettings(latency_ms=0, jitter_ms=0, tokens_per_second=100_000)
+    server, base_url = start_stub_server(settings=settings)
+    server.base_url = base_url
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Records every backoff delay, shortened so the retries do not slow the tests down."""
+    recorded = []
+
+    def short_backoff(attempt, error=None):
+        delay = backoff_delay(attempt, error, base=0.01)
+        recorded.append(delay)
+        return delay
+
+    monkeypatch.setattr(llm_client, "backoff_delay", short_backoff)
+    return recorded
+
+
+def _client(stub, cls=LLMClient, **kwargs):
+    return cls(base_url=stub.base_url, api_key="stub", timeout=10, **kwargs)
+
+
+def _answer_number(completion) -> int:
+    """The stub puts the number of the request that answered into the completion id."""
+    return int(completion.id.split("-")[1])
+
+
+def test_throttling_and_server_errors_are_retried(stub, delays):
+    stub.settings.planned_statuses.extend([429, 500])
+    client = _client(stub, max_retries=3)
+
+    completion = client.chat(**REQUEST)
+
+    assert "---SEPARATOR---" in completion.choices[0].message.content
+    assert _answer_number(completion) == 3
+    assert client.retries == 2
+    assert len(delays) == 2
+
+
+def test_gives_up_after_max_retries(stub, delays):
+    stub.settings.planned_statuses.extend([500] * 3)
+    client = _client(stub, max_retries=2)
+
+    with pytest.raises(openai.InternalServerError):
+        client.chat(**REQUEST)
+    assert stub.settings.requests == 3
+
+
+def test_client_errors_are_not_retried(stub, delays):
+    stub.settings.planned_statuses.append(400)
+    client = _client(stub, max_retries=3)
+
+    with pytest.raises(openai.BadRequestError):
+        client.chat(**REQUEST)
+    assert stub.settings.requests == 1
+    assert delays == []
+
+
+def test_retry_after_header_sets_the_delay(stub, delays):
+    # The stub sends Retry-After: 0.1 with every 429.
+    stub.settings.planned_statuses.append(429)
+    client = _client(stub, max_retries=1)
+
+    client.chat(**REQUEST)
+
+    assert delays == [0.1]
+    first, second = stub.settings.arrivals
+    assert second - first >= 0.1
+
+
+def test_backoff_grows_exponentially_with_full_jitter():
+    for attempt in range(5):
+        delays = [backoff_delay(attempt, base=0.5, maximum=4) for _ in range(200)]
+        assert 0 <= min(delays) and max(delays) <= min(4, 0.5 * 2 ** attempt)
+    assert max(backoff_delay(10, base=0.5, maximum=4) for _ in range(200)) > 2
+
+
+def test_concurrency_is_capped(stub):
+    stub.settings.latency_ms = 100
+    client = _client(stub, max_concurrency=2)
+
+    threads = [threading.Thread(target=client.chat, kwargs=REQUEST) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stub.settings.requests == 6
+    assert stub.settings.max_in_flight == 2
+
+
+def test_slow_request_is_hedged_and_the_faster_answer_wins(stub):
+    stub.settings.planned_latency_ms.extend([2000, 0])
+    client = _client(stub, hedge_delay=0.1)
+
+    start = time.perf_counter()
+    completion = client.chat(**REQUEST)
+
+    assert time.perf_counter() - start < 1.5
+    assert _answer_number(completion) == 2
+    assert client.hedges == 1
+
+
+def test_fast_request_is_not_hedged(stub):
+    client = _client(stub, hedge_delay=1.0)
+
+    completion = client.chat(**REQUEST)
+
+    assert _answer_number(completion) == 1
+    assert client.hedges == 0
+    assert stub.settings.requests == 1
+
+
+def test_stream_is_retried_before_the_first_chunk(stub, delays):
+    stub.settings.planned_statuses.append(503)
+    client = _client(stub, max_retries=2)
+
+    text = "".join(chunk.choices[0].delta.content or "" for chunk in client.stream(**REQUEST) if chunk.choices)
+
+    assert "---SEPARATOR---" in text
+    assert client.retries == 1
+
+
+def test_stream_is_not_retried_after_the_first_chunk(stub, delays, monkeypatch):
+    client = _client(stub, max_retries=3)
+    calls = []
+
+    def broken_stream(**kwargs):
+        calls.append(kwargs)
+        yield "first chunk"
+        raise openai.APIConnectionError(request=None)
+
+    monkeypatch.setattr(client._client.chat.completions, "create", broken_stream)
+    stream = client.stream(**REQUEST)
+
+    assert next(stream) == "first chunk"
+    with pytest.raises(openai.APIConnectionError):
+        next(stream)
+    assert len(calls) == 1
+    assert client.retries == 0
+
+
+def test_async_client_retries_and_caps_concurrency(stub, delays):
+    stub.settings.latency_ms = 50
+    stub.settings.planned_statuses.extend([429, 500])
+
+    async def run():
+        client = _client(stub, AsyncLLMClient, max_retries=3, max_concurrency=2)
+        completions = await asyncio.gather(*(client.chat(**REQUEST) for _ in range(4)))
+        return client, completions
+
+    client, completions = asyncio.run(run())
+
+    assert len(completions) == 4
+    assert client.retries == 2
+    assert stub.settings.requests == 6
+    assert stub.settings.max_in_flight == 2
+
+
+def test_async_hedge_wins_and_the_loser_is_cancelled(stub):
+    stub.settings.planned_latency_ms.extend([2000, 0])
+
+    async def run():
+        client = _client(stub, AsyncLLMClient, hedge_delay=0.1)
+        return client, await client.chat(**REQUEST)
+
+    start = time.perf_counter()
+    client, completion = asyncio.run(run())
+
+    assert time.perf_counter() - start < 1.5
+    assert _answer_number(completion) == 2
+    assert client.hedges == 1
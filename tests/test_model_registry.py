@@ -0,0 +1,42 @@
+import pytest
+
+from src.ingregenius import food_detector
+from src.ingregenius.food_detector import LoadedModel, get_model, reload_model
+
+
+@pytest.fixture
+def weights(tmp_path, monkeypatch):
+    """Two weights files and a registry that loads them without ultralytics."""
+    def fake_load(path, device):
+        return LoadedModel(object(), path, device, path.stat().st_mtime_ns, path.name)
+
+    paths = []
+    for name in ("first.pt", "second.pt"):
+        (tmp_path / name).write_bytes(name.encode())
+        paths.append(tmp_path / name)
+    monkeypatch.setattr(food_detector, "_load_model", fake_load)
+    monkeypatch.setattr(food_detector, "_registry", {})
+    monkeypatch.setattr(food_detector, "_active_weights_path", paths[0])
+    monkeypatch.setattr(food_detector, "DETECTOR_POOL_WORKERS", 0)
+    monkeypatch.setattr(food_detector, "DETECTION_CACHE_SIZE", 0)
+    monkeypatch.setattr(food_detector, "DETECTOR_DEVICE", None)
+    return paths
+
+
+def test_reload_frees_the_replaced_weights(weights):
+    _, second = weights
+    get_model()
+
+    loaded = reload_model(second)
+
+    assert list(food_detector._registry) == [(str(second.resolve()), None)]
+    assert get_model() is loaded
+
+
+def test_reload_on_another_device_frees_the_replaced_weights(weights):
+    _, second = weights
+    get_model()
+
+    reload_model(second, device="cpu")
+
+    assert list(food_detector._registry) == [(str(second.resolve()), "cpu")]
@@ -0,0 +1,46 @@
+from src.ingregenius.recipe_generator import RecipeCache
+
+RECIPES = ("healthy recipe", "tasty recipe")
+
+
+def test_cache_key_ignores_case_order_and_duplicates():
+    cache = RecipeCache(16, None, 3600)
+    cache.put("Dinner", ["Tomato", "Onion"], RECIPES)
+
+    assert cache.get("dinner", ["onion ", "TOMATO", "Onion"]) == RECIPES
+    assert cache.get("Lunch", ["Tomato", "Onion"]) is None
+
+
+def test_near_match_hit_above_the_threshold():
+    cache = RecipeCache(16, None, 3600, near_match=0.7)
+    cache.put("Dinner", ["Tomato", "Onion", "Rice", "Egg"], RECIPES)
+
+    # 3 shared of 4 ingredients: Jaccard 0.75.
+    assert cache.get("Dinner", ["Tomato", "Onion", "Rice"]) == RECIPES
+    assert cache.near_hits == 1
+
+
+def test_near_match_miss_below_the_threshold():
+    cache = RecipeCache(16, None, 3600, near_match=0.7)
+    cache.put("Dinner", ["Tomato", "Onion", "Rice", "Egg"], RECIPES)
+
+    # 2 shared of 5 ingredients: Jaccard 0.4.
+    assert cache.get("Dinner", ["Tomato", "Onion", "Milk"]) is None
+    # Near matches never cross meal types.
+    assert cache.get("Lunch", ["Tomato", "Onion", "Rice"]) is None
+    assert cache.near_hits == 0
+
+
+def test_near_match_prefers_the_most_similar_entry():
+    cache = RecipeCache(16, None, 3600, near_match=0.5)
+    cache.put("Dinner", ["Tomato", "Onion"], ("a", "a"))
+    cache.put("Dinner", ["Tomato", "Onion", "Rice", "Egg"], ("b", "b"))
+
+    assert cache.get("Dinner", ["Tomato", "Onion", "Rice"]) == ("b", "b")
+
+
+def test_near_match_disabled_only_hits_exact_sets():
+    cache = RecipeCache(16, None, 3600)
+    cache.put("Dinner", ["Tomato", "Onion", "Rice", "Egg"], RECIPES)
+
+    assert cache.get("Dinner", ["Tomato", "Onion", "Rice"]) is None
@@ -0,0 +1,107 @@
+import threading
+
+from src.ingregenius.local_recipes import NOTE, local_recipes
+from src.ingregenius.recipe_generator import (LLM_ERROR_MESSAGE, MISSING_SECOND_RECIPE, DeadlineRecipeStream,
+                                              stream_two_recipes_with_deadline)
+
+MEAL = "Dinner"
+INGREDIENTS = ["Chicken Breast", "Tomato", "Rice"]
+
+
+def held_stream(release: threading.Event):
+    """A stand-in for stream_two_recipes whose LLM writes nothing until release is set."""
+    def stream_fn(meal_type, ingredients):
+        release.wait(5)
+        yield "healthy", "LLM healthy"
+        yield "tasty", "LLM tasty"
+    return stream_fn
+
+
+def test_deadline_answers_with_template_recipes():
+    release = threading.Event()
+    stream = DeadlineRecipeStream(MEAL, INGREDIENTS, deadline_s=0.05, stream_fn=held_stream(release))
+
+    pieces = dict(stream)
+    release.set()
+
+    assert stream.source == "fallback"
+    assert (pieces["healthy"], pieces["tasty"]) == local_recipes(MEAL, INGREDIENTS)
+    assert NOTE in pieces["healthy"]
+
+
+def test_late_recipes_replace_the_templates():
+    release = threading.Event()
+    stream = DeadlineRecipeStream(MEAL, INGREDIENTS, deadline_s=0.05, stream_fn=held_stream(release))
+    list(stream)
+
+    release.set()
+
+    assert stream.late_recipes(timeout=5) == ("LLM healthy", "LLM tasty")
+    assert stream.finished
+
+
+def test_late_recipes_time_out():
+    release = threading.Event()
+    stream = DeadlineRecipeStream(MEAL, INGREDIENTS, deadline_s=0.05, stream_fn=held_stream(release))
+    list(stream)
+
+    assert stream.late_recipes(timeout=0.05) is None
+    assert stream.late_recipes(timeout=0) is None
+    release.set()
+
+
+def test_llm_within_the_deadline_is_passed_through():
+    release = threading.Event()
+    release.set()
+    stream = DeadlineRecipeStream(MEAL, INGREDIENTS, deadline_s=5, stream_fn=held_stream(release))
+
+    assert list(stream) == [("healthy", "LLM healthy"), ("tasty", "LLM tasty")]
+    assert stream.source == "llm"
+    assert stream.late_recipes(timeout=0) is None
+
+
+def test_llm_error_falls_back_at_once():
+    def failing(meal_type, ingredients):
+        yield "healthy", LLM_ERROR_MESSAGE
+        yield "tasty", LLM_ERROR_MESSAGE
+
+    stream = DeadlineRecipeStream(MEAL, INGREDIENTS, deadline_s=5, stream_fn=failing)
+
+    assert dict(stream)["tasty"] == local_recipes(MEAL, INGREDIENTS)[1]
+    assert stream.source == "fallback"
+    assert stream.late_recipes(timeout=1) is None
+
+
+def test_late_answer_without_a_second_recipe_is_not_used():
+    release = threading.Event()
+
+    def one_recipe(meal_type, ingredients):
+        release.wait(5)
+        yield "healthy", "LLM healthy"
+        yield "tasty", MISSING_SECOND_RECIPE
+
+    stream = DeadlineRecipeStream(MEAL, INGREDIENTS, deadline_s=0.05, stream_fn=one_recipe)
+    list(stream)
+    release.set()
+
+    assert stream.late_recipes(timeout=5) is None
+    assert stream.finished
+
+
+def test_deadline_wraps_any_recipe_stream():
+    # The app passes InferenceClient.stream_recipes here in client mode.
+    release = threading.Event()
+    stream = stream_two_recipes_with_deadline(MEAL, INGREDIENTS, deadline_s=0.05, stream_fn=held_stream(release))
+
+    assert dict(stream)["healthy"] == local_recipes(MEAL, INGREDIENTS)[0]
+    assert stream.source == "fallback"
+    release.set()
+    assert stream.late_recipes(timeout=5) == ("LLM healthy", "LLM tasty")
+
+
+def test_no_deadline_returns_the_stream_itself():
+    release = threading.Event()
+    release.set()
+
+    assert list(stream_two_recipes_with_deadline(MEAL, INGREDIENTS, deadline_s=0, stream_fn=held_stream(release))) == [
+        ("healthy", "LLM healthy"), ("tasty", "LLM tasty")]
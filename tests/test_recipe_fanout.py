@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from src.ingregenius import recipe_generator
+from src.ingregenius.recipe_generator import DeadlineRecipeStream, RecipeCache
+
+
+def _chunk(text):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class DroppingClient:
+    """Streams each fan-out recipe in two chunks; the healthy stream breaks off on its first attempt."""
+
+    def __init__(self):
+        self.healthy_attempts = 0
+
+    def stream(self, model, messages, **kwargs):
+        section = "tasty" if "Tasty and Flavorful" in messages[-1]["content"] else "healthy"
+
+        def chunks():
+            yield _chunk(f"{section} recipe ")
+            if section == "healthy":
+                self.healthy_attempts += 1
+                if self.healthy_attempts == 1:
+                    raise ConnectionError("connection reset")
+            yield _chunk("text")
+        return chunks()
+
+
+def test_fanout_restart_drops_the_partial_recipe(monkeypatch):
+    client = DroppingClient()
+    monkeypatch.setattr(recipe_generator, "get_llm_client", lambda: client)
+    cache = RecipeCache(16, None, 3600)
+
+    pieces = list(recipe_generator._stream_fanout("Dinner", ["Egg"], cache))
+
+    healthy = [text for section, text in pieces if section == "healthy"]
+    assert healthy == ["healthy recipe ", None, "healthy recipe ", "text"]
+    assert cache.get("Dinner", ["Egg"]) == ("healthy recipe text", "tasty recipe text")
+
+
+def test_late_recipes_keep_only_the_completed_attempt(monkeypatch):
+    client = DroppingClient()
+    monkeypatch.setattr(recipe_generator, "get_llm_client", lambda: client)
+    started = recipe_generator.threading.Event()
+
+    def delayed(meal_type, ingredients):
+        started.wait(5)
+        yield from recipe_generator._stream_fanout(meal_type, ingredients, None)
+
+    stream = DeadlineRecipeStream("Dinner", ["Egg"], deadline_s=0.01, stream_fn=delayed)
+    list(stream)
+    started.set()
+
+    assert stream.source == "fallback"
+    assert stream.late_recipes(timeout=5) == ("healthy recipe text", "tasty recipe text")
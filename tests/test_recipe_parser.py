@@ -0,0 +1,64 @@
+import pytest
+
+from src.ingregenius.recipe_generator import MISSING_SECOND_RECIPE, SEPARATOR, RecipeStreamParser, split_recipes
+
+
+def parse(chunks):
+    """Feeds the chunks to a parser and joins the pieces of each recipe."""
+    parser = RecipeStreamParser()
+    recipes = {"healthy": "", "tasty": ""}
+    for chunk in chunks:
+        for section, text in parser.feed(chunk):
+            recipes[section] += text
+    for section, text in parser.finish():
+        recipes[section] += text
+    return recipes["healthy"], recipes["tasty"]
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+RESPONSE = f"# Green Bowl\nSteam it.\n{SEPARATOR}\n# Cheesy Bake\nMelt it."
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, len(SEPARATOR) - 1, len(SEPARATOR), 64])
+def test_separator_split_across_chunks(size):
+    # Trailing whitespace is stripped by the caller before a recipe is stored.
+    healthy, tasty = parse(chunked(RESPONSE, size))
+    assert (healthy.strip(), tasty.strip()) == split_recipes(RESPONSE)
+
+
+def test_healthy_text_is_not_held_back_longer_than_needed():
+    parser = RecipeStreamParser()
+    # "---" could start the separator, so it waits for the next chunk.
+    assert parser.feed("Steam it.---") == [("healthy", "Steam it.")]
+    assert parser.feed(" done") == [("healthy", "--- done")]
+
+
+def test_missing_separator_keeps_everything_in_the_first_recipe():
+    healthy, tasty = parse(chunked("# Only One\nCook it.", 4))
+
+    assert healthy == "# Only One\nCook it."
+    assert tasty == MISSING_SECOND_RECIPE
+
+
+def test_separator_first_leaves_the_first_recipe_empty():
+    healthy, tasty = parse([SEPARATOR, "\n# Cheesy Bake"])
+
+    assert healthy == ""
+    assert tasty == "# Cheesy Bake"
+
+
+def test_second_separator_stays_in_the_second_recipe():
+    healthy, tasty = parse([f"A{SEPARATOR}B", f"{SEPARATOR}C"])
+
+    assert healthy == "A"
+    assert tasty == f"B{SEPARATOR}C"
+
+
+def test_cut_off_separator_prefix_is_flushed_at_the_end():
+    healthy, tasty = parse(["Cook it.", SEPARATOR[:6]])
+
+    assert healthy == "Cook it." + SEPARATOR[:6]
+    assert tasty == MISSING_SECOND_RECIPE
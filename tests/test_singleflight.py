@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.ingregenius.singleflight import SingleFlight
+
+CALLERS = 8
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _call_concurrently(target):
+    """Runs target on CALLERS threads and returns what each one returned or raised."""
+    outcomes = [None] * CALLERS
+
+    def run(i):
+        try:
+            outcomes[i] = target()
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_callers_share_one_call():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    threads, outcomes = _call_concurrently(lambda: flight.do("key", work))
+    _wait_for(lambda: flight.coalesced == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes == ["result"] * CALLERS
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": CALLERS - 1, "in_flight": 0}
+
+
+def test_exception_reaches_every_waiter():
+    flight, release = SingleFlight(), threading.Event()
+
+    def work():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, outcomes = _call_concurrently(lambda: flight.do("key", work))
+    _wait_for(lambda: flight.coalesced == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    # The failed call is forgotten, so the next caller runs it again.
+    with pytest.raises(ValueError):
+        flight.do("key", work)
+    assert flight.calls == 2
+
+
+def test_stream_replays_every_item_to_late_joiners():
+    flight, release = SingleFlight(), threading.Event()
+
+    def items():
+        yield 1
+        release.wait(5)
+        yield 2
+
+    first = flight.stream("key", items)
+    assert next(first) == 1
+    joined = flight.stream("key", items)
+    release.set()
+
+    assert list(first) == [2]
+    assert list(joined) == [1, 2]
+    assert flight.calls == 1
+
+
+def test_distinct_keys_all_run_at_once():
+    flight, started, release = SingleFlight(), [], threading.Event()
+    keys = 40
+
+    def work(i):
+        started.append(i)
+        release.wait(5)
+        yield i
+
+    streams = [flight.stream(i, work, i) for i in range(keys)]
+    _wait_for(lambda: len(started) == keys)
+    release.set()
+
+    assert [list(stream) for stream in streams] == [[i] for i in range(keys)]
+
+
+def test_async_callers_share_one_call():
+    flight, calls = SingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(CALLERS)))
+
+    assert asyncio.run(run()) == ["result"] * CALLERS
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": CALLERS - 1, "in_flight": 0}
+
+
+def test_cancelled_async_caller_leaves_the_call_running_for_the_others():
+    flight = SingleFlight()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "result"
+
+        leader = asyncio.create_task(flight.do_async("key", work))
+        others = [asyncio.create_task(flight.do_async("key", work)) for _ in range(CALLERS - 1)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(run()) == ["result"] * (CALLERS - 1)
+    assert flight.calls == 1
+    assert flight.stats()["in_flight"] == 0
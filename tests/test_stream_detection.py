@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from src.ingregenius import food_detector
+from src.ingregenius.detections import Detections
+from src.ingregenius.food_detector import StreamDetection, detect_stream
+
+NAMES = {0: "egg", 1: "garlic", 2: "tomato"}
+THRESHOLDS = np.full(len(NAMES), 0.25, dtype=np.float32)
+
+
+def keyframe(**confidences):
+    """Detections of one keyframe with one box per class, e.g. keyframe(egg=0.9, garlic=0.1)."""
+    ids = {name: i for i, name in NAMES.items()}
+    class_ids = np.array([ids[name] for name in confidences])
+    boxes = np.tile(np.array([0, 0, 10, 10], dtype=np.float32), (len(confidences), 1))
+    return Detections.from_arrays(boxes, np.array(list(confidences.values())), class_ids, NAMES, THRESHOLDS)
+
+
+def test_an_item_confirmed_once_is_reported_like_in_a_photo():
+    detection = StreamDetection(min_score=0.8)
+    detection.add(keyframe(egg=0.4))
+
+    assert detection.ingredients == ["egg"]
+
+
+def test_faint_sightings_add_up_over_keyframes():
+    detection = StreamDetection(min_score=0.8)
+    for _ in range(5):
+        detection.add(keyframe(garlic=0.2, tomato=0.9))
+
+    assert detection.ingredients == ["tomato", "garlic"]
+    assert detection.scores["garlic"] == pytest.approx(1.0)
+
+
+def test_a_single_faint_false_positive_is_dropped():
+    detection = StreamDetection(min_score=0.8)
+    detection.add(keyframe(egg=0.9, garlic=0.2))
+    detection.add(keyframe(egg=0.8))
+
+    assert detection.ingredients == ["egg"]
+    assert detection.sightings == {"egg": 2, "garlic": 1}
+    assert detection.keyframes == 2
+
+
+def test_static_clip_keeps_items_confirmed_in_its_only_keyframe(monkeypatch):
+    monkeypatch.setattr(food_detector, "DETECTOR_POOL_WORKERS", 0)
+    monkeypatch.setattr(food_detector, "get_model", lambda: None)
+    monkeypatch.setattr(food_detector, "_predict", lambda images, loaded: list(images))
+    monkeypatch.setattr(food_detector, "_detections_from_result", lambda result: keyframe(egg=0.5, garlic=0.15))
+
+    frames = [np.full((48, 64, 3), 120, dtype=np.uint8)] * 30
+    detection = detect_stream(frames, fps=30, target_fps=2, min_score=0.8)
+
+    assert detection.keyframes == 1
+    assert detection.skipped_similar + detection.skipped_budget == 29
+    assert detection.ingredients == ["egg"]
+
+
+def test_pool_mode_does_not_load_a_model_in_the_parent(monkeypatch):
+    class FakePool:
+        def detect_all(self, images):
+            return [keyframe(tomato=0.7) for _ in images]
+
+    def no_model():
+        raise AssertionError("the parent process must not load a model")
+
+    monkeypatch.setattr(food_detector, "DETECTOR_POOL_WORKERS", 2)
+    monkeypatch.setattr(food_detector, "get_model", no_model)
+    monkeypatch.setattr(food_detector, "get_detector_pool", FakePool)
+
+    frames = [np.full((48, 64, 3), value, dtype=np.uint8) for value in (0, 120, 240)]
+    detection = detect_stream(frames, fps=1, target_fps=1)
+
+    assert detection.keyframes == 3
+    assert detection.ingredients == ["tomato"]
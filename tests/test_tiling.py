@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from src.ingregenius import food_detector
+from src.ingregenius.food_detector import class_aware_nms, detect_tiled, select_tiles, tile_grid
+
+NAMES = {0: "egg", 1: "garlic"}
+
+
+def test_overlapping_boxes_of_one_class_are_merged():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    keep = class_aware_nms(boxes, np.array([0.6, 0.9, 0.5]), np.array([0, 0, 0]), iou_threshold=0.5)
+
+    assert keep.tolist() == [1, 2]
+
+
+def test_the_same_box_with_different_classes_is_kept():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10]], dtype=np.float32)
+    keep = class_aware_nms(boxes, np.array([0.6, 0.9]), np.array([0, 1]), iou_threshold=0.5)
+
+    assert keep.tolist() == [1, 0]
+
+
+def test_tile_grid_overlaps_and_ends_with_an_edge_tile():
+    tiles = tile_grid(600, 1500, tile=640, overlap=0.2)
+
+    # Stride 512: tiles at x = 0 and 512, then one flush with the right edge.
+    assert tiles.tolist() == [[0, 0, 640, 600], [512, 0, 1152, 600], [860, 0, 1500, 600]]
+
+
+def test_small_image_is_one_tile():
+    assert tile_grid(300, 400, tile=640).tolist() == [[0, 0, 400, 300]]
+
+
+def test_select_tiles_weights_candidates_by_the_part_inside():
+    tiles = np.array([[0, 0, 100, 100], [100, 0, 200, 100], [200, 0, 300, 100]], dtype=np.float32)
+    # One box in the first tile, one straddling the second and third, mostly in the third.
+    boxes = np.array([[10, 10, 30, 30], [180, 10, 220, 30]], dtype=np.float32)
+
+    selected = select_tiles(tiles, boxes, np.array([0.2, 0.8]), max_tiles=2)
+
+    assert selected.tolist() == [1, 2]
+    assert select_tiles(tiles, boxes[:0], np.empty(0), max_tiles=2).tolist() == []
+
+
+class FakeResult:
+    def __init__(self, boxes=(), confidences=(), class_ids=()):
+        self.names = NAMES
+        self.arrays = (np.array(boxes, dtype=np.float32).reshape(-1, 4), np.array(confidences, dtype=np.float32),
+                       np.array(class_ids, dtype=np.int64))
+
+
+class FakeDetector:
+    """Answers the overview with `overview` and every tile with no boxes, counting the images per call."""
+
+    def __init__(self):
+        self.overview = FakeResult()
+        self.calls = []
+
+    def predict(self, images, loaded, **kwargs):
+        self.calls.append(len(images))
+        return [self.overview] if len(self.calls) == 1 else [FakeResult() for _ in images]
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    fake = FakeDetector()
+    monkeypatch.setattr(food_detector, "_predict", fake.predict)
+    monkeypatch.setattr(food_detector, "_box_arrays", lambda result: result.arrays)
+    food_detector._class_thresholds.cache_clear()
+    yield fake
+    food_detector._class_thresholds.cache_clear()
+
+
+def test_boxes_below_select_conf_do_not_select_tiles(detector):
+    detector.overview = FakeResult([[100, 100, 110, 110]], [0.02], [0])
+
+    detection = detect_tiled(np.zeros((2000, 2000, 3), np.uint8), loaded=object(), select_conf=0.05)
+
+    assert detector.calls == [1]
+    assert detection.tiles_run == 0
+
+
+def test_a_faint_small_box_selects_its_tile(detector):
+    detector.overview = FakeResult([[100, 100, 110, 110]], [0.1], [0])
+
+    detection = detect_tiled(np.zeros((2000, 2000, 3), np.uint8), loaded=object(), select_conf=0.05, max_tiles=4)
+
+    assert detector.calls == [1, 1]
+    assert detection.tiles_run == 1
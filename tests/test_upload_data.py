@@ -0,0 +1,159 @@
+import functools
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.ingregenius import upload_data
+from src.ingregenius.upload_data import FakeProject, file_sha256, load_manifest, split_for, upload_images_to_roboflow
+
+
+def _photo(path, seed, size=(96, 64)):
+    """Saves a smooth random image, so resized copies keep the same perceptual hash."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (4, 6, 3), dtype=np.uint8)
+    Image.fromarray(small).resize(size, Image.BILINEAR).save(path)
+    return path
+
+
+def _resized_copy(source, target):
+    with Image.open(source) as image:
+        image.resize((192, 128), Image.BILINEAR).convert("RGB").save(target, quality=90)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "dataset"
+    for label in ("tomato", "egg"):
+        (root / label).mkdir(parents=True)
+    for seed in range(3):
+        _photo(root / "tomato" / f"tomato_{seed}.png", seed)
+        _photo(root / "egg" / f"egg_{seed}.png", 10 + seed)
+    return root
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload_data, "_upload_with_retries",
+                        functools.partial(upload_data._upload_with_retries, backoff_base=0.0))
+
+
+def _upload(dataset, project, **kwargs):
+    return upload_images_to_roboflow("key", "workspace", "project", dataset, project=project, workers=4, **kwargs)
+
+
+class FlakyProject(FakeProject):
+    """Fails the first `failures` uploads of every image, then accepts it."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = {}
+
+    def upload(self, image_path: str, split: str, tag_names: list[str], **kwargs):
+        with self._lock:
+            self.attempts[image_path] = self.attempts.get(image_path, 0) + 1
+            attempt = self.attempts[image_path]
+        if attempt <= self.failures:
+            raise ConnectionError("fake upload failure")
+        super().upload(image_path, split, tag_names)
+
+
+def test_uploads_every_image_with_its_folder_label(dataset):
+    project = FakeProject()
+    summary = _upload(dataset, project)
+
+    assert summary["uploaded"] == 6
+    labels = {Path(upload["image_path"]).name: upload["tag_names"] for upload in project.uploads}
+    assert labels["egg_0.png"] == ["egg"]
+    assert labels["tomato_2.png"] == ["tomato"]
+
+
+def test_rerun_resumes_from_the_manifest(dataset):
+    _upload(dataset, FakeProject())
+    _photo(dataset / "egg" / "egg_new.png", 99)
+
+    project = FakeProject()
+    summary = _upload(dataset, project)
+
+    assert [Path(upload["image_path"]).name for upload in project.uploads] == ["egg_new.png"]
+    assert summary["already_uploaded"] == 6
+    assert len(load_manifest(dataset / upload_data.MANIFEST_NAME)) == 7
+
+
+def test_exact_and_near_duplicates_are_skipped(dataset):
+    shutil.copy(dataset / "egg" / "egg_0.png", dataset / "tomato" / "copy_of_egg.png")
+    # Same photo, resized and re-encoded: a different SHA-256 but the same dhash.
+    _resized_copy(dataset / "tomato" / "tomato_1.png", dataset / "tomato" / "tomato_1_big.jpg")
+
+    project = FakeProject()
+    summary = _upload(dataset, project)
+
+    assert summary["uploaded"] == 6
+    assert summary["duplicates"] == 1
+    assert summary["near_duplicates"] == 1
+    assert len(project.uploads) == 6
+
+
+def test_near_duplicate_check_can_be_turned_off(dataset):
+    _resized_copy(dataset / "tomato" / "tomato_1.png", dataset / "tomato" / "tomato_1_big.jpg")
+
+    summary = _upload(dataset, FakeProject(), near_duplicate_bits=-1)
+
+    assert summary["uploaded"] == 7
+
+
+def test_split_depends_only_on_the_file_content(dataset, tmp_path):
+    first, second = FakeProject(), FakeProject()
+    _upload(dataset, first)
+    _upload(dataset, second, manifest_path=tmp_path / "other_manifest.jsonl")
+
+    splits = {upload["image_path"]: upload["split"] for upload in first.uploads}
+    assert splits == {upload["image_path"]: upload["split"] for upload in second.uploads}
+    for image_path, split in splits.items():
+        assert split == split_for(file_sha256(Path(image_path)))
+
+
+def test_split_weights():
+    splits = [split_for(f"{i * 2654435761 % 0x100000000:08x}") for i in range(10_000)]
+
+    assert splits.count("train") == pytest.approx(7_000, rel=0.05)
+    assert splits.count("valid") == pytest.approx(2_000, rel=0.05)
+    assert splits.count("test") == pytest.approx(1_000, rel=0.1)
+
+
+def test_transient_failures_are_retried(dataset):
+    project = FlakyProject(failures=2)
+    summary = _upload(dataset, project, max_retries=2)
+
+    assert summary["uploaded"] == 6
+    assert summary["failed"] == 0
+    assert set(project.attempts.values()) == {3}
+
+
+def test_failed_uploads_are_recorded_and_retried_on_the_next_run(dataset):
+    summary = _upload(dataset, FlakyProject(failures=5), max_retries=1)
+    manifest = load_manifest(dataset / upload_data.MANIFEST_NAME)
+
+    assert summary["failed"] == 6
+    assert all("failed" in entry for entry in manifest)
+
+    project = FakeProject()
+    summary = _upload(dataset, project)
+
+    assert summary["uploaded"] == 6
+    assert summary["already_uploaded"] == 0
+
+
+def test_unreadable_image_does_not_stop_the_upload(dataset):
+    (dataset / "egg" / "broken.jpg").write_bytes(b"not an image")
+
+    project = FakeProject()
+    summary = _upload(dataset, project)
+
+    assert summary["uploaded"] == 6
+    assert summary["failed"] == 1
+    failed = [entry for entry in load_manifest(dataset / upload_data.MANIFEST_NAME) if "failed" in entry]
+    assert [entry["path"] for entry in failed] == ["egg/broken.jpg"]